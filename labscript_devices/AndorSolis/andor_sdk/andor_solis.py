@@ -1368,22 +1368,25 @@ def GetImages(first, last, shape):
     """ This function will update the data array with the specified series 
         of images from the circular buffer. If the specified series is out of
         range (i.e. the images have been overwritten or have not yet been 
-        acquired then an error will be returned. """
+        acquired then an error will be returned. The data are returned as 
+        long integers (32-bit signed integers), in an array of shape
+        (last - first + 1, *shape). """
     andor_solis.GetImages.restype = ctypes.c_uint
-    arr = (ctypes.c_long * shape[0] * shape[1])()
-    size = shape[0] * shape[1] * int(abs(last - first))
+    n_images = last - first + 1
+    size = n_images * int(np.prod(shape))
+    arr = (ctypes.c_int32 * size)()
     validfirst = ctypes.c_long()
     validlast = ctypes.c_long()
     result = andor_solis.GetImages(
         ctypes.c_long(first),
         ctypes.c_long(last),
-        ctypes.pointer(arr[0]),
+        ctypes.pointer(arr),
         ctypes.c_ulong(size),
         ctypes.byref(validfirst),
         ctypes.byref(validlast),
     )
     check_status(result)
-    return np.ctypeslib.as_array(arr)
+    return np.ctypeslib.as_array(arr).reshape((n_images,) + tuple(shape))
 
 def GetMostRecentImage(shape):
     """ This function will update the data array with the most recently 
@@ -1624,7 +1627,6 @@ def SetAccumulationCycleTime(time):
     return None
 
 
-@uint_winapi([ctypes.c_int])
 def WaitForAcquisitionTimeOut(timeout_ms):
     """WaitForAcquisitionTimeOut can be called after an acquisition is started 
     using StartAcquisition to put the calling thread to sleep until an Acquisition 
@@ -1638,5 +1640,9 @@ def WaitForAcquisitionTimeOut(timeout_ms):
     Accumulation, Kinetic Series or Run-Till-Abort acquisition or at the end 
     of a Single Scan Acquisition. If an Acquisition Event does not occur 
     within _TimeOutMs milliseconds, WaitForAcquisitionTimeOut returns 
-    DRV_NO_NEW_DATA"""
-    return None
+    DRV_NO_NEW_DATA
+    Wrapped function returns 'DRV_SUCCESS' or 'DRV_NO_NEW_DATA'. """
+    andor_solis.WaitForAcquisitionTimeOut.argtypes = [ctypes.c_int]
+    andor_solis.WaitForAcquisitionTimeOut.restype = ctypes.c_uint
+    result = andor_solis.WaitForAcquisitionTimeOut(ctypes.c_int(timeout_ms))
+    return check_status(result)
@@ -44,6 +44,10 @@ class AndorCam(object):
         'temperature': 20,
     }
 
+    # Longest time to sleep waiting for an acquisition event before checking
+    # the acquisition status, in case an event was missed:
+    event_check_interval = 100 * ms
+
     def __init__(self, name='andornymous'):
         """ Methods of this class pack the sdk functions
         and define more convenient functions to carry out
@@ -545,37 +549,33 @@ class AndorCam(object):
             attrs['height'] + attrs['bottom_start'] - 1,
         )
 
+    def wait_for_acquisition(self, timeout):
+        """ Sleeps in the SDK until the acquisition is complete, or until
+        timeout (in seconds) has elapsed, and returns the acquisition status.
+        Rather than polling GetStatus(), this waits for the acquisition events
+        the SDK signals for each image, checking the status at least every
+        event_check_interval in case an event was missed. """
+        deadline = time.time() + timeout
+        self.acquisition_status = GetStatus()
+        while self.acquisition_status != 'DRV_IDLE':
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                rich_print(
+                    "wait_for_acquisition: timeout occured", color='firebrick',
+                )
+                break
+            WaitForAcquisitionTimeOut(
+                int(np.ceil(min(remaining, self.event_check_interval) / ms))
+            )
+            self.acquisition_status = GetStatus()
+        return self.acquisition_status
+
     def acquire(self):
         """ Carries down the acquisition, if the camera is armed and
         waits for an acquisition event for acquisition timeout (has to be
         in milliseconds), default to 5 seconds """
     
         acquisition_timeout = self.acquisition_attributes['acquisition_timeout']
-
-        def homemade_wait_for_acquisition():
-            self.acquisition_status = ''
-            start_wait = time.time()
-            while self.acquisition_status != 'DRV_IDLE':
-                self.acquisition_status = GetStatus()
-                # TODO: Also count the number of acquired (buffered) images and
-                # stop when it matches the expected number of frames. 
-                t0 = time.time() - start_wait
-                if t0 > acquisition_timeout * ms:
-                    rich_print(
-                        "homemade_wait_for_acquisition: timeout occured",
-                        color='firebrick',
-                    )
-                    break
-                time.sleep(0.05)
-            if self.chatty:
-                rich_print(
-                    f"Leaving homemade_wait with status {self.acquisition_status} ",
-                    color='goldenrod',
-                )
-                rich_print(
-                    f"homemade_wait_for_acquisition: elapsed time {t0/ms} ms, out of max {acquisition_timeout} ms",
-                    color='goldenrod',
-                )
                                                             
         if not self.armed:
             raise Exception("Cannot start acquisition until armed")
@@ -588,7 +588,15 @@ class AndorCam(object):
                         f"Waiting for {acquisition_timeout} ms for timeout ...",
                         color='yellow',
                     )
-                homemade_wait_for_acquisition()
+                start_wait = time.time()
+                self.wait_for_acquisition(acquisition_timeout * ms)
+                if self.chatty:
+                    rich_print(
+                        f"Leaving wait_for_acquisition with status {self.acquisition_status}, "
+                        + f"elapsed time {(time.time() - start_wait)/ms:.1f} ms, "
+                        + f"out of max {acquisition_timeout} ms",
+                        color='goldenrod',
+                    )
             
             # Last chance, check if the acquisition is finished, update
             # acquisition status otherwise, abort and raise an error
@@ -600,6 +608,56 @@ class AndorCam(object):
                 AbortAcquisition()
                 raise AndorException('Acquisition aborted due to timeout')
 
+    def stream_acquisition(self):
+        """ Starts a kinetic series acquisition, if the camera is armed, and
+        yields each image of shape (Ny, Nx) as soon as it is in the circular
+        buffer, so that downloading overlaps with the exposure and readout of
+        the rest of the series. Returns early if the acquisition is aborted,
+        and aborts and raises an error if the series is not complete within
+        the acquisition timeout. """
+
+        acquisition_timeout = self.acquisition_attributes['acquisition_timeout']
+        N = self.acquisition_attributes['number_kinetics']
+
+        if not self.armed:
+            raise Exception("Cannot start acquisition until armed")
+        StartAcquisition()
+        self.armed = False
+        deadline = time.time() + acquisition_timeout * ms
+
+        # Index in the circular buffer (which starts at 1) of the next image:
+        next_image = 1
+        while next_image <= N:
+            # Check the status before the available images, so that none that
+            # arrive in between are missed once the acquisition is idle:
+            self.acquisition_status = GetStatus()
+            first, last = GetNumberAvailableImages()
+            if last >= next_image:
+                if first > next_image:
+                    AbortAcquisition()
+                    raise AndorException(
+                        f"Images {next_image}-{first - 1} were overwritten in the "
+                        + "circular buffer before they were downloaded"
+                    )
+                yield from GetImages(next_image, last, self.image_shape)
+                if self.chatty:
+                    print(f"    images {next_image}-{last}: Download complete")
+                next_image = last + 1
+            elif self.acquisition_status == 'DRV_IDLE':
+                # Aborted:
+                return
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    AbortAcquisition()
+                    raise AndorException(
+                        f"Acquisition aborted due to timeout after {next_image - 1} "
+                        + f"of {N} images"
+                    )
+                WaitForAcquisitionTimeOut(
+                    int(np.ceil(min(remaining, self.event_check_interval) / ms))
+                )
+
     def download_acquisition(self):
         """ Download buffered acquisition. For fast kinetics, returns a 3D
         array of shape (N_fast_kinetics, Ny//N, Nx). Otherwise, returns array
@@ -651,6 +709,8 @@ class AndorCam(object):
         if self.chatty:
             rich_print("Debug: Abort Called", color='yellow')
         AbortAcquisition()
+        # Wake any thread waiting for an acquisition event:
+        CancelWait()
 
     def shutdown(self):
         """ Shuts camera down, if unarmed """
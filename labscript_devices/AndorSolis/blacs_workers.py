@@ -90,6 +90,12 @@ class AndorCamera(object):
                 self.camera.armed = True
             self.camera.armed = False # This last disarming may be redundant
             print(f"Got {len(images)} images in {nacquisitions} FK series acquisition(s).")    
+        elif 'kinetic_series' in self.camera.acquisition_mode:
+            # Images are downloaded as they arrive in the circular buffer, rather
+            # than after the whole series:
+            for image in self.camera.stream_acquisition():
+                images.append(image)
+            print(f"Got {len(images)} of {n_images} acquisition(s).")
         else: 
             self.camera.acquire()
             print(f"    Acquire complete")
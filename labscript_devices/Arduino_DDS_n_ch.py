@@ -14,11 +14,7 @@ import numpy as np
 import labscript_utils.h5_lock, h5py
 import labscript_utils.properties
 
-bauds = {9600: b'Kb 78',
-         19200: b'Kb 3c',
-         38400: b'Kb 1e',
-         57600: b'Kb 14',
-         115200: b'Kb 0a'}
+from labscript_devices.arduino_dds_worker import bauds
 
 class Arduino_DDS_n_ch(IntermediateDevice):
     description = 'ArduinoDDS'
@@ -180,6 +176,7 @@ import time
 from blacs.tab_base_classes import Worker, define_state
 from blacs.tab_base_classes import MODE_MANUAL, MODE_TRANSITION_TO_BUFFERED, MODE_TRANSITION_TO_MANUAL, MODE_BUFFERED
 from blacs.device_base_class import DeviceTab
+from labscript_devices.arduino_dds_worker import ArduinoDDSWorker
 
 @BLACS_tab
 class Arduino_DDS_n_chTab(DeviceTab):
@@ -254,24 +251,11 @@ class Arduino_DDS_n_chTab(DeviceTab):
         self.supports_smart_programming(False)
 
 
-class Arduino_DDS_n_chWorker(Worker):
+class Arduino_DDS_n_chWorker(ArduinoDDSWorker):
     def init(self):
-        global serial; import serial
-        global socket; import socket
-        global h5py; import labscript_utils.h5_lock, h5py
         import logging
-        self.smart_cache = {'STATIC_DATA': None, 'TABLE_DATA': ''}
+        ArduinoDDSWorker.init(self)
         self.logger = logging.getLogger('BLACS.%s.state_queue'%('red_AOM_arduino'))
-        
-        if self.default_baud_rate is not None:
-            initial_baud_rate = self.default_baud_rate
-        else:
-            initial_baud_rate = self.baud_rate
-        self.initial_baud_rate = initial_baud_rate
-        
-        self.connection = serial.Serial(
-            self.com_port, baudrate=initial_baud_rate, timeout=0.1
-        )
 
     def program_manual(self,front_panel_values):
         # TODO: Optimise this so that only items that have changed are reprogrammed by storing the last programmed values
@@ -305,98 +289,6 @@ class Arduino_DDS_n_chWorker(Worker):
         #print('end program_static()')
         #print('')
 
-    def transition_to_buffered(self,device_name,h5file,initial_values,fresh):
-        self.connection.close()
-        self.connection = serial.Serial(
-            self.com_port, baudrate=self.initial_baud_rate, timeout=0.1
-        )
-        #print('start transition_to_buffered()')
-        # Pretty please reset your memory pointer to zero:
-
-        # Store the initial values in case we have to abort and restore them:
-        # Store the final values to for use during transition_to_static:
-        self.final_values = {}
-        table_data = None
-        
-        # Jeff edit to fix error in blacs tab when running experiments from runmanager
-        # with h5py.File(h5file) as hdf5_file:
-        #print('opening h5 file')
-        with h5py.File(h5file,mode='r') as hdf5_file:
-            group = hdf5_file['/devices/'+device_name]
-            # Now program the buffered outputs:
-            if 'TABLE_DATA' in group:
-                table_data = group['TABLE_DATA'][:]
-        #print('table data loaded from file')
-
-        # Now program the buffered outputs:
-
-        if table_data is not None:
-            data = table_data
-            #print('sending data tables')
-            for ddsno in range(2):
-                #print('sending data table {:f}'.format(ddsno))
-                commandString = b'@ %d\r\n'%ddsno
-                self.connection.write(commandString)
-                #print(commandString)
-                for i, line in enumerate(data):
-                    #print('sending line {:f}'.format(i))
-                    oldtable = self.smart_cache['TABLE_DATA']
-                    if fresh or i >= len(oldtable) or (line['freq%d'%ddsno], line['ramplow%d'%ddsno], line['ramphigh%d'%ddsno],
-                                                       line['rampdur%d'%ddsno], line['rampon%d'%ddsno]) != (oldtable[i]['freq%d'%ddsno],
-                                                       oldtable[i]['ramplow%d'%ddsno], oldtable[i]['ramphigh%d'%ddsno],
-                                                       oldtable[i]['rampdur%d'%ddsno], oldtable[i]['rampon%d'%ddsno]):
-                        if line['rampon%d'%ddsno] == 1:
-                            commandString = b'r %f %f %f\r\n'%(line['ramplow%d'%ddsno], line['ramphigh%d'%ddsno], line['rampdur%d'%ddsno])
-                            self.connection.write(commandString)
-                            #print(commandString)
-                            #self.logger.info("Programming ramp: " + str(commandString))
-                        else:
-                            commandString = b'f %f\r\n'%line['freq%d'%ddsno]
-                            self.connection.write(commandString)
-                            #print(commandString)
-            
-            # Store the table for future smart programming comparisons:
-            #print('set smart cache thing')
-            try:
-                self.smart_cache['TABLE_DATA'][:len(data)] = data
-                self.logger.debug('Stored new table as subset of old table')
-            except: # new table is longer than old table
-                self.smart_cache['TABLE_DATA'] = data
-                self.logger.debug('New table is longer than old table and has replaced it.')
-
-            #print('setting final values')
-            # Get the final values of table mode so that the GUI can
-            # reflect them after the run:
-            self.final_values['channel 0'] = {}
-            self.final_values['channel 1'] = {}
-            self.final_values['channel 0']['freq'] = data[-1]['freq0']
-            self.final_values['channel 1']['freq'] = data[-1]['freq1']
-            #print('reading from arduino?')
-            self.connection.readline()
-            if self.update_mode == 'synchronous':
-                # Transition to hardware synchronous updates:
-                self.connection.write(b'$\r\n')
-                self.connection.readline()
-                # We are now waiting for a rising edge to trigger the output
-                # of the second table pair (first of the experiment)
-            elif self.update_mode == 'asynchronous':
-                # Output will now be updated on falling edges.
-                pass
-            else:
-                raise ValueError('invalid update mode %s'%str(self.update_mode))
-
-
-        #print('end transition_to_buffered()')
-        #print('')
-        return self.final_values
-
-    def abort_transition_to_buffered(self):
-        return self.transition_to_manual(True)
-
-    def abort_buffered(self):
-        # TODO: untested
-        return self.transition_to_manual(True)
-
     def transition_to_manual(self,abort = False):
         if abort:
             # If we're aborting the run, then we need to reset DDSs 2 and 3 to their initial values.
@@ -422,16 +314,6 @@ class Arduino_DDS_n_chWorker(Worker):
         # return True to indicate we successfully transitioned back to manual mode
         return True
 
-    def shutdown(self):
-
-        # return to the default baud rate
-        if self.default_baud_rate is not None:
-            self.connection.write(b'%s\r\n' % bauds[self.default_baud_rate])
-            time.sleep(0.1)
-            self.connection.readlines()
-
-        self.connection.close()
-
 
 
 @runviewer_parser
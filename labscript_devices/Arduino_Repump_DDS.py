@@ -13,11 +13,7 @@ import numpy as np
 import labscript_utils.h5_lock, h5py
 import labscript_utils.properties
 
-bauds = {9600: b'Kb 78',
-         19200: b'Kb 3c',
-         38400: b'Kb 1e',
-         57600: b'Kb 14',
-         115200: b'Kb 0a'}
+from labscript_devices.arduino_dds_worker import bauds
 
 class Arduino_Repump_DDS(IntermediateDevice):
     description = 'Arduino_Repump_DDS'
@@ -223,6 +219,7 @@ from blacs.tab_base_classes import Worker, define_state
 from blacs.tab_base_classes import MODE_MANUAL, MODE_TRANSITION_TO_BUFFERED, MODE_TRANSITION_TO_MANUAL, MODE_BUFFERED
 
 from blacs.device_base_class import DeviceTab
+from labscript_devices.arduino_dds_worker import ArduinoDDSWorker
 
 @BLACS_tab
 class Arduino__Repump_DDSTab(DeviceTab):
@@ -320,21 +317,24 @@ class Arduino__Repump_DDSTab(DeviceTab):
         self.supports_smart_programming(False)
 
 
-class Arduino_Repump_DDSWorker(Worker):
-    def init(self):
-        global serial; import serial
-        global socket; import socket
-        global h5py; import labscript_utils.h5_lock, h5py
-        self.smart_cache = {'STATIC_DATA': None, 'TABLE_DATA': ''}
+class Arduino_Repump_DDSWorker(ArduinoDDSWorker):
+    # The table has a single channel of multi-frequency lines:
+    num_channels = 1
+    table_fields = ['freq', 'amplitude0'] + [
+        '%s%d'%(field, i) for i in range(1, 8) for field in ['frequency', 'amplitude']
+    ] + ['usedfreqs', 'delaytime']
 
-        if self.default_baud_rate is not None:
-            initial_baud_rate = self.default_baud_rate
-        else:
-            initial_baud_rate = self.baud_rate
+    def get_table_commands(self, data, channel):
+        columns = [data[field].tolist() for field in self.table_fields]
+        return [b'MF2 %f %f %f %f %f %f %f %f %f %f %f %f %f %f %f %f %f %f\r\n'%line for line in zip(*columns)]
 
-        self.connection = serial.Serial(
-            self.com_port, baudrate=initial_baud_rate, timeout=0.1
-        )
+    def get_final_values(self, data):
+        final_values = {'freq0': {'freq': data[-1]['freq'], 'amp': data[-1]['amplitude0']}}
+        for i in range(1, 8):
+            final_values['freq%d'%i] = {'freq': data[-1]['frequency%d'%i], 'amp': data[-1]['amplitude%d'%i]}
+        final_values['numFreq'] = data[-1]['usedfreqs']
+        final_values['delayTime'] = data[-1]['delaytime']
+        return final_values
 
     def program_manual(self,front_panel_values):
         # TODO: Optimise this so that only items that have changed are reprogrammed by storing the last programmed values
@@ -382,107 +382,6 @@ class Arduino_Repump_DDSWorker(Worker):
         # Now that a static update has been done, we'd better invalidate the saved STATIC_DATA:
         self.smart_cache['STATIC_DATA'] = None
 
-    def transition_to_buffered(self,device_name,h5file,initial_values,fresh):
-
-        # Pretty please reset your memory pointer to zero:
-
-        # Store the initial values in case we have to abort and restore them:
-        # Store the final values to for use during transition_to_static:
-        self.final_values = {}
-        table_data = None
-        with h5py.File(h5file) as hdf5_file:
-            group = hdf5_file['/devices/'+device_name]
-            # Now program the buffered outputs:
-            if 'TABLE_DATA' in group:
-                table_data = group['TABLE_DATA'][:]
-
-
-        # Now program the buffered outputs:
-
-        if table_data is not None:
-            data = table_data
-            for ddsno in range(1):
-                self.connection.write(b'@ %d\r\n'%ddsno)
-                for i, line in enumerate(data):
-                    oldtable = self.smart_cache['TABLE_DATA']
-                    if fresh or i >= len(oldtable) or (line['freq'], line['amplitude0'], line['frequency1'], line['amplitude1'],
-                                                       line['frequency2'], line['amplitude2'], line['frequency3'], line['amplitude3'],
-                                                       line['frequency4'], line['amplitude4'], line['frequency5'], line['amplitude5'],
-                                                       line['frequency6'], line['amplitude6'], line['frequency7'], line['amplitude7'],
-                                                       line['usedfreqs'], line['delaytime']) != (oldtable[i]['freq'], oldtable[i]['amplitude0'], oldtable[i]['frequency1'], oldtable[i]['amplitude1'],
-                                                                                          oldtable[i]['frequency2'], oldtable[i]['amplitude2'], oldtable[i]['frequency3'], oldtable[i]['amplitude3'],
-                                                                                          oldtable[i]['frequency4'], oldtable[i]['amplitude4'], oldtable[i]['frequency5'], oldtable[i]['amplitude5'],
-                                                                                          oldtable[i]['frequency6'], oldtable[i]['amplitude6'], oldtable[i]['frequency7'], oldtable[i]['amplitude7'],
-                                                                                          oldtable[i]['usedfreqs'], oldtable[i]['delaytime']):
-                        # if line['rampon%d'%ddsno] == 1:
-                        #     self.connection.write(b'r %f %f %f\r\n'%(line['ramplow%d'%ddsno], line['ramphigh%d'%ddsno], line['rampdur%d'%ddsno]))
-                        # else:
-                        self.connection.write(b'MF2 %f %f %f %f %f %f %f %f %f %f %f %f %f %f %f %f %f %f\r\n'%(line['freq'], line['amplitude0'], line['frequency1'], line['amplitude1'],
-                                                           line['frequency2'], line['amplitude2'], line['frequency3'], line['amplitude3'],
-                                                           line['frequency4'], line['amplitude4'], line['frequency5'], line['amplitude5'],
-                                                           line['frequency6'], line['amplitude6'], line['frequency7'], line['amplitude7'],
-                                                           line['usedfreqs'], line['delaytime']))
-
-            # Store the table for future smart programming comparisons:
-            try:
-                self.smart_cache['TABLE_DATA'][:len(data)] = data
-                self.logger.debug('Stored new table as subset of old table')
-            except: # new table is longer than old table
-                self.smart_cache['TABLE_DATA'] = data
-                self.logger.debug('New table is longer than old table and has replaced it.')
-
-            # Get the final values of table mode so that the GUI can
-            # reflect them after the run:
-            self.final_values = {}
-            self.final_values['freq0'] = {}
-            self.final_values['freq1'] = {}
-            self.final_values['freq2'] = {}
-            self.final_values['freq3'] = {}
-            self.final_values['freq4'] = {}
-            self.final_values['freq5'] = {}
-            self.final_values['freq6'] = {}
-            self.final_values['freq7'] = {}
-            self.final_values['freq0']['freq'] = data[-1]['freq']
-            self.final_values['freq0']['amp'] = data[-1]['amplitude0']
-            self.final_values['freq1']['freq'] = data[-1]['frequency1']
-            self.final_values['freq1']['amp'] = data[-1]['amplitude1']
-            self.final_values['freq2']['freq'] = data[-1]['frequency2']
-            self.final_values['freq2']['amp'] = data[-1]['amplitude2']
-            self.final_values['freq3']['freq'] = data[-1]['frequency3']
-            self.final_values['freq3']['amp'] = data[-1]['amplitude3']
-            self.final_values['freq4']['freq'] = data[-1]['frequency4']
-            self.final_values['freq4']['amp'] = data[-1]['amplitude4']
-            self.final_values['freq5']['freq'] = data[-1]['frequency5']
-            self.final_values['freq5']['amp'] = data[-1]['amplitude5']
-            self.final_values['freq6']['freq'] = data[-1]['frequency6']
-            self.final_values['freq6']['amp'] = data[-1]['amplitude6']
-            self.final_values['freq7']['freq'] = data[-1]['frequency7']
-            self.final_values['freq7']['amp'] = data[-1]['amplitude7']
-            self.final_values['numFreq'] = data[-1]['usedfreqs']
-            self.final_values['delayTime'] = data[-1]['delaytime']
-            self.connection.readline()
-            if self.update_mode == 'synchronous':
-                # Transition to hardware synchronous updates:
-                self.connection.write(b'$\r\n')
-                self.connection.readline()
-                # We are now waiting for a rising edge to trigger the output
-                # of the second table pair (first of the experiment)
-            elif self.update_mode == 'asynchronous':
-                # Output will now be updated on falling edges.
-                pass
-            else:
-                raise ValueError('invalid update mode %s'%str(self.update_mode))
-
-
-        return self.final_values
-
-    def abort_transition_to_buffered(self):
-        return self.transition_to_manual(True)
-
-    def abort_buffered(self):
-        # TODO: untested
-        return self.transition_to_manual(True)
-
     def transition_to_manual(self,abort = False):
         if abort:
             # If we're aborting the run, then we need to reset DDSs 2 and 3 to their initial values.
@@ -506,16 +405,6 @@ class Arduino_Repump_DDSWorker(Worker):
         # return True to indicate we successfully transitioned back to manual mode
         return True
 
-    def shutdown(self):
-
-        # return to the default baud rate
-        if self.default_baud_rate is not None:
-            self.connection.write(b'%s\r\n' % bauds[self.default_baud_rate])
-            time.sleep(0.1)
-            self.connection.readlines()
-
-        self.connection.close()
-
 
 
 @runviewer_parser
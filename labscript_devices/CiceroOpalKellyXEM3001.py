@@ -18,6 +18,7 @@ import numpy as np
 import labscript_utils.h5_lock, h5py
 import labscript_utils.properties
 from labscript_utils.connections import _ensure_str
+from labscript_devices.pseudoclock_traces import expand_pulse_program, get_clock_ticks
 
 #
 # Helper functions
@@ -265,15 +266,7 @@ class RunviewerClass(object):
             
     def get_traces(self, add_trace, clock=None):
         if clock is not None:
-            times, clock_value = clock[0], clock[1]
-            clock_indices = np.where((clock_value[1:]-clock_value[:-1])==1)[0]+1
-            # If initial clock value is 1, then this counts as a rising edge (clock should be 0 before experiment)
-            # but this is not picked up by the above code. So we insert it!
-            if clock_value[0] == 1:
-                clock_indices = np.insert(clock_indices, 0, 0)
-            clock_ticks = times[clock_indices]
-
-        
+            clock_ticks = get_clock_ticks(clock)
             
         # get the pulse program
         with h5py.File(self.path, 'r') as f:
@@ -283,30 +276,20 @@ class RunviewerClass(object):
         
         clock_frequency = connection_table_properties['clock_frequency']
 
-        time = []
-        states = []
-        trigger_index = 0
-        # t = 0 if clock is None else clock_ticks[trigger_index]+device_properties['trigger_delay']
-        # trigger_index += 1
-        t = 0
-               
-        for row in pulse_program:
-            if row['reps'] == 0: # WAIT
-                if clock is not None:
-                    t = clock_ticks[trigger_index]+device_properties['trigger_delay']
-                    trigger_index += 1
-                else:
-                    t += device_properties['wait_delay']
-            else:    
-                for i in range(row['reps']):
-                    time.append(t)
-                    states.append(1)
-                    t += row['on_period']/clock_frequency
-                    time.append(t)
-                    states.append(0)
-                    t += row['off_period']/clock_frequency
-        
-        clock = (np.array(time), np.array(states))
+        # The program starts at t = 0 regardless of the parent clock, which is used
+        # only to resume after each wait. Instructions with zero reps are waits:
+        resume_times = None
+        if clock is not None:
+            resume_times = clock_ticks+device_properties['trigger_delay']
+        clock, _ = expand_pulse_program(
+            pulse_program['on_period']/clock_frequency,
+            pulse_program['off_period']/clock_frequency,
+            pulse_program['reps'],
+            np.flatnonzero(pulse_program['reps'] == 0),
+            0,
+            resume_times,
+            device_properties['wait_delay'],
+        )
         
         clocklines_and_triggers = {}
         for pseudoclock_name, pseudoclock in self.device.child_list.items():
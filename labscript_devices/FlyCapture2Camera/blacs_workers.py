@@ -20,7 +20,12 @@ import numpy as np
 from labscript_utils import dedent
 from enum import IntEnum
 
-from labscript_devices.IMAQdxCamera.blacs_workers import IMAQdxCameraWorker
+from labscript_devices.IMAQdxCamera.blacs_workers import (
+    IMAQdxCameraWorker,
+    copy_frame,
+    get_frame_buffer,
+    get_mono_dtype,
+)
 
 # Don't import API yet so as not to throw an error, allow worker to run as a dummy
 # device, or for subclasses to import this module to inherit classes without requiring API
@@ -90,6 +95,11 @@ class FlyCapture2_Camera(object):
                 
         self.pixel_formats = IntEnum('pixel_formats',fmts)
 
+        # names of the standard properties, read by get_attributes()
+        self.prop_names = sorted(prop for prop in dir(PyCapture2.PROPERTY_TYPE)
+                                 if not prop.startswith('_')
+                                 and not prop == 'UNSPECIFIED_PROPERTY_TYPE')
+
         self._abort_acquisition = False
         self.exception_on_failed_shot = True
 
@@ -275,9 +285,6 @@ class FlyCapture2_Camera(object):
             dict: Dictionary of property dictionaries
         """
         props = {}
-        prop_names = {prop for prop in dir(PyCapture2.PROPERTY_TYPE) 
-                      if not prop.startswith('_') 
-                      and not prop == 'UNSPECIFIED_PROPERTY_TYPE'}
         
         props['TriggerMode'] = {}
         trig_mode = self.camera.getTriggerMode()            
@@ -288,7 +295,7 @@ class FlyCapture2_Camera(object):
         image_props = [prop for prop in dir(image_mode) 
                       if not prop.startswith('_')]
 
-        for name in prop_names:
+        for name in self.prop_names:
             props[name] = self.get_attribute(name)
         
         for name in trig_props:
@@ -366,9 +373,12 @@ class FlyCapture2_Camera(object):
             
         self.camera.startCapture()
             
-    def grab(self):
+    def grab(self, out=None):
         """Grab and return single image during pre-configured acquisition.
-        
+
+        Args:
+            out (numpy.array, optional): Array to decode the image into.
+
         Returns:
             numpy.array: Returns formatted image
         """
@@ -378,7 +388,7 @@ class FlyCapture2_Camera(object):
         img = result.getData()
         #result.ReleaseBuffer(), exists in documentation, not PyCapture2
         
-        return self._decode_image_data(img)
+        return self._decode_image_data(img, out)
 
     def grab_multiple(self, n_images, images):
         """Grab n_images into images array during buffered acquistion.
@@ -399,7 +409,7 @@ class FlyCapture2_Camera(object):
                     self._abort_acquisition = False
                     return
                 try:
-                    images.append(self.grab())
+                    images.append(self.grab(out=get_frame_buffer(images)))
                     print(f"Got image {i+1} of {n_images}.")
                     break
                 except PyCapture2.Fc2error as e:
@@ -407,7 +417,19 @@ class FlyCapture2_Camera(object):
                     continue
         print(f"Got {len(images)} of {n_images} images.")
         
-    def _decode_image_data(self,img):
+    def get_image_format(self):
+        """Return the shape and dtype of images as configured by
+        :obj:`configure_acquisition`, or None if they are not monochrome.
+
+        Returns:
+            tuple: The image shape and dtype.
+        """
+        dtype = get_mono_dtype(self.pixelFormat)
+        if dtype is None:
+            return None
+        return (self.height, self.width), dtype
+
+    def _decode_image_data(self, img, out=None):
         """Formats returned FlyCapture2 API image buffers.
         
         FlyCapture2 image buffers require significant formatting.
@@ -416,7 +438,9 @@ class FlyCapture2_Camera(object):
         
         Args:
             img (numpy.array): A 1-D array image buffer of uint8 values to format
-            
+            out (numpy.array, optional): Array to copy the formatted image into, if
+                it is of the right shape and dtype.
+
         Returns:
             numpy.array: Formatted array based on :obj:`width`, :obj:`height`, 
                 and :obj:`pixelFormat`.
@@ -433,7 +457,7 @@ class FlyCapture2_Camera(object):
             To add other image types, add conversion logic from returned 
             uint8 data to desired format in _decode_image_data() method."""
             raise ValueError(dedent(msg))
-        return image.copy()
+        return copy_frame(image, out)
         
     def _send_format7_config(self,image_config):
         """Validates and sends the Format7 configuration packet.
@@ -13,6 +13,7 @@
 
 import os
 import json
+import threading
 from time import perf_counter
 import ast
 from queue import Empty
@@ -21,8 +22,9 @@ import labscript_utils.h5_lock
 import h5py
 
 import numpy as np
+import zmq
 
-from qtutils import UiLoader, inmain_decorator
+from qtutils import UiLoader, inmain_later
 import qtutils.icons
 from qtutils.qt import QtWidgets, QtGui, QtCore
 import pyqtgraph as pg
@@ -31,7 +33,7 @@ from blacs.tab_base_classes import define_state, MODE_MANUAL
 from blacs.device_base_class import DeviceTab
 
 import labscript_utils.properties
-from labscript_utils.ls_zprocess import ZMQServer
+from labscript_utils.ls_zprocess import Context
 
 
 
@@ -46,27 +48,51 @@ def exp_av(av_old, data_new, dt, tau):
     return k * data_new + (1 - k) * av_old
 
 
-class ImageReceiver(ZMQServer):
-    """ZMQServer that receives images on a zmq.REP socket, replies 'ok', and updates the
-    image widget and fps indicator"""
+class ImageReceiver(object):
+    """Receives images on a zmq.PULL socket in a thread, and updates the image widget and
+    fps indicator with the most recent one. Images arriving faster than they can be
+    displayed are dropped, so that the worker is never made to wait for the GUI."""
 
     def __init__(self, image_view, label_fps):
-        ZMQServer.__init__(self, port=None, dtype='multipart')
         self.image_view = image_view
         self.label_fps = label_fps
         self.last_frame_time = None
         self.frame_rate = None
-        self.update_event = None
-
-    @inmain_decorator(wait_for_return=True)
-    def handler(self, data):
-        # Acknowledge immediately so that the worker process can begin acquiring the
-        # next frame. This increases the possible frame rate since we may render a frame
-        # whilst acquiring the next, but does not allow us to accumulate a backlog since
-        # only one call to this method may occur at a time.
-        self.send([b'ok'])
-        md = json.loads(data[0])
-        image = np.frombuffer(memoryview(data[1]), dtype=md['dtype'])
+        # The most recently received image not yet displayed, and whether a call to
+        # self.update() is already scheduled in the main thread to display it:
+        self.latest = None
+        self.update_pending = False
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        # No receive high-water mark is set, since the worker's send high-water mark
+        # already limits the backlog, and we discard all but the latest image anyway:
+        self.sock = Context().socket(zmq.PULL)
+        self.port = self.sock.bind_to_random_port('tcp://0.0.0.0')
+        self.mainloop_thread = threading.Thread(target=self.mainloop, daemon=True)
+        self.mainloop_thread.start()
+
+    def mainloop(self):
+        poller = zmq.Poller()
+        poller.register(self.sock, zmq.POLLIN)
+        while not self.stopping.is_set():
+            if not poller.poll(100):
+                continue
+            data = self.sock.recv_multipart(copy=False)
+            with self.lock:
+                self.latest = data
+                if self.update_pending:
+                    continue
+                self.update_pending = True
+            inmain_later(self.update)
+        self.sock.close(linger=0)
+
+    def update(self):
+        with self.lock:
+            data = self.latest
+            self.latest = None
+            self.update_pending = False
+        md = json.loads(data[0].bytes)
+        image = np.frombuffer(data[1].buffer, dtype=md['dtype'])
         image = image.reshape(md['shape'])
         if len(image.shape) == 3 and image.shape[0] == 1:
             # If only one image given as a 3D array, convert to 2D array:
@@ -95,7 +121,7 @@ class ImageReceiver(ZMQServer):
         # Tell Qt to send posted events immediately to prevent a backlog of paint events
         # and other low-priority events. It seems that we cannot make our qtutils
         # CallEvents (which are used to call this method in the main thread) low enough
-        # priority to ensure all other occur before our next call to self.handler()
+        # priority to ensure all other occur before our next call to self.update()
         # runs. This may be because the CallEvents used by qtutils.invoke_in_main have
         # their own event handler (qtutils.invoke_in_main.Caller), perhaps posted event
         # priorities are only meaningful within the context of a single event handler,
@@ -103,7 +129,10 @@ class ImageReceiver(ZMQServer):
         # Manually calling this is usually a sign of bad coding, but I think it is the
         # right solution to this problem. This solves issue #36.
         QtWidgets.QApplication.instance().sendPostedEvents()
-        return self.NO_RESPONSE
+
+    def shutdown(self):
+        self.stopping.set()
+        self.mainloop_thread.join()
 
 
 class IMAQdxCameraTab(DeviceTab):
@@ -164,7 +193,7 @@ class IMAQdxCameraTab(DeviceTab):
                 size_policy.setRetainSizeWhenHidden(True)
                 widget.setSizePolicy(size_policy)
 
-        # Start the image receiver ZMQ server:
+        # Start receiving images from the worker:
         self.image_receiver = ImageReceiver(self.image, self.ui.label_fps)
         self.acquiring = False
 
@@ -210,6 +239,9 @@ class IMAQdxCameraTab(DeviceTab):
                 'manual_mode_camera_attributes'
             ],
             'mock': connection_table_properties['mock'],
+            'live_view_max_size': connection_table_properties.get(
+                'live_view_max_size', None
+            ),
             'image_receiver_port': self.image_receiver.port,
         }
         self.create_worker(
@@ -288,7 +320,7 @@ class IMAQdxCameraTab(DeviceTab):
         yield (self.queue_work(self.primary_worker, 'stop_continuous'))
 
     def restart(self, *args, **kwargs):
-        # Must manually stop the receiving server upon tab restart, otherwise it does
+        # Must manually stop the image receiver upon tab restart, otherwise it does
         # not get cleaned up:
         self.image_receiver.shutdown()
         return DeviceTab.restart(self, *args, **kwargs)
@@ -19,6 +19,10 @@ import sys
 from time import perf_counter
 from blacs.tab_base_classes import Worker
 import threading
+from queue import Queue
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from labscript_utils import dedent
 import labscript_utils.h5_lock
@@ -30,6 +34,13 @@ import zmq
 from labscript_utils.ls_zprocess import Context
 from labscript_utils.shared_drive import path_to_local
 from labscript_utils.properties import set_attributes
+from labscript_devices.frame_compression import (
+    get_compression_kwargs,
+    create_frames_dataset,
+    get_chunk_compressor,
+    submit_frame,
+    write_frame,
+)
 
 # Don't import nv yet so as not to throw an error, allow worker to run as a dummy
 # device, or for subclasses to import this module to inherit classes without requiring
@@ -62,6 +73,49 @@ def _monkeypatch_imaqdispose():
     nivision.core.imaqDispose = nv.imaqDispose = imaqDispose
 
 
+def get_frame_buffer(images, index=None):
+    """Return the preallocated array into which a camera's grab_multiple() may decode
+    the next image to be appended to `images`, or the image of the given index if one
+    is given, or None if `images` has no frame pool or it is full, in which case the
+    image should be decoded into a new array."""
+    if isinstance(images, ImageWriter):
+        return images.get_frame_buffer(index)
+    return None
+
+
+def copy_frame(data, out=None):
+    """Copy a frame out of a camera driver's buffer, into `out` if it is given and of
+    the same shape and dtype, otherwise into a new array, and return it."""
+    if out is not None and out.shape == data.shape and out.dtype == data.dtype:
+        np.copyto(out, data)
+        return out
+    return data.copy()
+
+
+def get_mono_dtype(pixel_format):
+    """Return the dtype of images of a monochrome pixel format such as 'Mono8' or
+    'Mono12', or None if it is not monochrome"""
+    if not pixel_format.upper().startswith('MONO'):
+        return None
+    return np.dtype(np.uint8) if pixel_format.endswith('8') else np.dtype(np.uint16)
+
+
+def bin_image(image, max_size):
+    """Return the image binned by the smallest integer factor that makes its last two
+    axes no longer than max_size, by averaging blocks of pixels. Rows and columns left
+    over at the edges are discarded, and an axis shorter than the factor is binned to
+    a single pixel. Returns the image itself if it is already small enough."""
+    height, width = image.shape[-2:]
+    factor = -(-max(height, width) // max_size)
+    if factor <= 1:
+        return image
+    y_factor, x_factor = min(factor, height), min(factor, width)
+    height, width = height // y_factor, width // x_factor
+    image = image[..., : height * y_factor, : width * x_factor]
+    blocks = image.reshape(image.shape[:-2] + (height, y_factor, width, x_factor))
+    return blocks.mean(axis=(-3, -1)).astype(image.dtype)
+
+
 class MockCamera(object):
     """Mock camera class that returns fake image data."""
 
@@ -82,13 +136,16 @@ class MockCamera(object):
     def configure_acquisition(self, continuous=False, bufferCount=5):
         pass
 
-    def grab(self):
-        return self.snap()
+    def get_image_format(self):
+        return (500, 500), np.dtype(np.uint16)
+
+    def grab(self, out=None):
+        return copy_frame(self.snap(), out)
 
     def grab_multiple(self, n_images, images, waitForNextBuffer=True):
         # # print(f"Attempting to grab {n_images} (mock) images.")
         for i in range(n_images):
-            images.append(self.grab())
+            images.append(self.grab(get_frame_buffer(images)))
             # # print(f"Got (mock) image {i+1} of {n_images}.")
         # print(f"Got {len(images)} of {n_images} (mock) images.")
 
@@ -107,7 +164,7 @@ class MockCamera(object):
         draw = ImageDraw.Draw(canvas)
         draw.text((10, 20), "NOT REAL DATA", font=font, fill=1)
         clean_image += 0.2 * A * np.asarray(canvas.resize((N, N)).rotate(20))
-        return np.random.poisson(clean_image)
+        return np.random.poisson(clean_image).astype(np.uint16)
 
     def stop_acquisition(self):
         pass
@@ -241,9 +298,22 @@ class IMAQdx_Camera(object):
         )
         nv.IMAQdxStartAcquisition(self.imaqdx)
 
-    def grab(self, waitForNextBuffer=True):
+    def get_image_format(self):
+        """Return the shape and dtype of images as configured, or None if they cannot
+        be determined"""
+        try:
+            width = self.get_attribute('Width')
+            height = self.get_attribute('Height')
+            dtype = get_mono_dtype(self.get_attribute('PixelFormat'))
+        except Exception:
+            return None
+        if dtype is None:
+            return None
+        return (height, width), dtype
+
+    def grab(self, waitForNextBuffer=True, out=None):
         nv.IMAQdxGrab(self.imaqdx, self.img, waitForNextBuffer=waitForNextBuffer)
-        return self._decode_image_data(self.img)
+        return self._decode_image_data(self.img, out)
 
     def grab_multiple(self, n_images, images, waitForNextBuffer=True):
         # print(f"Attempting to grab {n_images} images.")
@@ -254,7 +324,9 @@ class IMAQdx_Camera(object):
                     self._abort_acquisition = False
                     return
                 try:
-                    images.append(self.grab(waitForNextBuffer))
+                    images.append(
+                        self.grab(waitForNextBuffer, out=get_frame_buffer(images))
+                    )
                     # print(f"Got image {i+1} of {n_images}.")
                     break
                 except nv.ImaqDxError as e:
@@ -280,28 +352,367 @@ class IMAQdx_Camera(object):
     def abort_acquisition(self):
         self._abort_acquisition = True
 
-    def _decode_image_data(self, img):
+    def _decode_image_data(self, img, out=None):
         img_array = nv.imaqImageToArray(img)
         img_array_shape = (img_array[2], img_array[1])
         # bitdepth in bytes
         bitdepth = len(img_array[0]) // (img_array[1] * img_array[2])
         dtype = {1: np.uint8, 2: np.uint16, 4: np.uint32}[bitdepth]
         data = np.frombuffer(img_array[0], dtype=dtype).reshape(img_array_shape)
-        return data.copy()
+        return copy_frame(data, out)
 
     def close(self):
         nv.IMAQdxCloseCamera(self.imaqdx)
 
 
+class AcquisitionTiming(object):
+    """Records how long each stage of acquiring, saving and displaying images takes,
+    timed with perf_counter. Only the count, total and maximum duration of each stage
+    are kept, so stages occurring once per frame may be recorded indefinitely. Safe to
+    record from multiple threads."""
+
+    def __init__(self):
+        # Stage name: [count, total, maximum], in the order stages were first recorded:
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, duration):
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = [0, 0.0, 0.0]
+            stats = self.stages[stage]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+
+    @contextmanager
+    def stage(self, stage):
+        """Context manager recording the duration of its block as the given stage"""
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, perf_counter() - start_time)
+
+    @classmethod
+    def combine(cls, timings):
+        """Return an AcquisitionTiming of the stages of all the given ones"""
+        combined = cls()
+        for timing in timings:
+            with timing.lock:
+                stages = {name: list(stats) for name, stats in timing.stages.items()}
+            for name, (count, total, maximum) in stages.items():
+                if name not in combined.stages:
+                    combined.stages[name] = [0, 0.0, 0.0]
+                stats = combined.stages[name]
+                stats[0] += count
+                stats[1] += total
+                stats[2] = max(stats[2], maximum)
+        return combined
+
+    def summary(self):
+        """Return a dict of the count, and mean and maximum duration in seconds, of
+        each stage"""
+        with self.lock:
+            return {
+                name: {'count': count, 'mean': total / count, 'max': maximum}
+                for name, (count, total, maximum) in self.stages.items()
+            }
+
+    def table(self):
+        """Return the count, and total, mean and maximum duration in seconds, of each
+        stage as a structured array, for saving to the shot file"""
+        dtype = [
+            ('stage', 'S32'),
+            ('count', np.int64),
+            ('total', np.float64),
+            ('mean', np.float64),
+            ('max', np.float64),
+        ]
+        with self.lock:
+            rows = [
+                (name.encode(), count, total, total / count, maximum)
+                for name, (count, total, maximum) in self.stages.items()
+            ]
+        return np.array(rows, dtype=dtype)
+
+
+class ImageWriter(object):
+    """List-like container passed to a camera's grab_multiple() in place of a list,
+    which saves each image to the shot file as it is appended, so that saving is
+    overlapped with acquisition instead of done after the end of the shot. Images are
+    matched to exposures in order of exposure time, and saved to datasets keyed by
+    name and frametype within image_path, as one image or as an array of images if
+    there are several with the same name and frametype. Each dataset is created when
+    its first image arrives, with space for all its images and chunked with one image
+    per chunk. Images are compressed in the thread pool of frame_compression, and
+    written in order as their compression completes. The shot file is opened for each
+    write rather than for the whole shot, so that other processes are not blocked from
+    it by the h5 lock.
+
+    If a frame pool is given, a preallocated array of shape (n_images, height, width),
+    images are stored in it, so that they are saved and sent to the GUI from it without
+    further copies. Cameras may decode images directly into it, by decoding each into
+    the array returned by get_frame_buffer() before appending it. Images of a
+    different shape or dtype from the pool are stored separately.
+
+    If an AcquisitionTiming is given, the latency of the first image since the
+    ImageWriter was created, the intervals between subsequent images, and the
+    durations of writes to the shot file are recorded in it."""
+
+    def __init__(
+        self,
+        h5_filepath,
+        image_path,
+        exposures,
+        compression_kwargs,
+        frame_pool=None,
+        timing=None,
+    ):
+        self.h5_filepath = h5_filepath
+        self.image_path = image_path
+        self.compression_kwargs = compression_kwargs
+        self.frame_pool = frame_pool
+        self.timing = timing
+        self.last_image_time = perf_counter()
+        self.images = []
+        # Whether all images so far are in the frame pool:
+        self.all_pooled = frame_pool is not None
+        # Dataset and index within it of each image, in order of exposure time:
+        self.keys = []
+        self.counts = {}
+        for exposure in np.sort(exposures, order='t'):
+            key = (exposure['name'], exposure['frametype'])
+            self.keys.append((key, self.counts.get(key, 0)))
+            self.counts[key] = self.counts.get(key, 0) + 1
+        self.compressors = {}
+        # Futures of the compressed chunks of images submitted but not yet written:
+        self.futures = {}
+        self.n_submitted = 0
+        self.n_written = 0
+        # An exception raised saving images in the acquisition thread, in which case the
+        # remaining images are saved by finish() instead:
+        self.write_error = None
+
+    def __len__(self):
+        return len(self.images)
+
+    def __iter__(self):
+        return iter(self.images)
+
+    def __getitem__(self, index):
+        return self.images[index]
+
+    def get_frame_buffer(self, index=None):
+        """Return the element of the frame pool for the next image, or for the image of
+        the given index, or None if there is no frame pool or it is full"""
+        if index is None:
+            index = len(self.images)
+        if self.frame_pool is None or index >= len(self.frame_pool):
+            return None
+        return self.frame_pool[index]
+
+    def append(self, image):
+        self.extend([image])
+
+    def extend(self, images):
+        for image in images:
+            if self.timing is not None:
+                image_time = perf_counter()
+                stage = 'frame_interval' if self.images else 'first_frame'
+                self.timing.record(stage, image_time - self.last_image_time)
+                self.last_image_time = image_time
+            out = self.get_frame_buffer()
+            if out is not None and not np.may_share_memory(image, out):
+                if image.shape == out.shape and np.can_cast(image.dtype, out.dtype):
+                    np.copyto(out, image)
+                else:
+                    out = None
+            if out is None:
+                self.all_pooled = False
+                self.images.append(image)
+            else:
+                self.images.append(out)
+        if self.write_error is None:
+            try:
+                self.write_images()
+            except Exception as e:
+                self.write_error = e
+
+    def write_images(self, wait=False):
+        """Start compressing any new images, and save those whose compression is
+        complete to the shot file, in order. If wait is True, wait for all images to
+        be compressed and save them."""
+        n_images = min(len(self.images), len(self.keys))
+        if self.n_written >= n_images:
+            return
+        start_time = perf_counter()
+        with h5py.File(self.h5_filepath, 'r+') as f:
+            image_group = f[self.image_path]
+            while self.n_submitted < n_images:
+                image = self.images[self.n_submitted]
+                key, index = self.keys[self.n_submitted]
+                name, frametype = key
+                group = image_group.require_group(name)
+                if index == 0:
+                    if frametype in group:
+                        # Left over from an aborted run of this shot:
+                        del group[frametype]
+                    dset = self._create_dataset(
+                        group, frametype, image.shape, self.counts[key]
+                    )
+                    self.compressors[key] = get_chunk_compressor(dset)
+                else:
+                    dset = group[frametype]
+                if self.compressors[key] is not None:
+                    self.futures[self.n_submitted] = submit_frame(
+                        dset, image, self.compressors[key]
+                    )
+                self.n_submitted += 1
+            while self.n_written < self.n_submitted:
+                future = self.futures.get(self.n_written)
+                if not (wait or future is None or future.done()):
+                    break
+                image = self.images[self.n_written]
+                (name, frametype), index = self.keys[self.n_written]
+                dset = image_group[name][frametype]
+                if dset.ndim == image.ndim:
+                    index = None
+                write_frame(dset, image, future, index)
+                self.futures.pop(self.n_written, None)
+                self.n_written += 1
+        if self.timing is not None:
+            self.timing.record('hdf5_write', perf_counter() - start_time)
+
+    def _create_dataset(self, group, frametype, shape, count):
+        dset = create_frames_dataset(
+            group,
+            frametype,
+            shape,
+            count=count if count > 1 else None,
+            compression_kwargs=self.compression_kwargs,
+        )
+        # Specify this dataset should be viewed as an image
+        dset.attrs['CLASS'] = np.bytes_('IMAGE')
+        dset.attrs['IMAGE_VERSION'] = np.bytes_('1.2')
+        dset.attrs['IMAGE_SUBCLASS'] = np.bytes_('IMAGE_GRAYSCALE')
+        dset.attrs['IMAGE_WHITE_IS_ZERO'] = np.uint8(0)
+        return dset
+
+    def stack(self):
+        """Return the images as a single array. This is a view of the frame pool if all
+        images are in it, otherwise a new array. Raises ValueError if the images are
+        not all the same shape."""
+        if self.all_pooled:
+            return self.frame_pool[: len(self.images)]
+        return np.stack(self.images)
+
+    def finish(self, attributes=None):
+        """Save any images not yet saved, waiting for their compression to complete,
+        truncate arrays of images to the number acquired if fewer than expected, and
+        record whether the shot failed, and any other given attributes, such as
+        statistics of the camera's stream. Call after acquisition is complete."""
+        self.write_images(wait=True)
+        n_images = min(len(self.images), len(self.keys))
+        received = {}
+        for key, index in self.keys[:n_images]:
+            received[key] = index + 1
+        with h5py.File(self.h5_filepath, 'r+') as f:
+            image_group = f[self.image_path]
+            for (name, frametype), count in received.items():
+                if count < self.counts[(name, frametype)]:
+                    dset = image_group[name][frametype]
+                    dset.resize(count, axis=0)
+            # Whether we failed to get all the expected exposures:
+            image_group.attrs['failed_shot'] = len(self.images) != len(self.keys)
+            if attributes is not None:
+                set_attributes(image_group, attributes)
+
+
+class FrameDecoder(object):
+    """Decodes frames retrieved from a camera driver in a pool of threads, and appends
+    them to `images` in order from another thread. This leaves a camera's
+    grab_multiple() free to only retrieve frames from the driver, so that bursts of
+    frames faster than they can be decoded and saved one at a time do not overrun the
+    driver's buffers.
+
+    `decode` is called as decode(frame, out) with each frame passed to submit(), and
+    must return the decoded image, copied into the array `out` if it is not None, and
+    return the frame's buffer to the driver. Frames are decoded into the frame pool of
+    `images`, if any, and their decoding is timed if `images` has an AcquisitionTiming.
+    Call finish() once all frames have been submitted."""
+
+    # Number of threads decoding frames:
+    n_threads = 4
+
+    def __init__(self, images, decode):
+        self.images = images
+        self.decode = decode
+        self.timing = getattr(images, 'timing', None)
+        self.n_submitted = 0
+        # An exception raised decoding a frame, after which no more are appended:
+        self.error = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.n_threads, thread_name_prefix='frame_decoder'
+        )
+        # Futures of decoded images, in order, to be appended to images:
+        self.futures = Queue()
+        self.append_thread = threading.Thread(target=self._append_loop, daemon=True)
+        self.append_thread.start()
+
+    def submit(self, frame):
+        """Start decoding a frame retrieved from the driver"""
+        out = get_frame_buffer(self.images, self.n_submitted)
+        self.futures.put(self.executor.submit(self._decode, frame, out))
+        self.n_submitted += 1
+
+    def _decode(self, frame, out):
+        if self.timing is None:
+            return self.decode(frame, out)
+        with self.timing.stage('decode'):
+            return self.decode(frame, out)
+
+    def _append_loop(self):
+        while True:
+            future = self.futures.get()
+            if future is None:
+                break
+            if self.error is not None:
+                # Keep waiting for the remaining frames so that their buffers are
+                # returned to the driver before finish() returns:
+                future.exception()
+                continue
+            try:
+                self.images.append(future.result())
+            except Exception as e:
+                self.error = e
+
+    def finish(self, raise_error=True):
+        """Wait for all submitted frames to be decoded and appended to images. Raises
+        any exception raised decoding or appending them, unless raise_error is False,
+        as when retrieving frames has itself raised an exception that should not be
+        replaced by this one."""
+        self.futures.put(None)
+        self.append_thread.join()
+        self.executor.shutdown()
+        if self.error is not None and raise_error:
+            raise self.error
+
+
 class IMAQdxCameraWorker(Worker):
     # Subclasses may override this if their interface class takes only the serial number
     # as an instantiation argument, otherwise they may reimplement get_camera():
     interface_class = IMAQdx_Camera
+    # Number of recent shots over which get_timing_summary() summarises timing:
+    timing_history_length = 20
 
     def init(self):
         self.camera = self.get_camera()
         # print("Setting attributes...")
         self.smart_cache = {}
+        # Names of the camera's attributes for each visibility level, along with the
+        # attributes set when they were found:
+        self.attribute_names = {}
         self.set_attributes_smart(self.manual_mode_camera_attributes)
         self.set_attributes_smart(self.camera_attributes)
         self.set_attributes_smart(self.manual_mode_camera_attributes)
@@ -314,10 +725,20 @@ class IMAQdxCameraWorker(Worker):
         self.h5_filepath = None
         self.stop_acquisition_timeout = None
         self.exception_on_failed_shot = None
+        # Preallocated array that buffered images are stored in, reused between shots:
+        self.frame_pool = None
+        # Timing of the stages of acquisition of the current shot, of recent shots, and
+        # of continuous acquisition:
+        self.timing = None
+        self.timing_history = deque(maxlen=self.timing_history_length)
+        self.continuous_timing = None
         self.continuous_stop = threading.Event()
         self.continuous_thread = None
         self.continuous_dt = None
-        self.image_socket = Context().socket(zmq.REQ)
+        # Images are pushed to the GUI with a high-water mark of one, so that frames are
+        # dropped rather than queued if the GUI is lagging behind:
+        self.image_socket = Context().socket(zmq.PUSH)
+        self.image_socket.setsockopt(zmq.SNDHWM, 1)
         self.image_socket.connect(
             f'tcp://{self.parent_host}:{self.image_receiver_port}'
         )
@@ -342,11 +763,34 @@ class IMAQdxCameraWorker(Worker):
                 self.smart_cache[name] = value
         self.camera.set_attributes(uncached_attributes)
 
+    def get_attribute_names(self, visibility_level):
+        """Return the names of the camera's attributes for the given visibility level.
+        Finding them requires traversing all of the camera's attributes, so they are
+        cached for each visibility level along with the attributes set by
+        set_attributes_smart() at the time. Which attributes are available depends on
+        the values of others, so the cached names are only used whilst those are the
+        same, which they are each shot if the manual mode and buffered attributes are
+        the same each shot. Names are not cached during continuous acquisition, during
+        which some attributes may not be writeable and so would be missing."""
+        if visibility_level in self.attribute_names:
+            attributes, names = self.attribute_names[visibility_level]
+            if attributes == self.smart_cache:
+                return names
+        names = self.camera.get_attribute_names(visibility_level)
+        if self.continuous_thread is None:
+            self.attribute_names[visibility_level] = (dict(self.smart_cache), names)
+        return names
+
     def get_attributes_as_dict(self, visibility_level):
         """Return a dict of the attributes of the camera for the given visibility
-        level"""
-        names = self.camera.get_attribute_names(visibility_level)
-        attributes_dict = {name: self.camera.get_attribute(name) for name in names}
+        level. Attributes whose value is None, which some cameras return for
+        attributes that are not readable, are omitted."""
+        names = self.get_attribute_names(visibility_level)
+        attributes_dict = {}
+        for name in names:
+            value = self.camera.get_attribute(name)
+            if value is not None:
+                attributes_dict[name] = value
         return attributes_dict
 
     def get_attributes_as_text(self, visibility_level):
@@ -360,26 +804,38 @@ class IMAQdxCameraWorker(Worker):
 
     def snap(self):
         """Acquire one frame in manual mode. Send it to the parent via
-        self.image_socket. Wait for a response from the parent."""
+        self.image_socket."""
         image = self.camera.snap()
         self._send_image_to_parent(image)
 
     def _send_image_to_parent(self, image):
-        """Send the image to the GUI to display. This will block if the parent process
-        is lagging behind in displaying frames, in order to avoid a backlog."""
+        """Send the image to the GUI to display, binned if it is larger than
+        self.live_view_max_size. This does not block: if the parent process is lagging
+        behind in displaying frames, the frame is dropped."""
+        if self.live_view_max_size is not None:
+            image = bin_image(image, self.live_view_max_size)
         metadata = dict(dtype=str(image.dtype), shape=image.shape)
-        self.image_socket.send_json(metadata, zmq.SNDMORE)
-        self.image_socket.send(image, copy=False)
-        response = self.image_socket.recv()
-        assert response == b'ok', response
+        # The frame pool is overwritten by the next shot, possibly before a zero-copy
+        # send of an image in it completes, so such images are copied:
+        copy = self.frame_pool is not None and np.may_share_memory(
+            image, self.frame_pool
+        )
+        try:
+            self.image_socket.send_json(metadata, zmq.SNDMORE | zmq.NOBLOCK)
+        except zmq.Again:
+            # The GUI has not yet received the previous frame. Drop this one:
+            return
+        self.image_socket.send(image, copy=copy)
 
     def continuous_loop(self, dt):
         """Acquire continuously in a loop, with minimum repetition interval dt"""
         while True:
             if dt is not None:
                 t = perf_counter()
-            image = self.camera.grab()
-            self._send_image_to_parent(image)
+            with self.continuous_timing.stage('grab'):
+                image = self.camera.grab()
+            with self.continuous_timing.stage('gui_send'):
+                self._send_image_to_parent(image)
             if dt is None:
                 timeout = 0
             else:
@@ -393,6 +849,7 @@ class IMAQdxCameraWorker(Worker):
         dt"""
         assert self.continuous_thread is None
         self.camera.configure_acquisition()
+        self.continuous_timing = AcquisitionTiming()
         self.continuous_thread = threading.Thread(
             target=self.continuous_loop, args=(dt,), daemon=True
         )
@@ -415,7 +872,23 @@ class IMAQdxCameraWorker(Worker):
         if not pause:
             self.continuous_dt = None
 
+    def get_timing_summary(self):
+        """Return how long each stage of acquisition has taken, for monitoring from the
+        BLACS tab: the count, and mean and maximum duration in seconds, of each stage
+        over the last timing_history_length shots, and of continuous acquisition since
+        it was last started."""
+        if self.continuous_timing is not None:
+            continuous = self.continuous_timing.summary()
+        else:
+            continuous = {}
+        return {
+            'n_shots': len(self.timing_history),
+            'shots': AcquisitionTiming.combine(self.timing_history).summary(),
+            'continuous': continuous,
+        }
+
     def transition_to_buffered(self, device_name, h5_filepath, initial_values, fresh):
+        start_time = perf_counter()
         if getattr(self, 'is_remote', False):
             h5_filepath = path_to_local(h5_filepath)
         if self.continuous_thread is not None:
@@ -427,6 +900,7 @@ class IMAQdxCameraWorker(Worker):
             if not 'EXPOSURES' in group:
                 return {}
             self.h5_filepath = h5_filepath
+            self.timing = AcquisitionTiming()
             self.exposures = group['EXPOSURES'][:]
             self.n_images = len(self.exposures)
 
@@ -439,6 +913,10 @@ class IMAQdxCameraWorker(Worker):
             self.exception_on_failed_shot = properties['exception_on_failed_shot']
             saved_attr_level = properties['saved_attribute_visibility_level']
             self.camera.exception_on_failed_shot = self.exception_on_failed_shot
+            compression_kwargs = get_compression_kwargs(
+                properties.get('image_compression', 'gzip'),
+                properties.get('image_compression_opts', None),
+            )
         # Only reprogram attributes that differ from those last programmed in, or all of
         # them if a fresh reprogramming was requested:
         if fresh:
@@ -449,22 +927,63 @@ class IMAQdxCameraWorker(Worker):
             self.attributes_to_save = self.get_attributes_as_dict(saved_attr_level)
         else:
             self.attributes_to_save = None
+        # Use orientation for image path, device_name if orientation unspecified
+        if self.orientation is not None:
+            image_path = 'images/' + self.orientation
+        else:
+            image_path = 'images/' + self.device_name
+        with h5py.File(h5_filepath, 'r+') as f:
+            image_group = f.require_group(image_path)
+            image_group.attrs['camera'] = self.device_name
+
+            # Save camera attributes to the HDF5 file:
+            if self.attributes_to_save is not None:
+                set_attributes(image_group, self.attributes_to_save)
         # print(f"Configuring camera for {self.n_images} images.")
         self.camera.configure_acquisition(continuous=False, bufferCount=self.n_images)
-        self.images = []
+        # Images are saved to the shot file by the acquisition thread as they arrive:
+        self.images = ImageWriter(
+            h5_filepath,
+            image_path,
+            self.exposures,
+            compression_kwargs,
+            frame_pool=self.get_frame_pool(),
+            timing=self.timing,
+        )
         self.acquisition_thread = threading.Thread(
             target=self.camera.grab_multiple,
             args=(self.n_images, self.images),
             daemon=True,
         )
         self.acquisition_thread.start()
+        self.timing.record('arm', perf_counter() - start_time)
         return {}
 
+    def get_frame_pool(self):
+        """Return an array for storing the images of the shot, of the image shape and
+        dtype reported by the camera's get_image_format(), if any. The array from the
+        previous shot is reused if it is large enough and of the same format."""
+        get_image_format = getattr(self.camera, 'get_image_format', None)
+        image_format = get_image_format() if get_image_format is not None else None
+        if image_format is None:
+            return None
+        shape, dtype = image_format
+        pool = self.frame_pool
+        if (
+            pool is None
+            or pool.shape[1:] != tuple(shape)
+            or pool.dtype != dtype
+            or len(pool) < self.n_images
+        ):
+            pool = self.frame_pool = np.empty((self.n_images,) + tuple(shape), dtype)
+        return pool[: self.n_images]
+
     def transition_to_manual(self):
         if self.h5_filepath is None:
             # print('No camera exposures in this shot.\n')
             return True
         assert self.acquisition_thread is not None
+        start_time = perf_counter()
         self.acquisition_thread.join(timeout=self.stop_acquisition_timeout)
         if self.acquisition_thread.is_alive():
             msg = """Acquisition thread did not finish. Likely did not acquire expected
@@ -477,64 +996,39 @@ class IMAQdxCameraWorker(Worker):
                 self.acquisition_thread.join()
                 # print(dedent(msg), file=sys.stderr)
         self.acquisition_thread = None
+        self.timing.record('wait_for_acquisition', perf_counter() - start_time)
 
         # print("Stopping acquisition.")
-        self.camera.stop_acquisition()
-
-        # print(f"Saving {len(self.images)}/{len(self.exposures)} images.")
-
-        with h5py.File(self.h5_filepath, 'r+') as f:
-            # Use orientation for image path, device_name if orientation unspecified
-            if self.orientation is not None:
-                image_path = 'images/' + self.orientation
-            else:
-                image_path = 'images/' + self.device_name
-            image_group = f.require_group(image_path)
-            image_group.attrs['camera'] = self.device_name
-
-            # Save camera attributes to the HDF5 file:
-            if self.attributes_to_save is not None:
-                set_attributes(image_group, self.attributes_to_save)
-
-            # Whether we failed to get all the expected exposures:
-            image_group.attrs['failed_shot'] = len(self.images) != len(self.exposures)
-
-            # key the images by name and frametype. Allow for the case of there being
-            # multiple images with the same name and frametype. In this case we will
-            # save an array of images in a single dataset.
-            images = {
-                (exposure['name'], exposure['frametype']): []
-                for exposure in self.exposures
-            }
+        with self.timing.stage('stop_acquisition'):
+            self.camera.stop_acquisition()
 
-            # Iterate over expected exposures, sorted by acquisition time, to match them
-            # up with the acquired images:
-            self.exposures.sort(order='t')
-            for image, exposure in zip(self.images, self.exposures):
-                images[(exposure['name'], exposure['frametype'])].append(image)
+        # Statistics of the camera's stream, such as the number of buffer underruns, are
+        # saved with the images if the camera provides them:
+        get_stream_statistics = getattr(self.camera, 'get_stream_statistics', None)
+        if get_stream_statistics is not None:
+            stream_statistics = get_stream_statistics()
+        else:
+            stream_statistics = None
 
-            # Save images to the HDF5 file:
-            for (name, frametype), imagelist in images.items():
-                data = imagelist[0] if len(imagelist) == 1 else np.array(imagelist)
-                # print(f"Saving frame(s) {name}/{frametype}.")
-                group = image_group.require_group(name)
-                dset = group.create_dataset(
-                    frametype, data=data, dtype='uint16', compression='gzip'
-                )
-                # Specify this dataset should be viewed as an image
-                dset.attrs['CLASS'] = np.string_('IMAGE')
-                dset.attrs['IMAGE_VERSION'] = np.string_('1.2')
-                dset.attrs['IMAGE_SUBCLASS'] = np.string_('IMAGE_GRAYSCALE')
-                dset.attrs['IMAGE_WHITE_IS_ZERO'] = np.uint8(0)
+        # print(f"Saving {len(self.images)}/{len(self.exposures)} images.")
+        with self.timing.stage('finish_saving'):
+            self.images.finish(stream_statistics)
 
         # If the images are all the same shape, send them to the GUI for display:
         try:
-            image_block = np.stack(self.images)
+            image_block = self.images.stack()
         except ValueError:
             pass# print("Cannot display images in the GUI, they are not all the same shape")
         else:
-            self._send_image_to_parent(image_block)
+            with self.timing.stage('gui_send'):
+                self._send_image_to_parent(image_block)
+
+        # Save how long each stage took with the images:
+        with h5py.File(self.h5_filepath, 'r+') as f:
+            f[self.images.image_path].attrs['acquisition_timing'] = self.timing.table()
+        self.timing_history.append(self.timing)
 
+        self.timing = None
         self.images = None
         self.n_images = None
         self.attributes_to_save = None
@@ -557,6 +1051,7 @@ class IMAQdxCameraWorker(Worker):
             self.acquisition_thread = None
             self.camera.stop_acquisition()
         self.camera._abort_acquisition = False
+        self.timing = None
         self.images = None
         self.n_images = None
         self.attributes_to_save = None
@@ -30,12 +30,15 @@ class IMAQdxCamera(TriggerableDevice):
                 "magnification",
                 "manual_mode_camera_attributes",
                 "mock",
+                "live_view_max_size",
             ],
             "device_properties": [
                 "camera_attributes",
                 "stop_acquisition_timeout",
                 "exception_on_failed_shot",
-                "saved_attribute_visibility_level"
+                "saved_attribute_visibility_level",
+                "image_compression",
+                "image_compression_opts",
             ],
         }
     )
@@ -56,6 +59,9 @@ class IMAQdxCamera(TriggerableDevice):
         stop_acquisition_timeout=5.0,
         exception_on_failed_shot=True,
         saved_attribute_visibility_level='intermediate',
+        image_compression='gzip',
+        image_compression_opts=None,
+        live_view_max_size=None,
         mock=False,
         **kwargs
     ):
@@ -146,6 +152,27 @@ class IMAQdxCamera(TriggerableDevice):
                 `'simple'`, `'intermediate'`, `'advanced'`, or `None`. If `None`, no
                 attributes will be saved.
 
+            image_compression (str or None), default: `'gzip'`
+                Compression filter of the image datasets saved to the HDF5 file. Must be
+                one of `'gzip'`, `'lzf'`, `'lz4'`, `'blosc'`, or `None` for no
+                compression. `'lz4'` and `'blosc'` are much faster than `'gzip'` for
+                large images, but require the `hdf5plugin` package to be installed on
+                the BLACS computer, and wherever the shot files are read. Datasets are
+                chunked with one image per chunk.
+
+            image_compression_opts (optional), default: `None`
+                Options for the compression filter. For `'gzip'`, the compression
+                level from 0 to 9. For `'lz4'` and `'blosc'`, a dictionary of keyword
+                arguments to `hdf5plugin.LZ4` or `hdf5plugin.Blosc`, for example
+                `{'cname': 'lz4', 'clevel': 5, 'shuffle': 2}`.
+
+            live_view_max_size (int or None), default: `None`
+                Maximum width and height in pixels of images sent to the BLACS tab for
+                display. Larger images are binned by an integer factor before being
+                sent, reducing the bandwidth between the worker and the GUI for large
+                cameras. Images saved to the HDF5 file are unaffected. If `None`,
+                images are displayed at full size.
+
             mock (bool, optional), default: False
                 For testing purpses, simulate a camera with fake data instead of
                 communicating with actual hardware.
@@ -178,6 +205,12 @@ class IMAQdxCamera(TriggerableDevice):
         if saved_attribute_visibility_level not in valid_attr_levels:
             msg = "saved_attribute_visibility_level must be one of %s"
             raise ValueError(msg % valid_attr_levels)
+        valid_compressions = ('gzip', 'lzf', 'lz4', 'blosc', None)
+        if image_compression not in valid_compressions:
+            msg = "image_compression must be one of %s"
+            raise ValueError(msg % (valid_compressions,))
+        if live_view_max_size is not None and live_view_max_size < 1:
+            raise ValueError("live_view_max_size must be a positive integer or None")
         self.camera_attributes = camera_attributes
         self.manual_mode_camera_attributes = manual_mode_camera_attributes
         self.exposures = []
@@ -0,0 +1,71 @@
+#####################################################################
+#                                                                   #
+# /labscript_devices/IMAQdxCamera/testing/conftest.py               #
+#                                                                   #
+# This file is part of labscript_devices, in the labscript suite    #
+# (see http://labscriptsuite.org), and is licensed under the        #
+# Simplified BSD License. See the license.txt file in the root of   #
+# the project for the full license.                                 #
+#                                                                   #
+#####################################################################
+"""Fixtures shared by the tests of saving camera images, making the exposures of a
+shot and an ImageWriter saving to a shot file."""
+import labscript_utils.h5_lock
+import h5py
+import numpy as np
+import pytest
+
+from labscript_devices.IMAQdxCamera.blacs_workers import ImageWriter
+
+IMAGE_PATH = 'images/camera'
+
+
+def _make_exposures(n_exposures, rng=None):
+    """Return an exposures table as saved by the camera's labscript device. If rng is
+    None, the exposures are all absorption atoms frames in order, otherwise their
+    names, frametypes and order are random"""
+    vlenstr = h5py.special_dtype(vlen=str)
+    exposures = np.zeros(
+        n_exposures, dtype=[('t', float), ('name', vlenstr), ('frametype', vlenstr)]
+    )
+    if rng is None:
+        exposures['t'] = np.arange(n_exposures)
+        exposures['name'] = 'absorption'
+        exposures['frametype'] = 'atoms'
+    else:
+        exposures['t'] = rng.permutation(n_exposures)
+        exposures['name'] = rng.choice(['absorption', 'fluorescence'], n_exposures)
+        exposures['frametype'] = rng.choice(
+            ['atoms', 'probe', 'background'], n_exposures
+        )
+    return exposures
+
+
+@pytest.fixture
+def make_exposures():
+    return _make_exposures
+
+
+@pytest.fixture
+def make_image_writer(tmp_path):
+    """Return a function making an ImageWriter for the given exposures, saving to
+    the images group of a new shot file in tmp_path"""
+
+    def make_image_writer(
+        exposures, compression_kwargs=None, frame_pool=None, timing=None
+    ):
+        h5_filepath = str(tmp_path / 'shot.h5')
+        with h5py.File(h5_filepath, 'w') as f:
+            f.require_group(IMAGE_PATH)
+        if compression_kwargs is None:
+            compression_kwargs = {}
+        return ImageWriter(
+            h5_filepath,
+            IMAGE_PATH,
+            exposures,
+            compression_kwargs,
+            frame_pool=frame_pool,
+            timing=timing,
+        )
+
+    return make_image_writer
@@ -0,0 +1,63 @@
+#####################################################################
+#                                                                   #
+# /labscript_devices/IMAQdxCamera/testing/test_acquisition_timing.py #
+#                                                                   #
+# This file is part of labscript_devices, in the labscript suite    #
+# (see http://labscriptsuite.org), and is licensed under the        #
+# Simplified BSD License. See the license.txt file in the root of   #
+# the project for the full license.                                 #
+#                                                                   #
+#####################################################################
+"""Test of the recording of the durations of the stages of acquisition by
+AcquisitionTiming, and of the stages recorded by ImageWriter."""
+import time
+
+import labscript_utils.h5_lock
+import h5py
+import numpy as np
+import pytest
+
+from labscript_devices.IMAQdxCamera.blacs_workers import AcquisitionTiming
+
+
+def test_acquisition_timing(tmp_path):
+    timing = AcquisitionTiming()
+    with timing.stage('arm'):
+        time.sleep(0.01)
+    for duration in [0.5, 1.5, 1.0]:
+        timing.record('decode', duration)
+    summary = timing.summary()
+    assert list(summary) == ['arm', 'decode']
+    assert summary['arm']['count'] == 1
+    assert summary['arm']['mean'] >= 0.01
+    assert summary['decode'] == {'count': 3, 'mean': 1.0, 'max': 1.5}
+
+    other = AcquisitionTiming()
+    other.record('decode', 2.0)
+    other.record('hdf5_write', 0.25)
+    combined = AcquisitionTiming.combine([timing, other]).summary()
+    assert combined['decode'] == {'count': 4, 'mean': 1.25, 'max': 2.0}
+    assert combined['hdf5_write'] == {'count': 1, 'mean': 0.25, 'max': 0.25}
+    assert AcquisitionTiming.combine([]).summary() == {}
+
+    # The table round trips through the shot file's attributes:
+    with h5py.File(str(tmp_path / 'shot.h5'), 'w') as f:
+        f.attrs['acquisition_timing'] = timing.table()
+        table = f.attrs['acquisition_timing']
+    assert list(table['stage']) == [b'arm', b'decode']
+    assert list(table['count']) == [1, 3]
+    assert table['total'][1] == pytest.approx(3.0)
+    assert table['max'][1] == 1.5
+
+
+def test_image_writer_timing(make_exposures, make_image_writer):
+    n_images = 5
+    timing = AcquisitionTiming()
+    writer = make_image_writer(make_exposures(n_images), timing=timing)
+    for i in range(n_images):
+        writer.append(np.full((8, 12), i, dtype=np.uint16))
+    writer.finish()
+    summary = timing.summary()
+    assert summary['first_frame']['count'] == 1
+    assert summary['frame_interval']['count'] == n_images - 1
+    assert summary['hdf5_write']['count'] >= 1
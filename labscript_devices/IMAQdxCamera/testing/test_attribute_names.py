@@ -0,0 +1,67 @@
+#####################################################################
+#                                                                   #
+# /labscript_devices/IMAQdxCamera/testing/test_attribute_names.py   #
+#                                                                   #
+# This file is part of labscript_devices, in the labscript suite    #
+# (see http://labscriptsuite.org), and is licensed under the        #
+# Simplified BSD License. See the license.txt file in the root of   #
+# the project for the full license.                                 #
+#                                                                   #
+#####################################################################
+"""Test of the caching of camera attribute names by IMAQdxCameraWorker, over shots
+alternating between manual mode and buffered attributes."""
+from labscript_devices.IMAQdxCamera.blacs_workers import IMAQdxCameraWorker, MockCamera
+
+MANUAL_ATTRIBUTES = {'TriggerMode': 'Off', 'ExposureTime': 1000}
+BUFFERED_ATTRIBUTES = {'TriggerMode': 'On', 'ExposureTime': 1000, 'Gain': 2}
+
+
+class CountingCamera(MockCamera):
+    """A mock camera counting the traversals of its attributes"""
+
+    def __init__(self):
+        MockCamera.__init__(self)
+        self.n_traversals = 0
+
+    def get_attribute_names(self, visibility_level=None):
+        self.n_traversals += 1
+        return MockCamera.get_attribute_names(self, visibility_level)
+
+
+def make_worker():
+    worker = IMAQdxCameraWorker.__new__(IMAQdxCameraWorker)
+    worker.camera = CountingCamera()
+    worker.smart_cache = {}
+    worker.attribute_names = {}
+    worker.continuous_thread = None
+    return worker
+
+
+def run_shot(worker, buffered_attributes):
+    """The setting and saving of attributes by transition_to_buffered() and
+    transition_to_manual()"""
+    worker.set_attributes_smart(buffered_attributes)
+    attributes = worker.get_attributes_as_dict('simple')
+    worker.set_attributes_smart(MANUAL_ATTRIBUTES)
+    return attributes
+
+
+def test_attribute_names_cached_over_shots():
+    worker = make_worker()
+    worker.set_attributes_smart(MANUAL_ATTRIBUTES)
+    for _ in range(5):
+        attributes = run_shot(worker, BUFFERED_ATTRIBUTES)
+        assert attributes == BUFFERED_ATTRIBUTES
+    assert worker.camera.n_traversals == 1
+
+
+def test_attribute_names_changed_attributes():
+    worker = make_worker()
+    worker.set_attributes_smart(MANUAL_ATTRIBUTES)
+    run_shot(worker, BUFFERED_ATTRIBUTES)
+    # Different attributes may make others available, so names are found again:
+    attributes = run_shot(worker, dict(BUFFERED_ATTRIBUTES, Gain=3))
+    assert attributes['Gain'] == 3
+    assert worker.camera.n_traversals == 2
+    run_shot(worker, dict(BUFFERED_ATTRIBUTES, Gain=3))
+    assert worker.camera.n_traversals == 2
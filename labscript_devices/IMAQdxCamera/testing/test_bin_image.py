@@ -0,0 +1,40 @@
+#####################################################################
+#                                                                   #
+# /labscript_devices/IMAQdxCamera/testing/test_bin_image.py         #
+#                                                                   #
+# This file is part of labscript_devices, in the labscript suite    #
+# (see http://labscriptsuite.org), and is licensed under the        #
+# Simplified BSD License. See the license.txt file in the root of   #
+# the project for the full license.                                 #
+#                                                                   #
+#####################################################################
+"""Test of the binning of images sent to the BLACS tab for display"""
+import numpy as np
+import pytest
+
+from labscript_devices.IMAQdxCamera.blacs_workers import bin_image
+
+
+def test_small_image_unchanged():
+    image = np.zeros((8, 12), dtype=np.uint16)
+    assert bin_image(image, 12) is image
+
+
+@pytest.mark.parametrize("shape", [(8, 12), (3, 8, 12), (101, 37), (4, 1000, 999)])
+@pytest.mark.parametrize("max_size", [1, 5, 6, 50])
+def test_bin_image(shape, max_size):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 2 ** 16, shape, dtype=np.uint16)
+    binned = bin_image(image, max_size)
+    assert binned.dtype == image.dtype
+    assert binned.shape[:-2] == image.shape[:-2]
+    assert max(binned.shape[-2:]) <= max_size
+    factor = -(-max(shape[-2:]) // max_size)
+    if factor == 1:
+        assert binned is image
+    else:
+        y_factor, x_factor = min(factor, shape[-2]), min(factor, shape[-1])
+        assert binned.shape[-2:] == (shape[-2] // y_factor, shape[-1] // x_factor)
+        block = image[..., :y_factor, :x_factor]
+        expected = block.mean(axis=(-2, -1)).astype(np.uint16)
+        assert np.array_equal(binned[..., 0, 0], expected)
@@ -0,0 +1,105 @@
+#####################################################################
+#                                                                   #
+# /labscript_devices/IMAQdxCamera/testing/test_frame_decoder.py     #
+#                                                                   #
+# This file is part of labscript_devices, in the labscript suite    #
+# (see http://labscriptsuite.org), and is licensed under the        #
+# Simplified BSD License. See the license.txt file in the root of   #
+# the project for the full license.                                 #
+#                                                                   #
+#####################################################################
+"""Test of the decoding of frames in a thread pool by FrameDecoder, with frames
+decoded out of order and appended to an ImageWriter in order."""
+import time
+
+import labscript_utils.h5_lock
+import h5py
+import numpy as np
+import pytest
+
+from labscript_devices.IMAQdxCamera.blacs_workers import FrameDecoder, copy_frame
+
+
+class Frame(object):
+    """A frame in a mock driver buffer, which must be released"""
+
+    def __init__(self, data, delay, fail=False):
+        self.data = data
+        self.delay = delay
+        self.fail = fail
+        self.released = False
+
+
+def decode(frame, out=None):
+    try:
+        time.sleep(frame.delay)
+        if frame.fail:
+            raise RuntimeError("Grab Error")
+        return copy_frame(frame.data, out)
+    finally:
+        frame.released = True
+
+
+@pytest.fixture
+def make_writer(make_exposures, make_image_writer):
+    def make_writer(n_images, pooled):
+        frame_pool = np.empty((n_images, 8, 12), dtype=np.uint16) if pooled else None
+        return make_image_writer(make_exposures(n_images), frame_pool=frame_pool)
+
+    return make_writer
+
+
+@pytest.mark.parametrize("pooled", [False, True])
+def test_frame_decoder(make_writer, pooled):
+    rng = np.random.default_rng(1)
+    n_images = 20
+    frames = [
+        Frame(rng.integers(0, 2 ** 16, (8, 12), dtype=np.uint16), rng.uniform(0, 0.01))
+        for _ in range(n_images)
+    ]
+    writer = make_writer(n_images, pooled)
+    decoder = FrameDecoder(writer, decode)
+    for frame in frames:
+        decoder.submit(frame)
+    decoder.finish()
+    assert all(frame.released for frame in frames)
+    assert np.array_equal(writer.stack(), np.array([frame.data for frame in frames]))
+    if pooled:
+        assert writer.stack().base is writer.frame_pool
+    writer.finish({'StreamBufferUnderrunCount': 0})
+    with h5py.File(writer.h5_filepath, 'r') as f:
+        assert not f[writer.image_path].attrs['failed_shot']
+        assert f[writer.image_path].attrs['StreamBufferUnderrunCount'] == 0
+
+
+def test_frame_decoder_error(make_writer):
+    n_images = 6
+    frames = [
+        Frame(np.full((8, 12), i, dtype=np.uint16), 0.001, fail=i == 2)
+        for i in range(n_images)
+    ]
+    writer = make_writer(n_images, True)
+    decoder = FrameDecoder(writer, decode)
+    for frame in frames:
+        decoder.submit(frame)
+    with pytest.raises(RuntimeError):
+        decoder.finish()
+    # Frames after the failed one are still released, but not appended:
+    assert all(frame.released for frame in frames)
+    assert len(writer) == 2
+
+
+def test_frame_decoder_error_not_raised(make_writer):
+    n_images = 4
+    frames = [
+        Frame(np.full((8, 12), i, dtype=np.uint16), 0.001, fail=i == 1)
+        for i in range(n_images)
+    ]
+    writer = make_writer(n_images, False)
+    decoder = FrameDecoder(writer, decode)
+    for frame in frames:
+        decoder.submit(frame)
+    # As when retrieving a frame raised, and that exception is propagating instead:
+    decoder.finish(raise_error=False)
+    assert all(frame.released for frame in frames)
+    assert len(writer) == 1
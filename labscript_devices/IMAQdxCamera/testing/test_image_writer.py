@@ -0,0 +1,113 @@
+#####################################################################
+#                                                                   #
+# /labscript_devices/IMAQdxCamera/testing/test_image_writer.py      #
+#                                                                   #
+# This file is part of labscript_devices, in the labscript suite    #
+# (see http://labscriptsuite.org), and is licensed under the        #
+# Simplified BSD License. See the license.txt file in the root of   #
+# the project for the full license.                                 #
+#                                                                   #
+#####################################################################
+"""Test of the incremental saving of images by ImageWriter against the saving of all
+images at the end of the shot previously in IMAQdxCameraWorker.transition_to_manual(),
+over random exposures."""
+import labscript_utils.h5_lock
+import h5py
+import numpy as np
+import pytest
+
+from labscript_devices.IMAQdxCamera.blacs_workers import (
+    MockCamera,
+    copy_frame,
+    get_frame_buffer,
+)
+from labscript_devices.frame_compression import get_compression_kwargs
+
+
+def save_images_reference(image_group, images, exposures):
+    """The saving previously in IMAQdxCameraWorker.transition_to_manual(), except
+    skipping datasets with no images, which previously raised an exception"""
+    image_group.attrs['failed_shot'] = len(images) != len(exposures)
+    grouped_images = {
+        (exposure['name'], exposure['frametype']): [] for exposure in exposures
+    }
+    exposures = np.sort(exposures, order='t')
+    for image, exposure in zip(images, exposures):
+        grouped_images[(exposure['name'], exposure['frametype'])].append(image)
+    for (name, frametype), imagelist in grouped_images.items():
+        if not imagelist:
+            continue
+        data = imagelist[0] if len(imagelist) == 1 else np.array(imagelist)
+        group = image_group.require_group(name)
+        group.create_dataset(frametype, data=data, dtype='uint16')
+
+
+def read_images(image_group):
+    datasets = {}
+    image_group.visititems(
+        lambda name, obj: datasets.update({name: obj[()]})
+        if isinstance(obj, h5py.Dataset)
+        else None
+    )
+    return datasets
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("compression", [None, 'gzip', 'lzf'])
+@pytest.mark.parametrize("pooled", [False, True])
+def test_image_writer(
+    tmp_path, make_exposures, make_image_writer, seed, compression, pooled
+):
+    rng = np.random.default_rng(seed)
+    n_exposures = int(rng.integers(1, 10))
+    exposures = make_exposures(n_exposures, rng)
+    # Some shots fail to acquire all images:
+    n_images = n_exposures if seed % 2 else int(rng.integers(0, n_exposures + 1))
+    images = [
+        rng.integers(0, 2 ** 16, (8, 12), dtype=np.uint16) for _ in range(n_images)
+    ]
+
+    reference_filepath = str(tmp_path / 'reference.h5')
+    frame_pool = np.empty((n_exposures, 8, 12), dtype=np.uint16) if pooled else None
+    writer = make_image_writer(
+        exposures, get_compression_kwargs(compression), frame_pool=frame_pool
+    )
+    image_path = writer.image_path
+    # Images are decoded into the frame pool and appended one at a time by most
+    # cameras, and appended in blocks by some:
+    for image in images[:1]:
+        writer.append(copy_frame(image, get_frame_buffer(writer)))
+    writer.extend(images[1:])
+    writer.finish()
+    if images:
+        assert np.array_equal(writer.stack(), np.array(images))
+    if pooled and images:
+        assert np.shares_memory(writer.stack(), frame_pool)
+    with h5py.File(reference_filepath, 'w') as f:
+        save_images_reference(f.require_group(image_path), images, exposures)
+
+    with h5py.File(writer.h5_filepath, 'r') as f, h5py.File(reference_filepath, 'r') as g:
+        assert f[image_path].attrs['failed_shot'] == g[image_path].attrs['failed_shot']
+        result = read_images(f[image_path])
+        expected = read_images(g[image_path])
+        assert result.keys() == expected.keys()
+        for name in expected:
+            assert np.array_equal(result[name].reshape(expected[name].shape), expected[name])
+            assert result[name].dtype == np.uint16
+            if compression is not None:
+                assert f[image_path][name].compression == compression
+                assert f[image_path][name].chunks[-2:] == (8, 12)
+
+
+def test_mock_camera_frame_pool(make_exposures, make_image_writer):
+    exposures = make_exposures(3, np.random.default_rng(0))
+    camera = MockCamera()
+    shape, dtype = camera.get_image_format()
+    frame_pool = np.empty((3,) + shape, dtype=dtype)
+    writer = make_image_writer(exposures, frame_pool=frame_pool)
+    camera.grab_multiple(3, writer)
+    writer.finish()
+    assert writer.stack().base is frame_pool
+    with h5py.File(writer.h5_filepath, 'r') as f:
+        images = read_images(f[writer.image_path])
+        assert sum(len(image) if image.ndim == 3 else 1 for image in images.values()) == 3
@@ -10,9 +10,17 @@
 # file in the root of the project for the full license.             #
 #                                                                   #
 #####################################################################
+import json
+import threading
 import labscript_utils.h5_lock
 import h5py
+import numpy as np
+import zmq
 from labscript_utils import dedent
+from labscript_utils.ls_zprocess import Context
+
+from qtutils import inmain_later
+import pyqtgraph as pg
 
 from blacs.device_base_class import DeviceTab
 from .utils import split_conn_AO, split_conn_DO
@@ -20,6 +28,63 @@ from . import models
 import warnings
 
 
+class AIPlotReceiver(object):
+    """Receive manual mode analog input data published by the acquisition worker on a
+    zmq.SUB socket in a thread, and plot the most recent `duration` seconds of it for
+    each channel in a pyqtgraph PlotWidget. Data keeps accumulating whilst a plot
+    update is pending, so that a slow GUI does not cause a backlog."""
+
+    def __init__(self, plot_widget, duration=10):
+        self.plot_widget = plot_widget
+        self.duration = duration
+        self.curves = {}
+        self.channels = None
+        self.rate = None
+        self.values = None
+        self.update_pending = False
+        self.stopping = False
+        self.socket = Context().socket(zmq.SUB)
+        self.socket.setsockopt(zmq.SUBSCRIBE, b'')
+        self.port = self.socket.bind_to_random_port('tcp://0.0.0.0')
+        self.thread = threading.Thread(target=self.mainloop, daemon=True)
+        self.thread.start()
+
+    def mainloop(self):
+        while not self.stopping:
+            if not self.socket.poll(200):
+                continue
+            header, data = self.socket.recv_multipart()
+            header = json.loads(header)
+            channels = header['channels']
+            values = np.frombuffer(data, dtype=np.float32).reshape(-1, len(channels))
+            if channels != self.channels or header['rate'] != self.rate:
+                # Start afresh:
+                self.channels = channels
+                self.rate = header['rate']
+                self.values = values
+            else:
+                self.values = np.concatenate([self.values, values])
+            self.values = self.values[-int(self.duration * self.rate) :]
+            if not self.update_pending:
+                self.update_pending = True
+                inmain_later(self.update_plot, self.channels, self.rate, self.values)
+        self.socket.close(linger=0)
+
+    def update_plot(self, channels, rate, values):
+        self.update_pending = False
+        # Time axis in seconds, relative to the most recent sample:
+        t = (np.arange(len(values)) - len(values) + 1) / rate
+        for i, chan in enumerate(channels):
+            if chan not in self.curves:
+                pen = pg.intColor(len(self.curves))
+                self.curves[chan] = self.plot_widget.plot(pen=pen, name=chan)
+            self.curves[chan].setData(t, values[:, i])
+
+    def shutdown(self):
+        self.stopping = True
+        self.thread.join()
+
+
 class NI_DAQmxTab(DeviceTab):
     def initialise_GUI(self):
         # Get capabilities from connection table properties:
@@ -68,6 +133,7 @@ class NI_DAQmxTab(DeviceTab):
         clock_mirror_terminal = properties['clock_mirror_terminal']
         # get to avoid error on older connection tables
         connected_terminals = properties.get('connected_terminals', None)
+        smart_programming = properties.get('smart_programming', False)
         static_AO = properties['static_AO']
         static_DO = properties['static_DO']
         clock_limit = properties['clock_limit']
@@ -127,6 +193,17 @@ class NI_DAQmxTab(DeviceTab):
             widget_list.append((name, DO_widgets, split_conn_DO))
         self.auto_place_widgets(*widget_list)
 
+        # Plot live manual mode analog input data, if it is to be published:
+        self.AI_plot_receiver = None
+        if num_AI > 0 and properties.get('AI_publish', False):
+            plot_widget = pg.PlotWidget()
+            plot_widget.setLabel('left', 'Voltage', units='V')
+            plot_widget.setLabel('bottom', 'Time', units='s')
+            plot_widget.addLegend()
+            plot_widget.setMinimumHeight(200)
+            self.get_tab_layout().addWidget(plot_widget)
+            self.AI_plot_receiver = AIPlotReceiver(plot_widget)
+
         # We only need a wait monitor worker if we are if fact the device with
         # the wait monitor input.
         with h5py.File(connection_table.filepath, 'r') as f:
@@ -153,6 +230,7 @@ class NI_DAQmxTab(DeviceTab):
                 'clock_limit': clock_limit,
                 'clock_terminal': clock_terminal,
                 'clock_mirror_terminal': clock_mirror_terminal,
+                'smart_programming': smart_programming,
                 'static_AO': static_AO,
                 'static_DO': static_DO,
                 'DO_hardware_names': DO_hardware_names,
@@ -208,6 +286,15 @@ class NI_DAQmxTab(DeviceTab):
                     'AI_start_delay_ticks': properties['AI_start_delay_ticks'],
                     'AI_timebase_terminal': properties.get('AI_timebase_terminal',None),
                     'AI_timebase_rate': properties.get('AI_timebase_rate',None),
+                    'AI_stream_to_disk': properties.get('AI_stream_to_disk', False),
+                    'AI_compact_time': properties.get('AI_compact_time', False),
+                    'AI_publish_port': (
+                        self.AI_plot_receiver.port
+                        if self.AI_plot_receiver is not None
+                        else None
+                    ),
+                    'AI_publish_decimation': properties.get('AI_publish_decimation', 1),
+                    'AI_publish_rate': properties.get('AI_publish_rate', 10),
                     'clock_terminal': clock_terminal,
                 },
             )
@@ -215,4 +302,11 @@ class NI_DAQmxTab(DeviceTab):
 
         # Set the capabilities of this device
         self.supports_remote_value_check(False)
-        self.supports_smart_programming(False)
+        self.supports_smart_programming(smart_programming)
+
+    def restart(self, *args, **kwargs):
+        # Must manually stop the receiving thread upon tab restart, otherwise it does
+        # not get cleaned up:
+        if self.AI_plot_receiver is not None:
+            self.AI_plot_receiver.shutdown()
+        return DeviceTab.restart(self, *args, **kwargs)
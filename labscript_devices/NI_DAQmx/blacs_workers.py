@@ -11,8 +11,12 @@
 #                                                                   #
 #####################################################################
 import sys
+import os
 import time
+import hashlib
 import threading
+import tempfile
+from queue import Queue, Empty
 from PyDAQmx import *
 from PyDAQmx.DAQmxConstants import *
 from PyDAQmx.DAQmxTypes import *
@@ -22,12 +26,14 @@ import numpy as np
 from numpy.lib.recfunctions import structured_to_unstructured
 import labscript_utils.h5_lock
 import h5py
+import zmq
 from zprocess import Event
 from zprocess.utils import _reraise
 
 import labscript_utils.properties as properties
 from labscript_utils import dedent
 from labscript_utils.connections import _ensure_str
+from labscript_utils.ls_zprocess import Context
 
 from blacs.tab_base_classes import Worker
 
@@ -37,6 +43,9 @@ from .daqmx_utils import incomplete_sample_detection
 
 class NI_DAQmxOutputWorker(Worker):
     def init(self):
+        # Buffered output tasks kept between shots for reuse, if smart programming is
+        # enabled:
+        self.smart_cache = {}
         self.check_version()
         # Reset Device: clears previously added routes etc. Note: is insufficient for
         # some devices, which require power cycling to truly reset.
@@ -55,6 +64,7 @@ class NI_DAQmxOutputWorker(Worker):
 
     def shutdown(self):
         self.stop_tasks()
+        self.clear_smart_cache()
 
     def check_version(self):
         """Check the version of PyDAQmx is high enough to avoid a known bug"""
@@ -180,21 +190,100 @@ class NI_DAQmxOutputWorker(Worker):
             for terminal_pair in self.connected_terminals:
                 DAQmxDisconnectTerms(terminal_pair[0], terminal_pair[1])
 
+    def create_DO_task(self, ports):
+        """Return a new task with a DO channel for each of the given ports"""
+        task = Task()
+        for port_str in ports:
+            # Add each port to the task:
+            con = '%s/%s' % (self.MAX_name, port_str)
+            task.CreateDOChan(con, "", DAQmx_Val_ChanForAllLines)
+        return task
+
+    def create_AO_task(self, channels):
+        """Return a new task with an AO channel for each of the given channels"""
+        task = Task()
+        channels = ', '.join(self.MAX_name + '/' + c for c in channels)
+        task.CreateAOVoltageChan(
+            channels, "", self.Vmin, self.Vmax, DAQmx_Val_Volts, None
+        )
+        return task
+
+    def program_buffered_task(self, name, channels, data, create_task, write):
+        """Return a buffered output task for the given channels, with timing configured
+        for len(data) samples and the data written to it, but not yet started.
+        create_task(channels) must return a new task with the given channels, and
+        write(task, data) must write the data to the task.
+
+        If smart programming is enabled, the task is kept between shots, and is reused
+        if the channels and number of samples are unchanged, in which case the data is
+        only written if its hash differs from that of the data previously written."""
+        start_time = time.perf_counter()
+        key = (tuple(channels), len(data))
+        data_hash = hashlib.sha1(data).hexdigest()
+        cached = self.smart_cache.pop(name, None)
+        if cached is not None and cached['key'] == key:
+            task = cached['task']
+            if cached['hash'] == data_hash:
+                msg = '%s table unchanged, not reprogramming (saved %.1f ms)'
+            else:
+                try:
+                    # Overwrite the task's buffer from the start:
+                    task.SetWriteRelativeTo(DAQmx_Val_FirstSample)
+                    task.SetWriteOffset(0)
+                    write(task, data)
+                except Exception:
+                    # The task is no longer cached, clear it so that its channels
+                    # are not left reserved:
+                    task.ClearTask()
+                    raise
+                msg = '%s task reused, table rewritten (saved %.1f ms)'
+            program_time = cached['program_time']
+            saved = program_time - (time.perf_counter() - start_time)
+            self.logger.info(msg, name, 1e3 * saved)
+        else:
+            if cached is not None:
+                # Channels or number of samples changed, can't reuse the task:
+                cached['task'].ClearTask()
+            task = create_task(channels)
+            try:
+                # Set up timing:
+                task.CfgSampClkTiming(
+                    self.clock_terminal,
+                    self.clock_limit,
+                    DAQmx_Val_Rising,
+                    DAQmx_Val_FiniteSamps,
+                    len(data),
+                )
+                write(task, data)
+            except Exception:
+                task.ClearTask()
+                raise
+            program_time = time.perf_counter() - start_time
+        if self.smart_programming:
+            self.smart_cache[name] = {
+                'task': task,
+                'key': key,
+                'hash': data_hash,
+                'program_time': program_time,
+            }
+        return task
+
+    def clear_smart_cache(self):
+        """Clear all tasks kept for reuse by smart programming"""
+        for cached in self.smart_cache.values():
+            cached['task'].ClearTask()
+        self.smart_cache = {}
+
     def program_buffered_DO(self, DO_table):
         """Create the DO task and program in the DO table for a shot. Return a
         dictionary of the final values of each channel in use"""
         if DO_table is None:
             return {}
-        self.DO_task = Task()
         written = int32()
         ports = DO_table.dtype.names
 
         final_values = {}
         for port_str in ports:
-            # Add each port to the task:
-            con = '%s/%s' % (self.MAX_name, port_str)
-            self.DO_task.CreateDOChan(con, "", DAQmx_Val_ChanForAllLines)
-
             # Collect the final values of the lines on this port:
             port_final_value = DO_table[port_str][-1]
             for line in range(self.ports[port_str]["num_lines"]):
@@ -216,6 +305,7 @@ class NI_DAQmxOutputWorker(Worker):
 
         if self.static_DO or self.DO_all_zero:
             # Static DO. Start the task and write data, no timing configuration.
+            self.DO_task = self.create_DO_task(ports)
             self.DO_task.StartTask()
             # Write data. See the comment in self.program_manual as to why we are using
             # uint32 instead of the native size of each port
@@ -229,31 +319,25 @@ class NI_DAQmxOutputWorker(Worker):
                 None,
             )
         else:
+            def write(task, data):
+                # See the comment in self.program_manual as to why we are using uint32
+                # instead of the native size of each port.
+                task.WriteDigitalU32(
+                    len(data),
+                    False,  # autostart
+                    10.0,  # timeout
+                    DAQmx_Val_GroupByScanNumber,
+                    data,
+                    written,
+                    None,
+                )
+
             # We use all but the last sample (which is identical to the second last
             # sample) in order to ensure there is one more clock tick than there are
             # samples. This is required by some devices to determine that the task has
             # completed.
-            npts = len(DO_table) - 1
-
-            # Set up timing:
-            self.DO_task.CfgSampClkTiming(
-                self.clock_terminal,
-                self.clock_limit,
-                DAQmx_Val_Rising,
-                DAQmx_Val_FiniteSamps,
-                npts,
-            )
-
-            # Write data. See the comment in self.program_manual as to why we are using
-            # uint32 instead of the native size of each port.
-            self.DO_task.WriteDigitalU32(
-                npts,
-                False,  # autostart
-                10.0,  # timeout
-                DAQmx_Val_GroupByScanNumber,
-                DO_table[:-1], # All but the last sample as mentioned above
-                written,
-                None,
+            self.DO_task = self.program_buffered_task(
+                'DO', ports, DO_table[:-1], self.create_DO_task, write
             )
 
             # Go!
@@ -264,12 +348,8 @@ class NI_DAQmxOutputWorker(Worker):
     def program_buffered_AO(self, AO_table):
         if AO_table is None:
             return {}
-        self.AO_task = Task()
         written = int32()
-        channels = ', '.join(self.MAX_name + '/' + c for c in AO_table.dtype.names)
-        self.AO_task.CreateAOVoltageChan(
-            channels, "", self.Vmin, self.Vmax, DAQmx_Val_Volts, None
-        )
+        channels = AO_table.dtype.names
 
         # Collect the final values of the analog outs:
         final_values = dict(zip(AO_table.dtype.names, AO_table[-1]))
@@ -288,43 +368,30 @@ class NI_DAQmxOutputWorker(Worker):
 
         if self.static_AO or self.AO_all_zero:
             # Static AO. Start the task and write data, no timing configuration.
+            self.AO_task = self.create_AO_task(channels)
             self.AO_task.StartTask()
             self.AO_task.WriteAnalogF64(
                 1, True, 10.0, DAQmx_Val_GroupByChannel, AO_table, written, None
             )
         else:
+            def write(task, data):
+                task.WriteAnalogF64(
+                    len(data),
+                    False,  # autostart
+                    10.0,  # timeout
+                    DAQmx_Val_GroupByScanNumber,
+                    data,
+                    written,
+                    None,
+                )
+
             # We use all but the last sample (which is identical to the second last
             # sample) in order to ensure there is one more clock tick than there are
             # samples. This is required by some devices to determine that the task has
             # completed.
-            npts = len(AO_table) - 1
-
-            # Set up timing:
-            self.AO_task.CfgSampClkTiming(
-                self.clock_terminal,
-                self.clock_limit,
-                DAQmx_Val_Rising,
-                DAQmx_Val_FiniteSamps,
-                npts,
-            )
-
-            # Write data:
-            self.AO_task.WriteAnalogF64(
-                npts,
-                False,  # autostart
-                10.0,  # timeout
-                DAQmx_Val_GroupByScanNumber,
-                AO_table[:-1],  # All but the last sample as mentioned above
-                written,
-                None,
+            self.AO_task = self.program_buffered_task(
+                'AO', channels, AO_table[:-1], self.create_AO_task, write
             )
-            
-            #with open(r'C:\Users\jqisr\labscript-suite\logs\analog.log','a') as f:
-            #    f.write(self.MAX_name + r' = [')
-            #    for a in AO_table:
-            #        f.write(str(a) + ',')
-            #    #f.seek(-1,2)
-            #    f.write(r'];' + '\n')
 
             # Go!
             self.AO_task.StartTask()
@@ -338,6 +405,11 @@ class NI_DAQmxOutputWorker(Worker):
         # Stop the manual mode output tasks, if any:
         self.stop_tasks()
 
+        # Only reuse previously programmed tasks if a fresh reprogramming was not
+        # requested:
+        if fresh:
+            self.clear_smart_cache()
+
         # Get the data to be programmed into the output tasks:
         AO_table, DO_table = self.get_output_tables(h5file, device_name)
 
@@ -395,6 +467,14 @@ class NI_DAQmxOutputWorker(Worker):
                         msg = 'Stopping %s at sample %d of %d'
                         self.logger.debug(msg, name, current, total)
                 task.StopTask()
+            cached = self.smart_cache.get(name)
+            if cached is not None and cached['task'] is task:
+                if not abort:
+                    # Keep the task, so it may be reused next shot without
+                    # reprogramming:
+                    continue
+                # The state of the task is unknown after an abort, don't reuse it:
+                del self.smart_cache[name]
             task.ClearTask()
 
         # Remove the mirroring of the clock terminal, if applicable:
@@ -418,9 +498,89 @@ class NI_DAQmxOutputWorker(Worker):
         return self.transition_to_manual(True)
 
 
+class AIStreamWriter(object):
+    """Append chunks of acquired analog input data to a resizable, chunked dataset in
+    an HDF5 file from a background thread, so that acquired data need not be held in
+    memory for the duration of a shot. Chunks are passed in with append(), which returns
+    immediately. close() waits for all pending chunks to be written and closes the
+    file, re-raising any exception that occurred in the writer thread."""
+
+    # Target size in bytes of each HDF5 chunk of the dataset:
+    CHUNK_BYTES = 1 << 20
+
+    def __init__(self, filepath, num_chans):
+        self.filepath = filepath
+        self.num_chans = num_chans
+        self.samples_written = 0
+        self.queue = Queue()
+        self.exception = None
+        self.thread = threading.Thread(target=self.mainloop, daemon=True)
+        self.thread.start()
+
+    def append(self, data):
+        """Queue a (num_samples, num_chans) array to be written. The array must not be
+        modified by the caller afterwards."""
+        self.queue.put(data)
+
+    def mainloop(self):
+        try:
+            chunk_rows = max(1, self.CHUNK_BYTES // (4 * self.num_chans))
+            with h5py.File(self.filepath, 'w') as f:
+                dataset = f.create_dataset(
+                    'AI',
+                    shape=(0, self.num_chans),
+                    maxshape=(None, self.num_chans),
+                    chunks=(chunk_rows, self.num_chans),
+                    dtype=np.float32,
+                )
+                done = False
+                while not done:
+                    # Block for the next chunk, then collect any others that have
+                    # queued up in the meantime so that we resize the dataset as
+                    # infrequently as possible:
+                    chunks = [self.queue.get()]
+                    while chunks[-1] is not None:
+                        try:
+                            chunks.append(self.queue.get_nowait())
+                        except Empty:
+                            break
+                    if chunks[-1] is None:
+                        done = True
+                        chunks.pop()
+                    if not chunks:
+                        continue
+                    data = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+                    start = self.samples_written
+                    dataset.resize(start + len(data), axis=0)
+                    dataset[start:] = data
+                    self.samples_written += len(data)
+        except Exception:
+            self.exception = sys.exc_info()
+            # Discard remaining data until we are told to stop:
+            while self.queue.get() is not None:
+                pass
+
+    def close(self):
+        """Wait for all queued data to be written and close the file."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.exception is not None:
+            _reraise(*self.exception)
+
+    def remove(self):
+        """Delete the file, if it exists."""
+        try:
+            os.unlink(self.filepath)
+        except FileNotFoundError:
+            pass
+
+
 class NI_DAQmxAcquisitionWorker(Worker):
     MAX_READ_INTERVAL = 0.2
     MAX_READ_PTS = 10000
+    # Extra time in seconds of acquisition to allow for in the buffer beyond the stop
+    # time of the shot, to allow for software latency in stopping the task:
+    BUFFER_MARGIN = 1.0
 
     def init(self):
         # Prevent interference between the read callback and the shutdown code:
@@ -434,8 +594,10 @@ class NI_DAQmxAcquisitionWorker(Worker):
         self.buffered_mode = False
         self.h5_file = None
         self.acquired_data = None
+        self.samples_acquired = 0
         self.buffered_rate = None
         self.buffered_chans = None
+        self.stream_writer = None
 
         # Hard coded for now. Perhaps we will add functionality to enable
         # and disable inputs in manual mode, and adjust the rate:
@@ -446,12 +608,29 @@ class NI_DAQmxAcquisitionWorker(Worker):
         # them to chunk up acquisition data:
         self.wait_durations_analysed = Event('wait_durations_analysed')
 
+        # A socket for publishing decimated manual mode data for live display, if
+        # enabled. The parent (or anyone else listening on the port) is subscribed:
+        self.publish_socket = None
+        self.publish_blocks = []
+        self.publish_offset = 0
+        self.last_publish_time = 0
+        if self.AI_publish_port is not None:
+            self.publish_socket = Context().socket(zmq.PUB)
+            # Drop data rather than queueing it if the subscriber is lagging behind:
+            self.publish_socket.setsockopt(zmq.SNDHWM, 2)
+            self.publish_socket.connect(
+                f'tcp://{self.parent_host}:{self.AI_publish_port}'
+            )
+
         # Start task for manual mode
         self.start_task(self.manual_mode_chans, self.manual_mode_rate)
 
     def shutdown(self):
         if self.task is not None:
             self.stop_task()
+        if self.publish_socket is not None:
+            self.publish_socket.close(linger=0)
+            self.publish_socket = None
 
     def read(self, task_handle, event_type, num_samples, callback_data=None):
         """Called as a callback by DAQmx while task is running. Also called by us to get
@@ -471,23 +650,66 @@ class NI_DAQmxAcquisitionWorker(Worker):
                 samples_read,
                 None,
             )
-            # Select only the data read, and downconvert to 32 bit:
-            data = self.read_array[: int(samples_read.value), :].astype(np.float32)
+            # Select only the data read:
+            data = self.read_array[: int(samples_read.value), :]
             if self.buffered_mode:
-                # Append to the list of acquired data:
-                self.acquired_data.append(data)
-            else:
-                # TODO: Send it to the broker thingy.
-                pass
+                if self.stream_writer is not None:
+                    # Downconvert to 32 bit and hand it to the writer thread:
+                    self.stream_writer.append(data.astype(np.float32))
+                else:
+                    # Downconvert to 32 bit in place in the acquisition buffer:
+                    start = self.samples_acquired
+                    end = start + len(data)
+                    if end > len(self.acquired_data):
+                        # More data than the shot duration accounted for, for example
+                        # due to waits. Grow the buffer:
+                        buffer = np.empty(
+                            (max(end, 2 * len(self.acquired_data)), data.shape[1]),
+                            dtype=np.float32,
+                        )
+                        buffer[:start] = self.acquired_data[:start]
+                        self.acquired_data = buffer
+                    self.acquired_data[start:end] = data
+                    self.samples_acquired = end
+            elif self.publish_socket is not None:
+                self.publish(data)
         return 0
 
+    def publish(self, data):
+        """Decimate a chunk of manual mode data and publish it for live display. Chunks
+        are accumulated and sent at most AI_publish_rate times per second as a
+        multipart message: a JSON header with the channel names and sample rates,
+        followed by the raw float32 data with shape (num_samples, num_chans)."""
+        decimation = self.AI_publish_decimation
+        # Keep every nth sample, carrying the offset over between chunks so that the
+        # decimated samples are evenly spaced:
+        self.publish_blocks.append(
+            data[self.publish_offset :: decimation].astype(np.float32)
+        )
+        self.publish_offset = (self.publish_offset - len(data)) % decimation
+        now = time.perf_counter()
+        if now - self.last_publish_time < 1 / self.AI_publish_rate:
+            return
+        self.last_publish_time = now
+        values = np.concatenate(self.publish_blocks)
+        self.publish_blocks = []
+        header = {
+            'device_name': self.device_name,
+            'channels': self.manual_mode_chans,
+            'acquisition_rate': self.manual_mode_rate,
+            'rate': self.manual_mode_rate / decimation,
+        }
+        self.publish_socket.send_json(header, zmq.SNDMORE)
+        self.publish_socket.send(values, copy=False)
+
     def start_task(self, chans, rate):
         """Set up a task that acquires data with a callback every MAX_READ_PTS points or
         MAX_READ_INTERVAL seconds, whichever is faster. NI DAQmx calls callbacks in a
         separate thread, so this method returns, but data acquisition continues until
-        stop_task() is called. Data is appended to self.acquired_data if
-        self.buffered_mode=True, or (TODO) sent to the [whatever the AI server broker is
-        called] if self.buffered_mode=False."""
+        stop_task() is called. Data is written to the preallocated self.acquired_data
+        (or passed to self.stream_writer if streaming to disk) if
+        self.buffered_mode=True, or published for live display (if enabled) if
+        self.buffered_mode=False."""
 
         if self.task is not None:
             raise RuntimeError('Task already running')
@@ -567,6 +789,7 @@ class NI_DAQmxAcquisitionWorker(Worker):
                 return {}
             AI_table = group['AI'][:]
             device_properties = properties.get(f, device_name, 'device_properties')
+            stop_time = self.get_stop_time(f)
 
         chans = [_ensure_str(c) for c in AI_table['connection']]
         # Remove duplicates and sort:
@@ -577,13 +800,44 @@ class NI_DAQmxAcquisitionWorker(Worker):
         if device_properties['start_delay_ticks']:
             # delay is defined in sample clock ticks, calculate in sec and save for later
             self.AI_start_delay = self.AI_start_delay_ticks*self.buffered_rate
-        self.acquired_data = []
+        self.samples_acquired = 0
+        if chans and not self.AI_stream_to_disk:
+            # Allocate a buffer for the whole shot, into which acquired data will be
+            # written as it arrives. If we don't know how long the shot is, start with
+            # the margin only, the buffer will be grown as required.
+            if stop_time is None:
+                stop_time = 0
+            num_samples = int(self.buffered_rate * (stop_time + self.BUFFER_MARGIN))
+            self.acquired_data = np.empty(
+                (num_samples, len(self.buffered_chans)), dtype=np.float32
+            )
+        if self.AI_stream_to_disk and chans:
+            # Write acquired data to a temporary file as it arrives. We cannot hold the
+            # shot file open for the duration of the shot, since other workers need to
+            # access it in the meantime.
+            basename = os.path.splitext(os.path.basename(h5file))[0]
+            filepath = os.path.join(
+                tempfile.gettempdir(), '%s_%s_AI.h5' % (basename, self.device_name)
+            )
+            self.stream_writer = AIStreamWriter(filepath, len(self.buffered_chans))
         # Stop the manual mode task and start the buffered mode task:
         self.stop_task()
+        self.publish_blocks = []
         self.buffered_mode = True
         self.start_task(self.buffered_chans, self.buffered_rate)
         return {}
 
+    def get_stop_time(self, hdf5_file):
+        """Return the stop time of the shot from the master pseudoclock's device
+        properties, or None if it cannot be determined"""
+        try:
+            master_pseudoclock = hdf5_file['connection table'].attrs['master_pseudoclock']
+            master_pseudoclock = _ensure_str(master_pseudoclock)
+            props = properties.get(hdf5_file, master_pseudoclock, 'device_properties')
+            return props['stop_time']
+        except KeyError:
+            return None
+
     def transition_to_manual(self, abort=False):
         self.logger.debug('transition_to_manual')
         #  If we were doing buffered mode acquisition, stop the buffered mode task and
@@ -598,7 +852,19 @@ class NI_DAQmxAcquisitionWorker(Worker):
         self.logger.info('transitioning to manual mode, task stopped')
         self.start_task(self.manual_mode_chans, self.manual_mode_rate)
 
+        stream_writer = self.stream_writer
+        self.stream_writer = None
+        if stream_writer is not None:
+            # Wait for the data to finish being written:
+            try:
+                stream_writer.close()
+            except Exception:
+                stream_writer.remove()
+                raise
+
         if abort:
+            if stream_writer is not None:
+                stream_writer.remove()
             self.acquired_data = None
             self.buffered_chans = None
             self.h5_file = None
@@ -610,20 +876,32 @@ class NI_DAQmxAcquisitionWorker(Worker):
             data_group.create_group(self.device_name)
             waits_in_use = len(hdf5_file['waits']) > 0
 
-        if self.buffered_chans is not None and not self.acquired_data:
+        if stream_writer is not None:
+            data_acquired = stream_writer.samples_written > 0
+        else:
+            data_acquired = self.samples_acquired > 0
+        if self.buffered_chans is not None and not data_acquired:
+            if stream_writer is not None:
+                stream_writer.remove()
             msg = """No data was acquired. Perhaps the acquisition task was not
                 triggered to start, is the device connected to a pseudoclock?"""
             raise RuntimeError(dedent(msg))
-        # Concatenate our chunks of acquired data and recast them as a structured
-        # array with channel names:
-        if self.acquired_data:
+        if data_acquired:
             start_time = time.time()
-            dtypes = [(chan, np.float32) for chan in self.buffered_chans]
-            raw_data = np.concatenate(self.acquired_data).view(dtypes)
-            raw_data = raw_data.reshape((len(raw_data),))
-            self.acquired_data = None
+            chans = self.buffered_chans
             self.buffered_chans = None
-            self.extract_measurements(raw_data, waits_in_use)
+            if stream_writer is not None:
+                # Read acquisitions directly from the file the data was streamed to:
+                try:
+                    with h5py.File(stream_writer.filepath, 'r') as f:
+                        self.extract_measurements(f['AI'], chans, waits_in_use)
+                finally:
+                    stream_writer.remove()
+            else:
+                # Only the part of the buffer that was filled:
+                raw_data = self.acquired_data[: self.samples_acquired]
+                self.acquired_data = None
+                self.extract_measurements(raw_data, chans, waits_in_use)
             self.h5_file = None
             self.buffered_rate = None
             msg = 'data written, time taken: %ss' % str(time.time() - start_time)
@@ -633,7 +911,10 @@ class NI_DAQmxAcquisitionWorker(Worker):
 
         return True
 
-    def extract_measurements(self, raw_data, waits_in_use):
+    def extract_measurements(self, raw_data, chans, waits_in_use):
+        """Slice the requested acquisitions out of raw_data and save them to the shot
+        file. raw_data is a (num_samples, len(chans)) array, or an HDF5 dataset of that
+        shape, with the columns in the order of the channel names in chans."""
         self.logger.debug('extract_measurements')
         if waits_in_use:
             # There were waits in this shot. We need to wait until the other process has
@@ -647,7 +928,7 @@ class NI_DAQmxAcquisitionWorker(Worker):
                 wait_times = waits['time']
                 wait_durations = waits['duration']
             try:
-                acquisitions = hdf5_file['/devices/' + self.device_name + '/AI']
+                acquisitions = hdf5_file['/devices/' + self.device_name + '/AI'][:]
             except KeyError:
                 # No acquisitions!
                 return
@@ -657,35 +938,52 @@ class NI_DAQmxAcquisitionWorker(Worker):
                 # Group doesn't exist yet, create it:
                 measurements = hdf5_file.create_group('/data/traces')
 
+            rate = self.buffered_rate
             t0 = self.AI_start_delay
-            for connection, label, t_start, t_end, _, _, _ in acquisitions:
-                connection = _ensure_str(connection)
-                label = _ensure_str(label)
-                if waits_in_use:
-                    # add durations from all waits that start prior to t_start of
-                    # acquisition
-                    t_start += wait_durations[(wait_times < t_start)].sum()
-                    # compare wait times to t_end to allow for waits during an
-                    # acquisition
-                    t_end += wait_durations[(wait_times < t_end)].sum()
-                i_start = int(np.ceil(self.buffered_rate * (t_start - t0)))
-                i_end = int(np.floor(self.buffered_rate * (t_end - t0)))
-                # np.ceil does what we want above, but float errors can miss the
-                # equality:
-                if t0 + (i_start - 1) / self.buffered_rate - t_start > -2e-16:
-                    i_start -= 1
-                # We want np.floor(x) to yield the largest integer < x (not <=):
-                if t_end - t0 - i_end / self.buffered_rate < 2e-16:
-                    i_end -= 1
+            t_start = acquisitions['start']
+            t_end = acquisitions['stop']
+            if waits_in_use:
+                # Add durations from all waits that start prior to t_start of each
+                # acquisition, and compare wait times to t_end as well to allow for
+                # waits during an acquisition. The number of waits prior to each time is
+                # found with a single search of the sorted wait times, and used to index
+                # the cumulative wait durations:
+                order = np.argsort(wait_times, kind='stable')
+                cumulative_durations = np.zeros(len(order) + 1)
+                np.cumsum(wait_durations[order], out=cumulative_durations[1:])
+                n_prior = np.searchsorted(
+                    wait_times[order], np.concatenate([t_start, t_end]), side='left'
+                )
+                offsets = cumulative_durations[n_prior]
+                t_start = t_start + offsets[: len(acquisitions)]
+                t_end = t_end + offsets[len(acquisitions) :]
+            i_start = np.ceil(rate * (t_start - t0)).astype(int)
+            i_end = np.floor(rate * (t_end - t0)).astype(int)
+            # np.ceil does what we want above, but float errors can miss the equality:
+            i_start[t0 + (i_start - 1) / rate - t_start > -2e-16] -= 1
+            # We want np.floor(x) to yield the largest integer < x (not <=):
+            i_end[t_end - t0 - i_end / rate < 2e-16] -= 1
+
+            chan_indices = {chan: i for i, chan in enumerate(chans)}
+            for acquisition, i_0, i_1 in zip(acquisitions, i_start, i_end):
+                connection = _ensure_str(acquisition['connection'])
+                label = _ensure_str(acquisition['label'])
                 # IBS: we sometimes find that t_end (with waits) gives a time
                 # after the end of acquisition.  The following line
                 # will produce return a shorter than expected array if i_end
                 # is larger than the length of the array.
-                values = raw_data[connection][i_start : i_end + 1]
-                i_end = i_start + len(values) - 1 # re-measure i_end
-
-                t_i = t0 + i_start / self.buffered_rate
-                t_f = t0 + i_end / self.buffered_rate
+                values = raw_data[i_0 : i_1 + 1, chan_indices[connection]]
+                i_1 = i_0 + len(values) - 1 # re-measure i_end
+
+                t_i = t0 + i_0 / rate
+                if self.AI_compact_time:
+                    # Store the times implicitly as the time of the first sample and
+                    # the sample interval:
+                    dataset = measurements.create_dataset(label, data=values)
+                    dataset.attrs['t0'] = t_i
+                    dataset.attrs['dt'] = 1 / rate
+                    continue
+                t_f = t0 + i_1 / rate
                 times = np.linspace(t_i, t_f, len(values), endpoint=True)
                 dtypes = [('t', np.float64), ('values', np.float32)]
                 data = np.empty(len(values), dtype=dtypes)
@@ -21,7 +21,6 @@ from labscript import (
     StaticAnalogOut,
     StaticDigitalOut,
     AnalogIn,
-    bitfield,
     config,
     compiler,
     LabscriptError,
@@ -40,6 +39,34 @@ def _smallest_int_type(n):
     return _ints[min(size for size in _ints.keys() if size >= n)]
 
 
+def _pack_bits(bits_by_line, n_timepoints, dtype, out=None, block_size=1 << 16):
+    """Pack a dict of arrays of ones and zeros, keyed by line number, into an array of
+    unsigned ints of the given dtype, with lines not in the dict being zero. Equivalent
+    to labscript.bitfield(), but each line is shifted and ORed in place into a small
+    buffer one block of timepoints at a time, so that intermediate results stay in the
+    CPU cache and no per-line arrays are allocated. If given, out (which may be a field
+    of a structured array) is filled with the result and returned, otherwise a new array
+    is returned."""
+    if out is None:
+        out = np.empty(n_timepoints, dtype=dtype)
+    packed = np.empty(min(block_size, n_timepoints), dtype=dtype)
+    shifted = np.empty_like(packed)
+    lines = [(line, np.asarray(bits)) for line, bits in bits_by_line.items()]
+    for start in range(0, n_timepoints, block_size):
+        stop = min(start + block_size, n_timepoints)
+        packed_block = packed[: stop - start]
+        shifted_block = shifted[: stop - start]
+        packed_block[:] = 0
+        for line, bits in lines:
+            # Convert to the port's dtype before shifting, so that lines beyond the
+            # width of the bits' own dtype are not lost:
+            np.copyto(shifted_block, bits[start:stop], casting='unsafe')
+            np.left_shift(shifted_block, dtype(line), out=shifted_block)
+            np.bitwise_or(packed_block, shifted_block, out=packed_block)
+        out[start:stop] = packed_block
+    return out
+
+
 class NI_DAQmx(IntermediateDevice):
     # Will be overridden during __init__ depending on configuration:
     allowed_children = []
@@ -59,6 +86,7 @@ class NI_DAQmx(IntermediateDevice):
                 "static_DO",
                 "clock_mirror_terminal",
                 "connected_terminals",
+                "smart_programming",
                 "AI_range",
                 "AI_start_delay",
                 "AI_start_delay_ticks",
@@ -66,6 +94,11 @@ class NI_DAQmx(IntermediateDevice):
                 "AI_chans",
                 "AI_timebase_terminal",
                 "AI_timebase_rate",
+                "AI_stream_to_disk",
+                "AI_compact_time",
+                "AI_publish",
+                "AI_publish_decimation",
+                "AI_publish_rate",
                 "AO_range",
                 "max_AI_multi_chan_rate",
                 "max_AI_single_chan_rate",
@@ -97,6 +130,7 @@ class NI_DAQmx(IntermediateDevice):
         static_DO=None,
         clock_mirror_terminal=None,
         connected_terminals=None,
+        smart_programming=False,
         acquisition_rate=None,
         AI_range=None,
         AI_range_Diff=None,
@@ -106,6 +140,11 @@ class NI_DAQmx(IntermediateDevice):
         AI_term_cfg=None,
         AI_timebase_terminal=None,
         AI_timebase_rate=None,
+        AI_stream_to_disk=False,
+        AI_compact_time=False,
+        AI_publish=False,
+        AI_publish_decimation=1,
+        AI_publish_rate=10,
         AO_range=None,
         max_AI_multi_chan_rate=None,
         max_AI_single_chan_rate=None,
@@ -141,6 +180,10 @@ class NI_DAQmx(IntermediateDevice):
             connected_terminals (list, optional): List of pairs of strings of digital inputs
                 and digital outputs that will be connected. Useful for daisy-chaining DAQs
                 on the same clockline when they do not have direct routes (see Device Routes in NI MAX).
+            smart_programming (bool, optional): If True, buffered output tasks are kept
+                configured between shots and reused if the channels in use and number
+                of samples are unchanged. The output table is then only written to the
+                device if it differs from the previous shot.
             acquisiton_rate (float, optional): Default sample rate of inputs.
             AI_range (iterable, optional): A `[Vmin, Vmax]` pair that sets the analog
                 input voltage range for all analog inputs.
@@ -164,6 +207,22 @@ class NI_DAQmx(IntermediateDevice):
                 Must also specify the rate when not using the internal sources.
             AI_timebase_rate (float, optional): Supplied clock frequency for the AI timebase.
                 Only specify if using an external clock source.
+            AI_stream_to_disk (bool, optional): If True, analog input data is written
+                to a temporary HDF5 file as it is acquired, rather than being held in
+                memory until the end of the shot. This keeps the memory use of long,
+                fast acquisitions bounded.
+            AI_compact_time (bool, optional): If True, acquired traces are saved as
+                1D arrays of values, with the time of the first sample and the sample
+                interval saved as the `'t0'` and `'dt'` attributes of each trace's
+                dataset, instead of the default structured array with `'t'` and
+                `'values'` columns.
+            AI_publish (bool, optional): If True, analog input data acquired in manual
+                mode is published by the BLACS worker over a zmq socket and plotted
+                live in the BLACS tab.
+            AI_publish_decimation (int, optional): Only every `AI_publish_decimation`th
+                sample of manual mode analog input data is published.
+            AI_publish_rate (float, optional): Maximum rate, in Hz, at which blocks of
+                manual mode analog input data are published.
             AO_range (iterable, optional): A `[Vmin, Vmax]` pair that sets the analog
                 output voltage range for all analog outputs.
             max_AI_multi_chan_rate (float, optional): Max supported analog input 
@@ -220,6 +279,7 @@ class NI_DAQmx(IntermediateDevice):
         self.MAX_name = MAX_name if MAX_name is not None else name
         self.static_AO = static_AO
         self.static_DO = static_DO
+        self.smart_programming = smart_programming
 
         self.acquisition_rate = acquisition_rate
         self.AO_range = AO_range
@@ -266,6 +326,17 @@ class NI_DAQmx(IntermediateDevice):
                 raise LabscriptError("You must specify terminal and rate when using an external AI timebase")
             self.AI_timebase_terminal = AI_timebase_terminal
             self.AI_timebease_rate = AI_timebase_rate
+        self.AI_stream_to_disk = AI_stream_to_disk
+        self.AI_compact_time = AI_compact_time
+        if AI_publish_decimation < 1 or AI_publish_decimation % 1:
+            msg = "AI_publish_decimation must be a positive integer, not %s"
+            raise ValueError(msg % str(AI_publish_decimation))
+        if AI_publish_rate <= 0:
+            msg = "AI_publish_rate must be positive, not %s"
+            raise ValueError(msg % str(AI_publish_rate))
+        self.AI_publish = AI_publish
+        self.AI_publish_decimation = int(AI_publish_decimation)
+        self.AI_publish_rate = AI_publish_rate
                 
         self.num_AO = num_AO
         self.num_CI = num_CI
@@ -454,7 +525,7 @@ class NI_DAQmx(IntermediateDevice):
         if not digitals:
             return None
         n_timepoints = 1 if self.static_DO else len(times)
-        # List of output bits by port number:
+        # Output bits by port number and line number:
         bits_by_port = {}
         # table names and dtypes by port number:
         columns = {}
@@ -462,23 +533,18 @@ class NI_DAQmx(IntermediateDevice):
             port, line = split_conn_DO(connection)
             port_str = 'port%d' % port
             if port not in bits_by_port:
-                # Make a list of the right size for the number of lines
-                # on the port, or the number of bits in the smallest integer
-                # type that is equal to or larger than the number of lines.
+                # The smallest integer type that is equal to or larger than the number
+                # of lines on the port:
                 nlines = self.ports[port_str]["num_lines"]
-                int_type = _smallest_int_type(nlines)
-                int_type_nbits = 8 * int_type().nbytes
-                columns[port] = (port_str, int_type)
-                bits_by_port[port] = [0] * int_type_nbits
+                columns[port] = (port_str, _smallest_int_type(nlines))
+                bits_by_port[port] = {}
             bits_by_port[port][line] = output.raw_output
         dtypes = [columns[port] for port in sorted(columns)]
         digital_out_table = np.empty(n_timepoints, dtype=dtypes)
         for port, bits in bits_by_port.items():
-            # Pack the bits from each port into an integer:
+            # Pack the bits from each port into an integer, directly into the table:
             port_str, dtype = columns[port]
-            values = bitfield(bits, dtype=dtype)
-            # Put them into the table:
-            digital_out_table[port_str] = np.array(values)
+            _pack_bits(bits, n_timepoints, dtype, out=digital_out_table[port_str])
         return digital_out_table
 
     def _make_analog_input_table(self, inputs):
@@ -614,6 +680,11 @@ class NI_DAQmx(IntermediateDevice):
         self._check_AI_not_too_fast(AI_table)
         self._check_wait_monitor_timeout_device_config()
 
+        self._save_tables(hdf5_file, AO_table, DO_table, AI_table)
+
+    def _save_tables(self, hdf5_file, AO_table, DO_table, AI_table):
+        """Save the output and acquisition tables, where not None, to the device group
+        in the shot file"""
         grp = self.init_device_group(hdf5_file)
         if AO_table is not None:
             grp.create_dataset('AO', data=AO_table, compression=config.compression)
@@ -6,12 +6,40 @@ import labscript_utils.properties as properties
 from labscript_utils import dedent
 
 
+def _change_points(values):
+    """Return the indices at which an array of output values differs from the
+    previous value, along with the first and last index. Since runviewer holds each
+    value until the next point of a trace, the trace sampled at these indices alone
+    displays identically to the full trace, but has one point per change rather than
+    one per clock tick."""
+    indices = np.flatnonzero(values[1:] != values[:-1]) + 1
+    if len(values) > 1 and (len(indices) == 0 or indices[-1] != len(values) - 1):
+        indices = np.append(indices, len(values) - 1)
+    return np.insert(indices, 0, 0)
+
+
 class NI_DAQmxParser(object):
     def __init__(self, path, device):
         self.path = path
         self.name = device.name
         self.device = device
 
+    @staticmethod
+    def _make_trace(clock_ticks, vals, static):
+        """Return a trace of the given output values, containing only the clock ticks
+        at which the value changes, and the first and last clock ticks. Static outputs
+        hold their first value over all clock ticks."""
+        if len(clock_ticks) == 0:
+            # Static outputs have a single row of values even with no clock ticks:
+            return clock_ticks, np.zeros(0)
+        if static:
+            indices = [0] if len(clock_ticks) == 1 else [0, len(clock_ticks) - 1]
+            vals = np.full(len(indices), vals[0])
+        else:
+            indices = _change_points(vals)
+            vals = vals[indices]
+        return clock_ticks[indices], vals.astype(float)
+
     def get_traces(self, add_trace, clock=None):
 
         with h5py.File(self.path, 'r') as f:
@@ -57,19 +85,18 @@ class NI_DAQmxParser(object):
         if DO_table is not None:
             ports_in_use = DO_table.dtype.names
             for port_str in ports_in_use:
+                port_vals = DO_table[port_str]
+                if static_DO:
+                    port_vals = port_vals[:1]
                 for line in range(ports[port_str]["num_lines"]):
                     # Extract each digital value from the packed bits:
-                    line_vals = (((1 << line) & DO_table[port_str]) != 0).astype(float)
-                    if static_DO:
-                        line_vals = np.full(len(clock_ticks), line_vals[0])
-                    traces['%s/line%d' % (port_str, line)] = (clock_ticks, line_vals)
+                    line_vals = ((1 << line) & port_vals) != 0
+                    trace = self._make_trace(clock_ticks, line_vals, static_DO)
+                    traces['%s/line%d' % (port_str, line)] = trace
 
         if AO_table is not None:
             for chan in AO_table.dtype.names:
-                vals = AO_table[chan]
-                if static_AO:
-                    vals = np.full(len(clock_ticks), vals[0])
-                traces[chan] = (clock_ticks, vals)
+                traces[chan] = self._make_trace(clock_ticks, AO_table[chan], static_AO)
 
         triggers = {}
         for channel_name, channel in self.device.child_list.items():
@@ -0,0 +1,75 @@
+#####################################################################
+#                                                                   #
+# /NI_DAQmx/testing/benchmark_digital_packing.py                    #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""Micro-benchmark comparing the packing of digital output lines into port integers
+by labscript.bitfield(), as previously used by NI_DAQmx._make_digital_out_table(), with
+the in-place blocked packing of _pack_bits(). Run as a script:
+
+    python benchmark_digital_packing.py
+"""
+from time import perf_counter
+
+import numpy as np
+from labscript import bitfield
+
+from labscript_devices.NI_DAQmx.labscript_devices import _pack_bits
+
+NUM_LINES = 32
+DTYPE = np.uint32
+REPEATS = 3
+
+
+def pack_with_bitfield(bits_by_line, n_timepoints, dtype, out):
+    """The previous implementation: a list of every bit position, zero for lines not in
+    use, packed with labscript.bitfield() and copied into the table"""
+    bits = [0] * 8 * np.dtype(dtype).itemsize
+    for line, values in bits_by_line.items():
+        bits[line] = values
+    out[:] = np.array(bitfield(bits, dtype=dtype))
+    return out
+
+
+def best_time(func, *args):
+    times = []
+    for _ in range(REPEATS):
+        start_time = perf_counter()
+        func(*args)
+        times.append(perf_counter() - start_time)
+    return min(times)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'timepoints':>12} {'lines':>6} {'bitfield (s)':>13} {'_pack_bits (s)':>15}")
+    for n_timepoints in [1_000_000, 3_000_000, 10_000_000]:
+        for num_lines in [8, NUM_LINES]:
+            bits_by_line = {
+                line: rng.integers(0, 2, n_timepoints, dtype=DTYPE)
+                for line in range(num_lines)
+            }
+            table = np.empty(n_timepoints, dtype=[('port0', DTYPE)])
+            reference = pack_with_bitfield(
+                bits_by_line, n_timepoints, DTYPE, table['port0']
+            ).copy()
+            _pack_bits(bits_by_line, n_timepoints, DTYPE, out=table['port0'])
+            assert np.array_equal(table['port0'], reference)
+            t_bitfield = best_time(
+                pack_with_bitfield, bits_by_line, n_timepoints, DTYPE, table['port0']
+            )
+            t_pack_bits = best_time(
+                _pack_bits, bits_by_line, n_timepoints, DTYPE, table['port0']
+            )
+            print(
+                f"{n_timepoints:12d} {num_lines:6d} {t_bitfield:13.4f} {t_pack_bits:15.4f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
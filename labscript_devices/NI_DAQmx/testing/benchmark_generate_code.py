@@ -0,0 +1,236 @@
+#####################################################################
+#                                                                   #
+# /NI_DAQmx/testing/benchmark_generate_code.py                      #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""Benchmark of the time taken by NI_DAQmx.generate_code() to compile a shot.
+
+Builds a synthetic experiment with a DummyPseudoclock clocking an NI DAQmx device of
+the given model (as named in models/capabilities.json), with the given numbers of
+analog outputs, digital output lines and analog inputs in use. The analog outputs are
+ramped for the given number of clock ticks, and the digital outputs toggled a number of
+times during the ramps. The shot is compiled several times, and the shortest time spent
+in each stage of NI_DAQmx.generate_code() is reported as JSON. Results may be appended
+to a file with --output, one JSON object per line, to track them over time. Example:
+
+    python benchmark_generate_code.py --model PCIe-6363 --num-AO 4 --num-DO 32 \\
+        --num-AI 8 --ticks 1000000 --output results.jsonl
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import labscript_utils.h5_lock
+import h5py
+
+import labscript
+from labscript import (
+    labscript_init,
+    labscript_cleanup,
+    start,
+    stop,
+    AnalogOut,
+    DigitalOut,
+    AnalogIn,
+)
+
+import labscript_devices
+from labscript_devices.DummyPseudoclock.labscript_devices import DummyPseudoclock
+from labscript_devices.NI_DAQmx import labscript_devices as NI_DAQmx_devices
+from labscript_devices.NI_DAQmx.labscript_devices import NI_DAQmx
+from labscript_devices.NI_DAQmx.utils import split_conn_AI, split_conn_port
+
+CAPABILITIES_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'models',
+    'capabilities.json',
+)
+
+# Methods of NI_DAQmx that are timed separately:
+TIMED_METHODS = [
+    '_check_bounds',
+    '_make_analog_out_table',
+    '_make_digital_out_table',
+    '_make_analog_input_table',
+    '_save_tables',
+    'generate_code',
+]
+
+# Number of times each digital output is toggled during the shot:
+NUM_DO_TOGGLES = 100
+
+
+def instrument(timings):
+    """Wrap the methods of NI_DAQmx in TIMED_METHODS to accumulate the time spent in
+    them into the dict timings. Return a dict of the original methods."""
+    originals = {}
+    for name in TIMED_METHODS:
+        original = getattr(NI_DAQmx, name)
+        originals[name] = original
+
+        @functools.wraps(original)
+        def wrapper(*args, _original=original, _name=name, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                timings[_name] += time.perf_counter() - start_time
+
+        setattr(NI_DAQmx, name, wrapper)
+    return originals
+
+
+def uninstrument(originals):
+    for name, original in originals.items():
+        setattr(NI_DAQmx, name, original)
+
+
+def get_device_class(model):
+    """Return the NI_DAQmx subclass for a model name such as 'PCIe-6363'"""
+    return getattr(NI_DAQmx_devices, 'NI_' + model.replace('-', '_'))
+
+
+def build_shot(model, capabilities, num_AO, num_DO, num_AI, ticks, rate):
+    """Define the devices and instructions of the synthetic shot. Return its stop
+    time."""
+    clock = DummyPseudoclock('pseudoclock')
+    acquisition_rate = None
+    if num_AI:
+        acquisition_rate = capabilities['max_AI_single_chan_rate']
+        if num_AI > 1 and not capabilities['supports_simultaneous_AI_sampling']:
+            acquisition_rate = capabilities['max_AI_multi_chan_rate'] / num_AI
+    daq = get_device_class(model)(
+        'daq',
+        parent_device=clock.clockline,
+        clock_terminal='PFI0',
+        acquisition_rate=acquisition_rate,
+    )
+
+    analog_outs = [AnalogOut('ao%d' % i, daq, 'ao%d' % i) for i in range(num_AO)]
+
+    DO_connections = []
+    for port_str in sorted(capabilities['ports'], key=split_conn_port):
+        port = capabilities['ports'][port_str]
+        if port['supports_buffered']:
+            for line in range(port['num_lines']):
+                DO_connections.append('%s/line%d' % (port_str, line))
+    digital_outs = [
+        DigitalOut('do%d' % i, daq, connection)
+        for i, connection in enumerate(DO_connections[:num_DO])
+    ]
+
+    AI_chans = sorted(daq.AI_chans, key=split_conn_AI)
+    analog_ins = [AnalogIn(chan, daq, chan) for chan in AI_chans[:num_AI]]
+
+    start()
+    t = 1e-3
+    duration = ticks / rate
+    for i, analog_out in enumerate(analog_outs):
+        analog_out.ramp(t, duration, initial=0, final=(i + 1) / num_AO, samplerate=rate)
+    toggle_times = t + np.linspace(0, duration, NUM_DO_TOGGLES, endpoint=False)
+    for i, digital_out in enumerate(digital_outs):
+        # Stagger the toggles so that different lines differ:
+        for j, toggle_time in enumerate(toggle_times + i * duration / ticks):
+            if j % 2:
+                digital_out.go_low(toggle_time)
+            else:
+                digital_out.go_high(toggle_time)
+    for analog_in in analog_ins:
+        analog_in.acquire(analog_in.name, t, t + duration)
+    stop_time = t + duration + 1e-3
+    stop(stop_time)
+    return stop_time
+
+
+def run(model, num_AO, num_DO, num_AI, ticks, rate, repeats):
+    """Compile the synthetic shot `repeats` times and return a dict of results"""
+    with open(CAPABILITIES_FILE) as f:
+        capabilities = json.load(f)[model]
+    best_timings = {}
+    compile_times = []
+    num_timepoints = None
+    with tempfile.TemporaryDirectory() as tempdir:
+        h5_path = os.path.join(tempdir, 'benchmark.h5')
+        for _ in range(repeats):
+            timings = defaultdict(float)
+            originals = instrument(timings)
+            try:
+                labscript_init(h5_path, new=True, overwrite=True)
+                start_time = time.perf_counter()
+                build_shot(model, capabilities, num_AO, num_DO, num_AI, ticks, rate)
+                compile_times.append(time.perf_counter() - start_time)
+            finally:
+                uninstrument(originals)
+                labscript_cleanup()
+            for name, value in timings.items():
+                best_timings[name] = min(value, best_timings.get(name, np.inf))
+            with h5py.File(h5_path, 'r') as f:
+                group = f['devices/daq']
+                for table in ['AO', 'DO']:
+                    if table in group:
+                        num_timepoints = len(group[table])
+                        break
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'labscript_version': labscript.__version__,
+        'labscript_devices_version': labscript_devices.__version__,
+        'numpy_version': np.__version__,
+        'python_version': sys.version.split()[0],
+        'model': model,
+        'num_AO': num_AO,
+        'num_DO': num_DO,
+        'num_AI': num_AI,
+        'ticks': ticks,
+        'rate': rate,
+        'num_timepoints': num_timepoints,
+        'repeats': repeats,
+        'compile_time': min(compile_times),
+        'timings': best_timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='PCIe-6363')
+    parser.add_argument('--num-AO', type=int, default=4)
+    parser.add_argument('--num-DO', type=int, default=32)
+    parser.add_argument('--num-AI', type=int, default=0)
+    parser.add_argument('--ticks', type=int, default=100000)
+    parser.add_argument('--rate', type=float, default=100e3)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument(
+        '--output', default=None, help='File to append the JSON results to'
+    )
+    args = parser.parse_args()
+    if args.num_AO % 2 or args.num_DO % 2:
+        parser.error('NI_DAQmx devices require even numbers of AO and DO channels')
+
+    results = run(
+        args.model,
+        args.num_AO,
+        args.num_DO,
+        args.num_AI,
+        args.ticks,
+        args.rate,
+        args.repeats,
+    )
+    print(json.dumps(results, indent=4))
+    if args.output is not None:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(results) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#####################################################################
+#                                                                   #
+# /NI_DAQmx/testing/test_make_trace.py                              #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""Test of the runviewer traces of NI_DAQmx outputs, which contain only the clock
+ticks at which the value changes"""
+import numpy as np
+import pytest
+
+from labscript_devices.NI_DAQmx.runviewer_parsers import NI_DAQmxParser
+
+
+@pytest.mark.parametrize("static", [False, True])
+def test_make_trace_no_clock_ticks(static):
+    # Static outputs have a single row of values, buffered ones none:
+    vals = np.ones(1 if static else 0, dtype=np.uint8)
+    times, values = NI_DAQmxParser._make_trace(np.array([]), vals, static)
+    assert len(times) == 0
+    assert len(values) == 0
+    assert values.dtype == float
+
+
+@pytest.mark.parametrize("static", [False, True])
+def test_make_trace_one_clock_tick(static):
+    times, values = NI_DAQmxParser._make_trace(
+        np.array([0.5]), np.array([2], dtype=np.uint8), static
+    )
+    assert np.array_equal(times, [0.5])
+    assert np.array_equal(values, [2])
+
+
+def test_make_trace():
+    clock_ticks = np.arange(6) * 0.5
+    vals = np.array([1, 1, 2, 2, 2, 3], dtype=np.uint8)
+    times, values = NI_DAQmxParser._make_trace(clock_ticks, vals, False)
+    assert np.array_equal(times, [0, 1, 2.5])
+    assert np.array_equal(values, [1, 2, 3])
+    # The last clock tick is included once the value stops changing:
+    times, values = NI_DAQmxParser._make_trace(clock_ticks, vals[::-1], False)
+    assert np.array_equal(times, [0, 0.5, 2, 2.5])
+    assert np.array_equal(values, [3, 2, 1, 1])
+    times, values = NI_DAQmxParser._make_trace(clock_ticks[:1], vals[:1], False)
+    assert np.array_equal(times, [0])
+    assert np.array_equal(values, [1])
+    times, values = NI_DAQmxParser._make_trace(clock_ticks, vals, True)
+    assert np.array_equal(times, [0, 2.5])
+    assert np.array_equal(values, [1, 1])
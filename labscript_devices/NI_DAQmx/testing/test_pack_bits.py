@@ -0,0 +1,46 @@
+#####################################################################
+#                                                                   #
+# /NI_DAQmx/testing/test_pack_bits.py                               #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""Test of the packing of digital output lines into port integers by _pack_bits()
+against packing with Python integers, for ports of each width"""
+import numpy as np
+import pytest
+
+from labscript_devices.NI_DAQmx.labscript_devices import _pack_bits, _ints
+
+
+@pytest.mark.parametrize("n_bits", sorted(_ints))
+@pytest.mark.parametrize("n_timepoints", [0, 1, 7, 100])
+def test_pack_bits(n_bits, n_timepoints):
+    dtype = _ints[n_bits]
+    rng = np.random.default_rng(n_bits + n_timepoints)
+    lines = rng.choice(n_bits, size=min(n_bits, 5), replace=False)
+    bits_by_line = {
+        int(line): rng.integers(0, 2, n_timepoints, dtype=np.uint32) for line in lines
+    }
+    expected = np.array(
+        [
+            sum(int(bits[i]) << line for line, bits in bits_by_line.items())
+            for i in range(n_timepoints)
+        ],
+        dtype=dtype,
+    )
+    # Small blocks, to test packing over several of them:
+    result = _pack_bits(bits_by_line, n_timepoints, dtype, block_size=3)
+    assert result.dtype == dtype
+    assert np.array_equal(result, expected)
+
+
+def test_pack_bits_high_lines():
+    ones = np.ones(4, dtype=np.uint32)
+    out = np.zeros(4, dtype=[('port0', np.uint64)])
+    result = _pack_bits({40: ones, 31: ones, 63: ones}, 4, np.uint64, out=out['port0'])
+    assert np.all(out['port0'] == 2 ** 40 + 2 ** 31 + 2 ** 63)
+    assert np.all(result == out['port0'])
@@ -30,7 +30,7 @@ class NovaTechDDS9M(IntermediateDevice):
     """
     This class is initilzed with the key word argument  
     'update_mode' -- synchronous or asynchronous\
-    'baud_rate',  -- operating baud rate
+    'baud_rate',  -- operating baud rate, or None to use the fastest the device supports
     'default_baud_rate' -- assumed baud rate at startup
     """
     description = 'NT-DDS9M'
@@ -61,7 +61,7 @@ class NovaTechDDS9M(IntermediateDevice):
         name,
         parent_device,
         com_port="",
-        baud_rate=115200,
+        baud_rate=None,
         default_baud_rate=None,
         update_mode='synchronous',
         synchronous_first_line_repeat=False,
@@ -69,13 +69,16 @@ class NovaTechDDS9M(IntermediateDevice):
         **kwargs
     ):
         IntermediateDevice.__init__(self, name, parent_device, **kwargs)
-        self.BLACS_connection = '%s,%s'%(com_port, str(baud_rate))
+        if baud_rate is not None:
+            self.BLACS_connection = '%s,%s'%(com_port, str(baud_rate))
+        else:
+            self.BLACS_connection = com_port
 
         if not update_mode in ['synchronous', 'asynchronous']:
             raise LabscriptError('update_mode must be \'synchronous\' or \'asynchronous\'')            
         
-        if not baud_rate in bauds:     
-            raise LabscriptError('baud_rate must be one of {0}'.format(list(bauds)))            
+        if not baud_rate in bauds and baud_rate is not None:
+            raise LabscriptError('baud_rate must be one of {0} or None (to use the fastest supported)'.format(list(bauds)))
 
         if not default_baud_rate in bauds and default_baud_rate is not None:     
             raise LabscriptError('default_baud_rate must be one of {0} or None (to indicate no default)'.format(list(bauds)))            
@@ -279,17 +282,17 @@ class NovatechDDS9MTab(DeviceTab):
         self.default_baud_rate = connection_table_properties.get('default_baud_rate', None)
         self.update_mode = connection_table_properties.get('update_mode', 'synchronous')
         
-        # Backward compat:
-        blacs_connection =  str(connection_object.BLACS_connection)
-        if ',' in blacs_connection:
-            com_port, baud_rate = blacs_connection.split(',')
-            if self.com_port is None:
-                self.com_port = com_port
-            if self.baud_rate is None:
+        # Backward compat for connection tables without these properties:
+        if 'baud_rate' not in connection_table_properties:
+            blacs_connection =  str(connection_object.BLACS_connection)
+            if ',' in blacs_connection:
+                com_port, baud_rate = blacs_connection.split(',')
+                if self.com_port is None:
+                    self.com_port = com_port
                 self.baud_rate = int(baud_rate)
-        else:
-            self.com_port = blacs_connection
-            self.baud_rate = 115200
+            else:
+                self.com_port = blacs_connection
+                self.baud_rate = 115200
         
 
 
@@ -307,16 +310,22 @@ class NovatechDDS9MTab(DeviceTab):
 
 
 class NovatechDDS9mWorker(Worker):
+    # Number of table mode commands written before reading back their responses.
+    # Kept small so as not to overflow the device's serial input buffer:
+    table_write_batch_size = 16
+
     def init(self):
         global serial; import serial
         global socket; import socket
         global h5py; import labscript_utils.h5_lock, h5py
-        self.smart_cache = {'STATIC_DATA': None, 'TABLE_DATA': ''}
+        self.smart_cache = {'STATIC_DATA': None, 'TABLE_DATA': None}
         
         if self.default_baud_rate is not None:
             initial_baud_rate = self.default_baud_rate
-        else:
+        elif self.baud_rate is not None:
             initial_baud_rate = self.baud_rate
+        else:
+            initial_baud_rate = max(bauds)
 
         self.connection = serial.Serial(
             self.com_port, baudrate=initial_baud_rate, timeout=0.1
@@ -324,28 +333,26 @@ class NovatechDDS9mWorker(Worker):
         
         # Check if the novatech will talk to us on this baud rate:
         if not self.check_connection():
-            # Nope. Try all baud rates, from slowest to fastest:
-            for rate in sorted(bauds):
-                self.connection.baudrate = rate
-                if self.check_connection():
-                    # found it!
-                    break
-            else:
-                # None of them worked.
-                msg = "Error: tried all baud rates but got no response from NovaTech."
-                raise RuntimeError(msg)
+            self.find_baud_rate()
 
         # If the baud rate we are using to initially talk to the device is not the one
-        # we want to use to program it, switch now to the desired baud rate:
-        if self.connection.baudrate != self.baud_rate:
-            self.connection.write(b'%s\r\n' % bauds[self.baud_rate])
-            # ensure command finishes before switching rates in pyserial:
-            time.sleep(0.1)
-            self.connection.baudrate = self.baud_rate
-            if not self.check_connection():
-                msg = 'Error: Failed to execute command %s' % bauds[self.baud_rate]
-                raise RuntimeError(msg)           
-        
+        # we want to use to program it, switch now to the desired baud rate. If no baud
+        # rate was specified, use the fastest one the device works at:
+        if self.baud_rate is not None:
+            if self.connection.baudrate != self.baud_rate:
+                if not self.set_baud_rate(self.baud_rate):
+                    msg = 'Error: Failed to execute command %s' % bauds[self.baud_rate]
+                    raise RuntimeError(msg)
+        else:
+            for rate in sorted(bauds, reverse=True):
+                if self.connection.baudrate == rate or self.set_baud_rate(rate):
+                    break
+                # No response at the new rate. Find the device again before trying
+                # the next fastest:
+                self.logger.info('NovaTech did not respond at %d baud' % rate)
+                self.find_baud_rate()
+        self.logger.info('Communicating with NovaTech at %d baud' % self.connection.baudrate)
+
         # Set phase mode method
         phase_mode_commands = {
             'aligned': b'm a',
@@ -383,6 +390,26 @@ class NovatechDDS9mWorker(Worker):
         
         #return self.get_current_values()
         
+    def find_baud_rate(self):
+        """Tries all baud rates, from slowest to fastest, until the device responds"""
+        for rate in sorted(bauds):
+            self.connection.baudrate = rate
+            if self.check_connection():
+                # found it!
+                return
+        # None of them worked.
+        msg = "Error: tried all baud rates but got no response from NovaTech."
+        raise RuntimeError(msg)
+
+    def set_baud_rate(self, rate):
+        """Switches the device and the serial port to the given baud rate, returns
+        True if the device responds at the new rate, else returns False"""
+        self.connection.write(b'%s\r\n' % bauds[rate])
+        # ensure command finishes before switching rates in pyserial:
+        time.sleep(0.1)
+        self.connection.baudrate = rate
+        return self.check_connection()
+
     def check_connection(self):
         """Sends non-command and tests for correct response, returns True if connection
         appears to be working correctly, else returns False"""
@@ -505,24 +532,10 @@ class NovatechDDS9mWorker(Worker):
         # Now program the buffered outputs:
         if table_data is not None:
             data = table_data
-            for i, line in enumerate(data):
-                st = time.time()
-                oldtable = self.smart_cache['TABLE_DATA']
-                for ddsno in range(2):
-                    if fresh or i >= len(oldtable) or (line['freq%d'%ddsno],line['phase%d'%ddsno],line['amp%d'%ddsno]) != (oldtable[i]['freq%d'%ddsno],oldtable[i]['phase%d'%ddsno],oldtable[i]['amp%d'%ddsno]):
-                        self.connection.write(b't%d %04x %08x,%04x,%04x,ff\r\n'%(ddsno, i,line['freq%d'%ddsno],line['phase%d'%ddsno],line['amp%d'%ddsno]))
-                        self.connection.readline()
-                et = time.time()
-                tt=et-st
-                self.logger.debug('Time spent on line %s: %s'%(i,tt))
-            # Store the table for future smart programming comparisons:
-            try:
-                self.smart_cache['TABLE_DATA'][:len(data)] = data
-                self.logger.debug('Stored new table as subset of old table')
-            except: # new table is longer than old table
-                self.smart_cache['TABLE_DATA'] = data
-                self.logger.debug('New table is longer than old table and has replaced it.')
-                
+            start_time = time.time()
+            num_commands = self.program_table(data, fresh)
+            self.logger.debug('Programmed %d table entries in %.3f s' % (num_commands, time.time() - start_time))
+
             # Get the final values of table mode so that the GUI can
             # reflect them after the run:
             self.final_values['channel 0'] = {}
@@ -552,6 +565,63 @@ class NovatechDDS9mWorker(Worker):
             
         return self.final_values
     
+    def program_table(self, data, fresh):
+        """Writes the lines of the table that differ from those already in the
+        device's memory, for each of the two table mode channels. Commands are
+        written in batches of table_write_batch_size, and the responses to each batch
+        read back and checked before writing the next. Returns the number of
+        commands written."""
+        oldtable = self.smart_cache['TABLE_DATA']
+        num_cached = 0 if fresh or oldtable is None else min(len(oldtable), len(data))
+        changed = np.ones((len(data), 2), dtype=bool)
+        if num_cached:
+            changed[:num_cached] = False
+            for ddsno in range(2):
+                for field in ['freq%d'%ddsno, 'phase%d'%ddsno, 'amp%d'%ddsno]:
+                    changed[:num_cached, ddsno] |= data[field][:num_cached] != oldtable[field][:num_cached]
+        lines, ddsnos = np.nonzero(changed)
+
+        columns = {name: data[name].tolist() for name in data.dtype.names}
+        commands = [
+            b't%d %04x %08x,%04x,%04x,ff\r\n'
+            % (ddsno, i, columns['freq%d'%ddsno][i], columns['phase%d'%ddsno][i], columns['amp%d'%ddsno][i])
+            for i, ddsno in zip(lines.tolist(), ddsnos.tolist())
+        ]
+
+        # Invalidate the cache until programming is complete, in case it fails part
+        # way through:
+        self.smart_cache['TABLE_DATA'] = None
+        for start in range(0, len(commands), self.table_write_batch_size):
+            batch = commands[start:start + self.table_write_batch_size]
+            self.connection.write(b''.join(batch))
+            responses = self.read_responses(len(batch))
+            for command, response in zip(batch, responses):
+                if response != b'OK':
+                    msg = 'Error: Failed to execute command: %s, received "%s".'
+                    raise Exception(msg % (command.decode('utf8').strip(), response))
+
+        # Store the table for future smart programming comparisons. Lines of the old
+        # table beyond the end of the new one are still in the device's memory:
+        if oldtable is not None and len(oldtable) > len(data):
+            oldtable[:len(data)] = data
+            self.smart_cache['TABLE_DATA'] = oldtable
+        else:
+            self.smart_cache['TABLE_DATA'] = data
+        return len(commands)
+
+    def read_responses(self, num_responses):
+        """Reads the given number of lines from the device, returning them without
+        their line endings. Raises an exception if they do not all arrive before
+        the serial port times out."""
+        response = b''
+        while response.count(b'\n') < num_responses:
+            chunk = self.connection.read(max(1, self.connection.in_waiting))
+            if not chunk:
+                msg = 'Error: Expected %d responses from NovaTech, received "%s".'
+                raise Exception(msg % (num_responses, response))
+            response += chunk
+        return response.split(b'\r\n')[:num_responses]
+
     def abort_transition_to_buffered(self):
         return self.transition_to_manual(True)
         
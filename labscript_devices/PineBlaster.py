@@ -17,7 +17,7 @@ from labscript_devices import runviewer_parser, BLACS_tab
 import numpy as np
 import labscript_utils.h5_lock, h5py
 import labscript_utils.properties
-
+from labscript_devices.pseudoclock_traces import expand_pulse_program, get_clock_ticks
 
 
 # Define a PineBlasterPseudoClock that only accepts one child clockline
@@ -130,45 +130,23 @@ class RunviewerClass(object):
             
     def get_traces(self, add_trace, clock=None):
         if clock is not None:
-            times, clock_value = clock[0], clock[1]
-            clock_indices = np.where((clock_value[1:]-clock_value[:-1])==1)[0]+1
-            # If initial clock value is 1, then this counts as a rising edge (clock should be 0 before experiment)
-            # but this is not picked up by the above code. So we insert it!
-            if clock_value[0] == 1:
-                clock_indices = np.insert(clock_indices, 0, 0)
-            clock_ticks = times[clock_indices]
-
-        
+            clock_ticks = get_clock_ticks(clock)
             
         # get the pulse program
         with h5py.File(self.path, 'r') as f:
             pulse_program = f['devices/%s/PULSE_PROGRAM'%self.name][:]
             
-        time = []
-        states = []
-        trigger_index = 0
-        t = 0 if clock is None else clock_ticks[trigger_index]+self.trigger_delay
-        trigger_index += 1
-        
-        clock_factor = self.clock_resolution/2.
-        
-        for row in pulse_program:
-            if row['period'] == 0:
-                #special case
-                if row['reps'] == 1: # WAIT
-                    if clock is not None:
-                        t = clock_ticks[trigger_index]+self.trigger_delay
-                        trigger_index += 1
-                    else:
-                        t += self.wait_delay
-            else:    
-                for i in range(row['reps']):
-                    for j in range(1, -1, -1):
-                        time.append(t)
-                        states.append(j)
-                        t += row['period']*clock_factor
-        
-        clock = (np.array(time), np.array(states))
+        periods = pulse_program['period']*(self.clock_resolution/2.)
+        # Instructions with zero period are waits if they have one rep, otherwise stop
+        # instructions, and produce no ticks:
+        special = pulse_program['period'] == 0
+        waits = np.flatnonzero(special & (pulse_program['reps'] == 1))
+        reps = np.where(special, 0, pulse_program['reps'])
+        start_time, resume_times = 0, None
+        if clock is not None:
+            start_time = clock_ticks[0]+self.trigger_delay
+            resume_times = clock_ticks[1:]+self.trigger_delay
+        clock, _ = expand_pulse_program(periods, periods, reps, waits, start_time, resume_times, self.wait_delay)
         
         clocklines_and_triggers = {}
         for pseudoclock_name, pseudoclock in self.device.child_list.items():
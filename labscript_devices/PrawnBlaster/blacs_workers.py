@@ -25,6 +25,14 @@ class PrawnBlasterWorker(Worker):
     with the hardware.
     """
 
+    binary_programming_version = (1, 1, 0)
+    """Earliest firmware version supporting the `setb` command for programming blocks
+    of instructions in a single binary transfer."""
+
+    binary_programming_max_gap = 64
+    """Largest number of unchanged instructions between two changed instructions that
+    are resent to program both in the same binary transfer, rather than in two."""
+
     def init(self):
         """Initialises the hardware communication.
 
@@ -58,6 +66,20 @@ class PrawnBlasterWorker(Worker):
         self.prawnblaster = serial.Serial(self.com_port, 115200, timeout=1)
         self.check_status()
 
+        # Check whether the firmware supports binary programming of instructions
+        self.binary_programming = False
+        self.prawnblaster.write(b"version\r\n")
+        response = self.prawnblaster.readline().decode()
+        match = re.match(r"version: (\d+)\.(\d+)\.(\d+)", response)
+        if match:
+            version = tuple(int(v) for v in match.groups())
+            self.binary_programming = version >= self.binary_programming_version
+        if not self.binary_programming:
+            self.logger.info(
+                "Firmware does not support binary programming, instructions will be "
+                "programmed one at a time"
+            )
+
         # configure number of pseudoclocks
         self.prawnblaster.write(b"setnumpseudoclocks %d\r\n" % self.num_pseudoclocks)
         assert self.prawnblaster.readline().decode() == "ok\r\n"
@@ -246,7 +268,7 @@ class PrawnBlasterWorker(Worker):
             group = hdf5_file[f"devices/{device_name}"]
             for i in range(self.num_pseudoclocks):
                 pulse_programs.append(group[f"PULSE_PROGRAM_{i}"][:])
-                self.smart_cache.setdefault(i, [])
+                self.smart_cache.setdefault(i, numpy.zeros((0, 2), dtype="<u4"))
             self.device_properties = labscript_utils.properties.get(
                 hdf5_file, device_name, "device_properties"
             )
@@ -292,27 +314,7 @@ class PrawnBlasterWorker(Worker):
 
         # Program instructions
         for pseudoclock, pulse_program in enumerate(pulse_programs):
-            for i, instruction in enumerate(pulse_program):
-                if i == len(self.smart_cache[pseudoclock]):
-                    # Pad the smart cache out to be as long as the program:
-                    self.smart_cache[pseudoclock].append(None)
-
-                # Only program instructions that differ from what's in the smart cache:
-                if self.smart_cache[pseudoclock][i] != instruction:
-                    self.prawnblaster.write(
-                        b"set %d %d %d %d\r\n"
-                        % (
-                            pseudoclock,
-                            i,
-                            instruction["half_period"],
-                            instruction["reps"],
-                        )
-                    )
-                    response = self.prawnblaster.readline().decode()
-                    assert (
-                        response == "ok\r\n"
-                    ), f"PrawnBlaster said '{response}', expected 'ok'"
-                    self.smart_cache[pseudoclock][i] = instruction
+            self.program_instructions(pseudoclock, pulse_program)
 
         if not self.is_master_pseudoclock:
             # Start the Prawnblaster and have it wait for a hardware trigger
@@ -324,6 +326,74 @@ class PrawnBlasterWorker(Worker):
             final[f"GPIO {pin:02d}"] = 0
         return final
 
+    def program_instructions(self, pseudoclock, pulse_program):
+        """Programs the instructions of a pseudoclock that differ from the
+        :py:attr:`smart_cache`.
+
+        If the firmware supports it, each contiguous range of changed instructions is
+        sent in a single binary transfer. Otherwise instructions are sent one at a time.
+
+        Args:
+            pseudoclock (int): Index of the pseudoclock to program.
+            pulse_program (numpy.ndarray): Structured array of instructions with
+                `half_period` and `reps` fields.
+        """
+
+        instructions = numpy.empty((len(pulse_program), 2), dtype="<u4")
+        instructions[:, 0] = pulse_program["half_period"]
+        instructions[:, 1] = pulse_program["reps"]
+
+        # Only program instructions that differ from what's in the smart cache. Any
+        # instructions beyond the end of the smart cache have never been programmed:
+        cache = self.smart_cache[pseudoclock]
+        n_cached = min(len(cache), len(instructions))
+        changed = numpy.ones(len(instructions), dtype=bool)
+        changed[:n_cached] = (cache[:n_cached] != instructions[:n_cached]).any(axis=1)
+        changed_indices = numpy.flatnonzero(changed)
+        if not len(changed_indices):
+            return
+
+        # If programming fails part way through, the state of the device is unknown:
+        self.smart_cache[pseudoclock] = numpy.zeros((0, 2), dtype="<u4")
+
+        if self.binary_programming:
+            # Split the changed instructions into ranges, merging ranges separated by
+            # a few unchanged instructions since resending them is quicker than
+            # sending another command:
+            gaps = numpy.diff(changed_indices) > self.binary_programming_max_gap + 1
+            starts = changed_indices[numpy.insert(gaps, 0, True)]
+            stops = changed_indices[numpy.append(gaps, True)] + 1
+            for start, stop in zip(starts, stops):
+                # The firmware replies 'ready', reads exactly 8 bytes per instruction
+                # (little-endian uint32 half-period and reps), then replies 'ok':
+                self.prawnblaster.write(
+                    b"setb %d %d %d\r\n" % (pseudoclock, start, stop - start)
+                )
+                response = self.prawnblaster.readline().decode()
+                assert (
+                    response == "ready\r\n"
+                ), f"PrawnBlaster said '{response}', expected 'ready'"
+                self.prawnblaster.write(instructions[start:stop].tobytes())
+                response = self.prawnblaster.readline().decode()
+                assert (
+                    response == "ok\r\n"
+                ), f"PrawnBlaster said '{response}', expected 'ok'"
+        else:
+            for i in changed_indices:
+                half_period, reps = instructions[i]
+                self.prawnblaster.write(
+                    b"set %d %d %d %d\r\n" % (pseudoclock, i, half_period, reps)
+                )
+                response = self.prawnblaster.readline().decode()
+                assert (
+                    response == "ok\r\n"
+                ), f"PrawnBlaster said '{response}', expected 'ok'"
+
+        # Instructions beyond the end of this program are left as they were:
+        self.smart_cache[pseudoclock] = numpy.concatenate(
+            [instructions, cache[len(instructions) :]]
+        )
+
     def start_run(self):
         """When used as the primary pseudoclock, starts execution
         in software time to engage the shot."""
@@ -27,6 +27,85 @@ from labscript import (
 import numpy as np
 
 
+def _compress_instructions(clock, clock_resolution, wait_half_periods):
+    """Compresses the clock instructions of a pseudoclock into PrawnBlaster
+    instructions, combining consecutive instructions with the same half-period.
+
+    Args:
+        clock (list): The clock instructions of the pseudoclock, as generated by
+            labscript. Each is either a dict with `step` and `reps` keys, or the
+            string `"WAIT"`.
+        clock_resolution (float): Resolution of the half-period in seconds.
+        wait_half_periods (list): For each wait, a list of the half-periods of the
+            instructions, with zero reps, that the wait is converted to.
+
+    Returns:
+        tuple: Arrays of the half-periods and reps of the compressed instructions,
+        not including the final stop instruction.
+    """
+    max_reps = 2 ** 32 - 1
+
+    # Positions of the waits in the list of clock instructions excluding waits:
+    wait_positions = []
+    steps = []
+    reps = []
+    for instruction in clock:
+        if instruction == "WAIT":
+            wait_positions.append(len(steps))
+        else:
+            steps.append(instruction["step"])
+            reps.append(instruction["reps"])
+    half_periods = np.round(np.array(steps, dtype=float) / clock_resolution)
+    half_periods = half_periods.astype(np.int64)
+    reps = np.array(reps, dtype=np.int64)
+
+    # Runs of instructions with the same half-period, not interrupted by a wait:
+    run_start = np.ones(len(half_periods), dtype=bool)
+    run_start[1:] = half_periods[1:] != half_periods[:-1]
+    run_start[[i for i in wait_positions if i < len(run_start)]] = True
+    run_starts = np.flatnonzero(run_start)
+
+    if len(run_starts):
+        run_half_periods = half_periods[run_starts]
+        run_reps = np.add.reduceat(reps, run_starts)
+        # Runs whose reps fit in a single instruction are each combined into one.
+        # Others (and any with zero reps, which are never combined with following
+        # instructions) are split up one instruction at a time:
+        split = (run_reps >= max_reps) | (np.minimum.reduceat(reps, run_starts) == 0)
+    else:
+        run_half_periods = run_reps = np.zeros(0, dtype=np.int64)
+        split = np.zeros(0, dtype=bool)
+    run_lengths = np.ones(len(run_starts), dtype=np.int64)
+    if split.any():
+        run_stops = np.append(run_starts[1:], len(reps))
+        run_half_periods = list(run_half_periods)
+        run_reps = list(run_reps)
+        for j in reversed(np.flatnonzero(split)):
+            split_reps = []
+            for rep in reps[run_starts[j] : run_stops[j]]:
+                if split_reps and split_reps[-1] != 0 and split_reps[-1] + rep < max_reps:
+                    split_reps[-1] += rep
+                else:
+                    split_reps.append(rep)
+            run_half_periods[j : j + 1] = [run_half_periods[j]] * len(split_reps)
+            run_reps[j : j + 1] = split_reps
+            run_lengths[j] = len(split_reps)
+        run_half_periods = np.array(run_half_periods, dtype=np.int64)
+        run_reps = np.array(run_reps, dtype=np.int64)
+
+    # Splice in the instructions for each wait, after the runs preceding it:
+    instructions_before = np.append(0, np.cumsum(run_lengths))
+    insert_positions = []
+    insert_half_periods = []
+    for position, wait in zip(wait_positions, wait_half_periods):
+        insert_position = instructions_before[np.searchsorted(run_starts, position)]
+        insert_positions.extend([insert_position] * len(wait))
+        insert_half_periods.extend(wait)
+    half_periods = np.insert(run_half_periods, insert_positions, insert_half_periods)
+    reps = np.insert(run_reps, insert_positions, 0)
+    return half_periods, reps
+
+
 class _PrawnBlasterPseudoclock(Pseudoclock):
     """Customized Clockline for use with the PrawnBlaster.
 
@@ -155,6 +234,7 @@ class PrawnBlaster(PseudoclockDevice):
                 "in_pins",
                 "out_pins",
                 "num_pseudoclocks",
+                "runviewer_envelope_threshold",
             ],
             "device_properties": [
                 "clock_frequency",
@@ -181,6 +261,7 @@ class PrawnBlaster(PseudoclockDevice):
         clock_frequency=100e6,
         external_clock_pin=None,
         use_wait_monitor=True,
+        runviewer_envelope_threshold=None,
     ):
         """PrawnBlaster Pseudoclock labscript device.
 
@@ -211,6 +292,10 @@ class PrawnBlaster(PseudoclockDevice):
                 using `clock_frequency`.
             use_wait_monitor (bool, optional): Configure the PrawnBlaster to
                 perform its own wait monitoring.
+            runviewer_envelope_threshold (int, optional): If not `None` (the
+                default), runviewer displays clocklines with more ticks than this
+                as a decimated envelope of at most this many pulses, each spanning
+                a group of consecutive ticks.
 
         """
 
@@ -220,6 +305,11 @@ class PrawnBlaster(PseudoclockDevice):
                 f"The PrawnBlaster {name} only supports between 1 and 4 pseudoclocks"
             )
 
+        if runviewer_envelope_threshold is not None and runviewer_envelope_threshold < 1:
+            raise LabscriptError(
+                f"The PrawnBlaster {name} runviewer_envelope_threshold must be at least 1"
+            )
+
         # Update the specs based on the number of pseudoclocks
         self.max_instructions = self.max_instructions // num_pseudoclocks
         # Update the specs based on the clock frequency
@@ -370,85 +460,52 @@ class PrawnBlaster(PseudoclockDevice):
         for i, pseudoclock in enumerate(self.pseudoclocks):
             current_wait_index = 0
 
-            # Compress clock instructions with the same half_period
-            reduced_instructions = []
+            # Get the instructions each wait is converted to:
+            wait_half_periods = []
             for instruction in pseudoclock.clock:
-                if instruction == "WAIT":
-                    # If we're using the internal wait monitor, set the timeout
-                    if self.use_wait_monitor:
-                        # Get the wait timeout value
-                        wait_timeout = compiler.wait_table[
-                            wait_table[current_wait_index]
-                        ][1]
-                        current_wait_index += 1
-                        # The following half_period and reps indicates a wait instruction
-                        reduced_instructions.append(
-                            {
-                                "half_period": round(
-                                    wait_timeout / (self.clock_resolution / 2)
-                                ),
-                                "reps": 0,
-                            }
-                        )
-                        continue
-                    # Else, set an indefinite wait and wait for a trigger from something else.
-                    else:
-                        # Two waits in a row are an indefinite wait
-                        reduced_instructions.append(
-                            {
-                                "half_period": 2 ** 32 - 1,
-                                "reps": 0,
-                            }
-                        )
-                        reduced_instructions.append(
-                            {
-                                "half_period": 2 ** 32 - 1,
-                                "reps": 0,
-                            }
-                        )
-
-                # Normal instruction
-                reps = instruction["reps"]
-                # half_period is in quantised units:
-                half_period = int(round(instruction["step"] / self.clock_resolution))
-                if (
-                    # If there is a previous instruction
-                    reduced_instructions
-                    # And it's not a wait
-                    and reduced_instructions[-1]["reps"] != 0
-                    # And the half_periods match
-                    and reduced_instructions[-1]["half_period"] == half_period
-                    # And the sum of the previous reps and current reps won't push it over the limit
-                    and (reduced_instructions[-1]["reps"] + reps) < (2 ** 32 - 1)
-                ):
-                    # Combine instructions!
-                    reduced_instructions[-1]["reps"] += reps
-                else:
-                    # New instruction
-                    reduced_instructions.append(
-                        {"half_period": half_period, "reps": reps}
+                if instruction != "WAIT":
+                    continue
+                # If we're using the internal wait monitor, set the timeout
+                if self.use_wait_monitor:
+                    # Get the wait timeout value
+                    wait_timeout = compiler.wait_table[
+                        wait_table[current_wait_index]
+                    ][1]
+                    current_wait_index += 1
+                    # The following half_period and reps indicates a wait instruction
+                    wait_half_periods.append(
+                        [round(wait_timeout / (self.clock_resolution / 2))]
                     )
+                # Else, set an indefinite wait and wait for a trigger from something else.
+                else:
+                    # Two waits in a row are an indefinite wait
+                    wait_half_periods.append([2 ** 32 - 1, 2 ** 32 - 1])
+
+            # Compress clock instructions with the same half_period
+            half_periods, reps = _compress_instructions(
+                pseudoclock.clock, self.clock_resolution, wait_half_periods
+            )
+            num_instructions = len(half_periods)
 
             # Only add this if there is room in the instruction table. The PrawnBlaster
             # firmware has extre room at the end for an instruction that is always 0
             # and cannot be set over serial!
-            if len(reduced_instructions) != self.max_instructions:
+            if num_instructions != self.max_instructions:
                 # The following half_period and reps indicates a stop instruction:
-                reduced_instructions.append({"half_period": 0, "reps": 0})
+                num_instructions += 1
 
             # Check we have not exceeded the maximum number of supported instructions
             # for this number of speudoclocks
-            if len(reduced_instructions) > self.max_instructions:
+            if num_instructions > self.max_instructions:
                 raise LabscriptError(
-                    f"{self.description} {self.name}.clocklines[{i}] has too many instructions. It has {len(reduced_instructions)} and can only support {self.max_instructions}"
+                    f"{self.description} {self.name}.clocklines[{i}] has too many instructions. It has {num_instructions} and can only support {self.max_instructions}"
                 )
 
             # Store these instructions to the h5 file:
             dtypes = [("half_period", int), ("reps", int)]
-            pulse_program = np.zeros(len(reduced_instructions), dtype=dtypes)
-            for j, instruction in enumerate(reduced_instructions):
-                pulse_program[j]["half_period"] = instruction["half_period"]
-                pulse_program[j]["reps"] = instruction["reps"]
+            pulse_program = np.zeros(num_instructions, dtype=dtypes)
+            pulse_program["half_period"][: len(half_periods)] = half_periods
+            pulse_program["reps"][: len(reps)] = reps
             group.create_dataset(
                 f"PULSE_PROGRAM_{i}", compression=config.compression, data=pulse_program
             )
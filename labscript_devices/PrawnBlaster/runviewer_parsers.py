@@ -16,10 +16,16 @@ import h5py
 import numpy as np
 
 import labscript_utils.properties as properties
+from labscript_devices.pseudoclock_traces import (
+    expand_pulse_program,
+    get_clock_ticks,
+    make_envelope,
+)
 
 
 class PrawnBlasterParser(object):
     """Runviewer parser for the PrawnBlaster Pseudoclocks."""
+
     def __init__(self, path, device):
         """
         Args:
@@ -44,14 +50,7 @@ class PrawnBlasterParser(object):
         """
 
         if clock is not None:
-            times, clock_value = clock[0], clock[1]
-            clock_indices = np.where((clock_value[1:] - clock_value[:-1]) == 1)[0] + 1
-            # If initial clock value is 1, then this counts as a rising edge
-            # (clock should be 0 before experiment) but this is not picked up
-            # by the above code. So we insert it!
-            if clock_value[0] == 1:
-                clock_indices = np.insert(clock_indices, 0, 0)
-            clock_ticks = times[clock_indices]
+            clock_ticks = get_clock_ticks(clock)
 
         # get the pulse program
         pulse_programs = []
@@ -63,6 +62,11 @@ class PrawnBlasterParser(object):
             self.clock_resolution = device_props["clock_resolution"]
             self.trigger_delay = device_props["trigger_delay"]
             self.wait_delay = device_props["wait_delay"]
+            # If not None, clocklines with more ticks than this are displayed as a
+            # decimated envelope. The full clock is still passed to child devices:
+            self.envelope_threshold = conn_props.get(
+                "runviewer_envelope_threshold", None
+            )
 
             # Extract the pulse programs
             num_pseudoclocks = conn_props["num_pseudoclocks"]
@@ -84,44 +88,63 @@ class PrawnBlasterParser(object):
             index = int(connection_parts[1])
             pulse_program = pulse_programs[index]
 
-            time = []
-            states = []
-            trigger_index = 0
-            t = 0 if clock is None else clock_ticks[trigger_index] + self.trigger_delay
-            trigger_index += 1
-
-            clock_factor = self.clock_resolution / 2.0
-
-            last_instruction_was_wait = False
-            for row in pulse_program:
-                if row["reps"] == 0 and not last_instruction_was_wait:  # WAIT
-                    last_instruction_was_wait = True
-                    if clock is not None:
-                        t = clock_ticks[trigger_index] + self.trigger_delay
-                        trigger_index += 1
-                    else:
-                        t += self.wait_delay
-                elif last_instruction_was_wait:
-                    # two waits in a row means an indefinite wait, so we just skip this
-                    # instruction.
-                    last_instruction_was_wait = False
-                    continue
-                else:
-                    last_instruction_was_wait = False
-                    for i in range(row["reps"]):
-                        for j in range(1, -1, -1):
-                            time.append(t)
-                            states.append(j)
-                            t += row["half_period"] * clock_factor
-
-            pseudoclock_clock = (np.array(time), np.array(states))
+            trigger_times = None
+            if clock is not None:
+                trigger_times = clock_ticks + self.trigger_delay
+            pseudoclock_clock, segment_starts = self._expand_pulse_program(
+                pulse_program, trigger_times
+            )
+            display_clock = pseudoclock_clock
+            if self.envelope_threshold is not None:
+                display_clock = make_envelope(
+                    pseudoclock_clock, segment_starts, self.envelope_threshold
+                )
 
             for clock_line_name, clock_line in pseudoclock.child_list.items():
                 # Ignore the dummy internal wait monitor clockline
                 if clock_line.parent_port.startswith("GPIO"):
                     clocklines_and_triggers[clock_line_name] = pseudoclock_clock
                     add_trace(
-                        clock_line_name, pseudoclock_clock, self.name, clock_line.parent_port
+                        clock_line_name, display_clock, self.name, clock_line.parent_port
                     )
 
         return clocklines_and_triggers
+
+    def _expand_pulse_program(self, pulse_program, trigger_times=None):
+        """Expands a pulse program into the times and states of every clock edge.
+
+        Args:
+            pulse_program (numpy.ndarray): Structured array of instructions with
+                `half_period` and `reps` fields.
+            trigger_times (numpy.ndarray, optional): Times at which the
+                PrawnBlaster is triggered to start, and to resume after each wait,
+                if not the primary pseudoclock.
+
+        Returns:
+            tuple: The clock trace as a tuple of arrays of times and states, and an
+            array of the index of the first tick of each segment of the program
+            between waits.
+        """
+        # The program ends at the first stop instruction, if any:
+        stop = (pulse_program["half_period"] == 0) & (pulse_program["reps"] == 0)
+        if stop.any():
+            pulse_program = pulse_program[: np.argmax(stop)]
+        half_periods = pulse_program["half_period"]
+        reps = pulse_program["reps"]
+
+        # Instructions with zero reps are waits, except that two in a row are a
+        # single indefinite wait:
+        waits = []
+        for j in np.flatnonzero(reps == 0):
+            if waits and waits[-1] == j - 1:
+                continue
+            waits.append(j)
+
+        # Each rep is a rising edge then a falling edge, each lasting one half-period:
+        steps = half_periods * (self.clock_resolution / 2.0)
+        start_time, resume_times = 0, None
+        if trigger_times is not None:
+            start_time, resume_times = trigger_times[0], trigger_times[1:]
+        return expand_pulse_program(
+            steps, steps, reps, waits, start_time, resume_times, self.wait_delay
+        )
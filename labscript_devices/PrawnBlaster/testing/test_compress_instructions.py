@@ -0,0 +1,99 @@
+#####################################################################
+#                                                                   #
+# /labscript_devices/PrawnBlaster/testing/test_compress_instructions.py
+#                                                                   #
+# This file is part of labscript_devices, in the labscript suite    #
+# (see http://labscriptsuite.org), and is licensed under the        #
+# Simplified BSD License. See the license.txt file in the root of   #
+# the project for the full license.                                 #
+#                                                                   #
+#####################################################################
+"""Property test of the array-based compression of PrawnBlaster instructions in
+_compress_instructions() against the previous loop-based implementation of
+PrawnBlaster.generate_code(), over randomly generated clocks."""
+import numpy as np
+import pytest
+
+from labscript_devices.PrawnBlaster.labscript_devices import _compress_instructions
+
+CLOCK_RESOLUTION = 10e-9
+MAX_REPS = 2 ** 32 - 1
+
+
+def compress_instructions_reference(clock, clock_resolution, wait_half_periods):
+    """The loop previously in PrawnBlaster.generate_code(), with each wait converted
+    to the given instructions"""
+    current_wait_index = 0
+    reduced_instructions = []
+    for instruction in clock:
+        if instruction == "WAIT":
+            for half_period in wait_half_periods[current_wait_index]:
+                reduced_instructions.append({"half_period": half_period, "reps": 0})
+            current_wait_index += 1
+            continue
+
+        # Normal instruction
+        reps = instruction["reps"]
+        # half_period is in quantised units:
+        half_period = int(round(instruction["step"] / clock_resolution))
+        if (
+            # If there is a previous instruction
+            reduced_instructions
+            # And it's not a wait
+            and reduced_instructions[-1]["reps"] != 0
+            # And the half_periods match
+            and reduced_instructions[-1]["half_period"] == half_period
+            # And the sum of the previous reps and current reps won't push it over the limit
+            and (reduced_instructions[-1]["reps"] + reps) < MAX_REPS
+        ):
+            # Combine instructions!
+            reduced_instructions[-1]["reps"] += reps
+        else:
+            # New instruction
+            reduced_instructions.append({"half_period": half_period, "reps": reps})
+
+    half_periods = [instruction["half_period"] for instruction in reduced_instructions]
+    reps = [instruction["reps"] for instruction in reduced_instructions]
+    return half_periods, reps
+
+
+def random_clock(rng, num_instructions, num_waits, large_reps):
+    """A random clock with few distinct half-periods, so that many consecutive
+    instructions can be combined"""
+    clock = []
+    for _ in range(num_instructions):
+        step = rng.choice([5, 6, 100, 2 ** 20]) * CLOCK_RESOLUTION * 2
+        if large_reps:
+            reps = int(rng.choice([1, 2 ** 31, MAX_REPS - 1, MAX_REPS]))
+        else:
+            reps = int(rng.integers(1, 1000))
+        clock.append({"start": 0, "reps": reps, "step": step, "enabled_clocks": []})
+    for _ in range(num_waits):
+        clock.insert(rng.integers(0, len(clock) + 1), "WAIT")
+    return clock
+
+
+@pytest.mark.parametrize("seed", range(200))
+@pytest.mark.parametrize("indefinite_waits", [False, True])
+def test_compress_instructions(seed, indefinite_waits):
+    rng = np.random.default_rng(seed)
+    clock = random_clock(
+        rng,
+        num_instructions=int(rng.integers(0, 500)),
+        num_waits=int(rng.integers(0, 5)),
+        large_reps=bool(seed % 2),
+    )
+    num_waits = clock.count("WAIT")
+    if indefinite_waits:
+        wait_half_periods = [[MAX_REPS, MAX_REPS]] * num_waits
+    else:
+        wait_half_periods = [[int(rng.integers(1, MAX_REPS))] for _ in range(num_waits)]
+
+    half_periods, reps = _compress_instructions(
+        clock, CLOCK_RESOLUTION, wait_half_periods
+    )
+    expected_half_periods, expected_reps = compress_instructions_reference(
+        clock, CLOCK_RESOLUTION, wait_half_periods
+    )
+    assert list(half_periods) == expected_half_periods
+    assert list(reps) == expected_reps
@@ -13,6 +13,11 @@ import time
 from labscript_utils.ls_zprocess import Context
 from labscript_utils.shared_drive import path_to_local
 from labscript_utils.properties import set_attributes
+from labscript_devices.frame_compression import (
+    get_compression_kwargs,
+    create_frames_dataset,
+    write_frames,
+)
 
 # Don't import nv yet so as not to throw an error, allow worker to run as a dummy
 # device, or for subclasses to import this module to inherit classes without requiring
@@ -218,19 +223,30 @@ class PrincetonInstrumentsCameraWorker(Worker):
             for image, exposure in zip(self.images, self.exposures):
                 images[(exposure['name'], exposure['frametype'])].append(image)
 
-            # Save images to the HDF5 file:
+            # Save images to the HDF5 file, compressing them all in parallel:
+            frames = []
             for (name, frametype), imagelist in images.items():
-                data = imagelist[0] if len(imagelist) == 1 else np.array(imagelist)
+                if not imagelist:
+                    continue
                 print(f"Saving frame(s) {name}/{frametype}.")
                 group = image_group.require_group(name)
-                dset = group.create_dataset(
-                    frametype, data=data, dtype='uint16', compression='gzip'
+                dset = create_frames_dataset(
+                    group,
+                    frametype,
+                    imagelist[0].shape,
+                    count=len(imagelist) if len(imagelist) > 1 else None,
+                    compression_kwargs=get_compression_kwargs('gzip'),
                 )
                 # Specify this dataset should be viewed as an image
-                dset.attrs['CLASS'] = np.string_('IMAGE')
-                dset.attrs['IMAGE_VERSION'] = np.string_('1.2')
-                dset.attrs['IMAGE_SUBCLASS'] = np.string_('IMAGE_GRAYSCALE')
+                dset.attrs['CLASS'] = np.bytes_('IMAGE')
+                dset.attrs['IMAGE_VERSION'] = np.bytes_('1.2')
+                dset.attrs['IMAGE_SUBCLASS'] = np.bytes_('IMAGE_GRAYSCALE')
                 dset.attrs['IMAGE_WHITE_IS_ZERO'] = np.uint8(0)
+                if len(imagelist) == 1:
+                    frames.append((dset, imagelist[0], None))
+                else:
+                    frames.extend((dset, image, i) for i, image in enumerate(imagelist))
+            write_frames(frames)
 
         # If the images are all the same shape, send them to the GUI for display:
         try:
@@ -60,46 +60,23 @@ class PulseBlasterDDS(DDSQuantity):
         self.phase_reset.go_low(t)
 
 
-profiles = {}
-def profile(funct):
-    func = funct.__name__
-    if func not in profiles:
-        profiles[func] = {'total_time':0, 'min':None, 'max':0, 'num_calls':0, 'average_time_per_call':0}
-    
-    def new_func(*args,**kwargs):
-        start_time = time.time()
-        ret = funct(*args,**kwargs)
-        runtime = time.time()-start_time
-        profiles[func]['total_time'] += runtime
-        profiles[func]['num_calls'] += 1
-        profiles[func]['min'] = profiles[func]['min'] if profiles[func]['min'] is not None and profiles[func]['min'] < runtime else runtime
-        profiles[func]['max'] = profiles[func]['max'] if profiles[func]['max'] > runtime else runtime
-        profiles[func]['average_time_per_call'] = profiles[func]['total_time']/profiles[func]['num_calls']
-        
-        return ret
-    # return new_func
-    return funct
-    
-def start_profile(name):
-    if name not in profiles:
-        profiles[name] = {'total_time':0, 'min':None, 'max':0, 'num_calls':0, 'average_time_per_call':0}
-        
-    if 'start_time' in profiles[name]:
-        raise Exception('You cannot call start_profile for %s without first calling stop_profile'%name)
-        
-    profiles[name]['start_time'] = time.time()
-    
-def stop_profile(name):
-    if name not in profiles or 'start_time' not in profiles[name]:
-        raise Exception('You must first call start_profile for %s before calling stop_profile')
-        
-    runtime = time.time()-profiles[name]['start_time']
-    del profiles[name]['start_time']
-    profiles[name]['total_time'] += runtime
-    profiles[name]['num_calls'] += 1
-    profiles[name]['min'] = profiles[name]['min'] if profiles[name]['min'] is not None and profiles[name]['min'] < runtime else runtime
-    profiles[name]['max'] = profiles[name]['max'] if profiles[name]['max'] > runtime else runtime
-    profiles[name]['average_time_per_call'] = profiles[name]['total_time']/profiles[name]['num_calls']
+# The columns of the pulse program generated by PulseBlaster.convert_to_pb_inst().
+# These are wide enough for any number of flags. The columns written to the shot file,
+# and their types, are given by the pb_dtype attribute of each class:
+pb_inst_dtype = [('freq0', np.int64), ('phase0', np.int64), ('amp0', np.int64),
+                 ('dds_en0', np.int64), ('phase_reset0', np.int64),
+                 ('freq1', np.int64), ('phase1', np.int64), ('amp1', np.int64),
+                 ('dds_en1', np.int64), ('phase_reset1', np.int64),
+                 ('flags', np.uint64), ('inst', np.int64),
+                 ('inst_data', np.int64), ('length', np.float64)]
+
+def lookup_registers(registers, values):
+    """Returns the register number of each of the given values, from a dict of
+    value: register number pairs"""
+    keys = np.array(list(registers.keys()))
+    regs = np.array(list(registers.values()))
+    order = np.argsort(keys)
+    return regs[order][np.searchsorted(keys[order], values)]
 
 
 class PulseBlaster(PseudoclockDevice):
@@ -112,6 +89,13 @@ class PulseBlaster(PseudoclockDevice):
                        'LONG_DELAY': 7,
                        'WAIT':       8}
                        
+    pb_dtype = [('freq0', np.int32), ('phase0', np.int32), ('amp0', np.int32), 
+                ('dds_en0', np.int32), ('phase_reset0', np.int32),
+                ('freq1', np.int32), ('phase1', np.int32), ('amp1', np.int32),
+                ('dds_en1', np.int32), ('phase_reset1', np.int32),
+                ('flags', np.int32), ('inst', np.int32),
+                ('inst_data', np.int32), ('length', np.float64)]
+
     description = 'PB-DDSII-300'
     clock_limit = 8.3e6 # Slight underestimate I think.
     clock_resolution = 26.6666666666666666e-9
@@ -390,169 +374,150 @@ class PulseBlaster(PseudoclockDevice):
             
         return freqdicts, ampdicts, phasedicts
         
+    def get_flag_words(self, dig_outputs, indices):
+        """Returns the flag word, with the flag of each digital output set to its
+        value, at each of the given indices into the outputs' raw_output"""
+        flag_words = np.zeros(len(indices), dtype=np.uint64)
+        for output in dig_outputs:
+            flag_index = np.uint64(self.get_flag_number(output.connection))
+            flag_words |= output.raw_output[indices].astype(np.uint64) << flag_index
+        return flag_words
+
     def convert_to_pb_inst(self, dig_outputs, dds_outputs, freqs, amps, phases):
-        pb_inst = []
-        
-        # index to keep track of where in output.raw_output the
-        # pulseblaster flags are coming from
-        # starts at -1 because the internal flag should always tick on the first instruction and be 
-        # incremented (to 0) before it is used to index any arrays
-        i = -1 
-        # index to record what line number of the pulseblaster hardware
-        # instructions we're up to:
-        j = 0
-        # We've delegated the initial two instructions off to BLACS, which
-        # can ensure continuity with the state of the front panel. Thus
-        # these two instructions don't actually do anything:
-        flags = [0]*self.n_flags
-        freqregs = [0]*2
-        ampregs = [0]*2
-        phaseregs = [0]*2
-        dds_enables = [0]*2
-        phase_resets = [0]*2
-        
-        pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets': phase_resets,
-                        'flags': ''.join([str(flag) for flag in flags]), 'instruction': 'STOP',
-                        'data': 0, 'delay': 10.0/self.clock_limit*1e9})
-        pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets': phase_resets,
-                        'flags': ''.join([str(flag) for flag in flags]), 'instruction': 'STOP',
-                        'data': 0, 'delay': 10.0/self.clock_limit*1e9})    
-        j += 2
-        
-        flagstring = '0'*self.n_flags # So that this variable is still defined if the for loop has no iterations
-        for k, instruction in enumerate(self.pseudoclock.clock):
+        clock = self.pseudoclock.clock
+        n = len(clock)
+
+        # Gather the clock instructions into arrays. clock_masks has the bits set of
+        # the clock flags ticking during each instruction:
+        is_wait = np.zeros(n, dtype=bool)
+        ticks_internal = np.zeros(n, dtype=bool)
+        reps = np.zeros(n, dtype=np.int64)
+        steps = np.zeros(n, dtype=np.float64)
+        clock_masks = [0]*n
+        flag_masks = {}
+        for k, instruction in enumerate(clock):
             if instruction == 'WAIT':
-                # This is a wait instruction. Repeat the last instruction but with a 100ns delay and a WAIT op code:
-                wait_instruction = pb_inst[-1].copy()
-                wait_instruction['delay'] = 100
-                wait_instruction['instruction'] = 'WAIT'
-                wait_instruction['data'] = 0
-                pb_inst.append(wait_instruction)
-                j += 1
+                is_wait[k] = True
                 continue
-                
-            flags = [0]*self.n_flags
-            # The registers below are ones, not zeros, so that we don't
-            # use the BLACS-inserted initial instructions. Instead
-            # unused DDSs have a 'zero' in register one for freq, amp
-            # and phase.
-            freqregs = [1]*2
-            ampregs = [1]*2
-            phaseregs = [1]*2
-            dds_enables = [0]*2
-            phase_resets = [0]*2
-            
-            # This flag indicates whether we need a full clock tick, or are just updating an internal output
-            only_internal = True
-            # find out which clock flags are ticking during this instruction
+            reps[k] = instruction['reps']
+            steps[k] = instruction['step']
             for clock_line in instruction['enabled_clocks']:
-                if clock_line == self._direct_output_clock_line: 
-                    # advance i (the index keeping track of internal clockline output)
-                    i += 1
-                else:
-                    flag_index = int(clock_line.connection.split()[1])
-                    flags[flag_index] = 1
-                    # We are not just using the internal clock line
-                    only_internal = False
-            
-            for output in dig_outputs:
-                flagindex = int(output.connection.split()[1])
-                flags[flagindex] = int(output.raw_output[i])
-            for output in dds_outputs:
-                ddsnumber = int(output.connection.split()[1])
-                freqregs[ddsnumber] = freqs[ddsnumber][output.frequency.raw_output[i]]
-                ampregs[ddsnumber] = amps[ddsnumber][output.amplitude.raw_output[i]]
-                phaseregs[ddsnumber] = phases[ddsnumber][output.phase.raw_output[i]]
-                dds_enables[ddsnumber] = output.gate.raw_output[i]
-                if isinstance(output, PulseBlasterDDS):
-                    phase_resets[ddsnumber] = output.phase_reset.raw_output[i]
-                
-            flagstring = ''.join([str(flag) for flag in flags])
-            
-            if instruction['reps'] > 1048576:
-                raise LabscriptError('Pulseblaster cannot support more than 1048576 loop iterations. ' +
-                                      str(instruction['reps']) +' were requested at t = ' + str(instruction['start']) + '. '+
-                                     'This can be fixed easily enough by using nested loops. If it is needed, ' +
-                                     'please file a feature request at' +
-                                     'http://redmine.physics.monash.edu.au/projects/labscript.')
-                
-            if not only_internal:
-                if self.pulse_width == 'symmetric':
-                    high_time = instruction['step']/2
+                if clock_line == self._direct_output_clock_line:
+                    ticks_internal[k] = True
                 else:
-                    high_time = self.pulse_width
-                # High time cannot be longer than self.long_delay (~57 seconds for a
-                # 75MHz core clock freq). If it is, clip it to self.long_delay. In this
-                # case we are not honouring the requested symmetric or fixed pulse
-                # width. To do so would be possible, but would consume more pulseblaster
-                # instructions, so we err on the side of fewer instructions:
-                high_time = min(high_time, self.long_delay)
-
-                # Low time is whatever is left:
-                low_time = instruction['step'] - high_time
-
-                # Do we need to insert a LONG_DELAY instruction to create a delay this
-                # long?
-                n_long_delays, remaining_low_time =  divmod(low_time, self.long_delay)
-
-                # If the remainder is too short to be output, add self.long_delay to it.
-                # self.long_delay was constructed such that adding self.min_delay to it
-                # is still not too long for a single instruction:
-                if n_long_delays and remaining_low_time < self.min_delay:
-                    n_long_delays -= 1
-                    remaining_low_time += self.long_delay
-
-                # The start loop instruction, Clock edges are high:
-                pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets':phase_resets,
-                                'flags': flagstring, 'instruction': 'LOOP',
-                                'data': instruction['reps'], 'delay': high_time*1e9})
-                
-                for clock_line in instruction['enabled_clocks']:
-                    if clock_line != self._direct_output_clock_line:
-                        flag_index = int(clock_line.connection.split()[1])
-                        flags[flag_index] = 0
-                        
-                flagstring = ''.join([str(flag) for flag in flags])
-            
-                # The long delay instruction, if any. Clock edges are low: 
-                if n_long_delays:
-                    pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets':phase_resets,
-                                'flags': flagstring, 'instruction': 'LONG_DELAY',
-                                'data': int(n_long_delays), 'delay': self.long_delay*1e9})
-                                
-                # Remaining low time. Clock edges are low:
-                pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets':phase_resets,
-                                'flags': flagstring, 'instruction': 'END_LOOP',
-                                'data': j, 'delay': remaining_low_time*1e9})
-                                
-                # Two instructions were used in the case of there being no LONG_DELAY, 
-                # otherwise three. This increment is done here so that the j referred
-                # to in the previous line still refers to the LOOP instruction.
-                j += 3 if n_long_delays else 2
-            else:
-                # We only need to update a direct output, so no need to tick the clocks.
-
-                # Do we need to insert a LONG_DELAY instruction to create a delay this
-                # long?
-                n_long_delays, remaining_delay =  divmod(instruction['step'], self.long_delay)
-                # If the remainder is too short to be output, add self.long_delay to it.
-                # self.long_delay was constructed such that adding self.min_delay to it
-                # is still not too long for a single instruction:
-                if n_long_delays and remaining_delay < self.min_delay:
-                    n_long_delays -= 1
-                    remaining_delay += self.long_delay
-                
-                if n_long_delays:
-                    pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets':phase_resets,
-                                'flags': flagstring, 'instruction': 'LONG_DELAY',
-                                'data': int(n_long_delays), 'delay': self.long_delay*1e9})
-
-                pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets':phase_resets,
-                                'flags': flagstring, 'instruction': 'CONTINUE',
-                                'data': 0, 'delay': remaining_delay*1e9})
-                
-                j += 2 if n_long_delays else 1
-                
+                    if clock_line not in flag_masks:
+                        flag_masks[clock_line] = 1 << self.get_flag_number(clock_line.connection)
+                    clock_masks[k] |= flag_masks[clock_line]
+        clock_masks = np.array(clock_masks, dtype=np.uint64)
+
+        too_many_reps = np.flatnonzero(reps > 1048576)
+        if len(too_many_reps):
+            instruction = clock[too_many_reps[0]]
+            raise LabscriptError('Pulseblaster cannot support more than 1048576 loop iterations. ' +
+                                  str(instruction['reps']) +' were requested at t = ' + str(instruction['start']) + '. '+
+                                 'This can be fixed easily enough by using nested loops. If it is needed, ' +
+                                 'please file a feature request at' +
+                                 'http://redmine.physics.monash.edu.au/projects/labscript.')
+
+        # The state of the outputs during each instruction. Index zero is the state
+        # of the initial two instructions, which we've delegated off to BLACS, which
+        # can ensure continuity with the state of the front panel. Thus these two
+        # instructions don't actually do anything. The registers of the other
+        # instructions are ones, not zeros, so that we don't use the BLACS-inserted
+        # initial instructions. Instead unused DDSs have a 'zero' in register one for
+        # freq, amp and phase.
+        state = np.zeros(n + 1, dtype=pb_inst_dtype)
+        for name in ['freq0', 'amp0', 'phase0', 'freq1', 'amp1', 'phase1']:
+            state[name][1:] = 1
+
+        # Index into output.raw_output of each instruction. The internal clock line
+        # should always tick on the first instruction:
+        i = np.cumsum(ticks_internal) - 1
+        state['flags'][1:] = self.get_flag_words(dig_outputs, i)
+        for output in dds_outputs:
+            ddsnumber = int(output.connection.split()[1])
+            state['freq%d' % ddsnumber][1:] = lookup_registers(freqs[ddsnumber], output.frequency.raw_output[i])
+            state['amp%d' % ddsnumber][1:] = lookup_registers(amps[ddsnumber], output.amplitude.raw_output[i])
+            state['phase%d' % ddsnumber][1:] = lookup_registers(phases[ddsnumber], output.phase.raw_output[i])
+            state['dds_en%d' % ddsnumber][1:] = output.gate.raw_output[i]
+            if isinstance(output, PulseBlasterDDS):
+                state['phase_reset%d' % ddsnumber][1:] = output.phase_reset.raw_output[i]
+
+        # A wait instruction repeats the state of the last instruction before it:
+        state_index = np.maximum.accumulate(np.where(is_wait, 0, np.arange(1, n + 1)))
+        state = state[np.append(0, state_index)]
+
+        # Instructions ticking clock flags other than the internal one are a LOOP and
+        # an END_LOOP instruction, with the clock edges high then low. Those only
+        # updating a direct output are a CONTINUE instruction:
+        clocked = ~is_wait & (clock_masks != 0)
+        only_internal = ~is_wait & (clock_masks == 0)
+        if self.pulse_width == 'symmetric':
+            high_time = steps/2
+        else:
+            high_time = np.full(n, self.pulse_width, dtype=np.float64)
+        # High time cannot be longer than self.long_delay (~57 seconds for a
+        # 75MHz core clock freq). If it is, clip it to self.long_delay. In this
+        # case we are not honouring the requested symmetric or fixed pulse
+        # width. To do so would be possible, but would consume more pulseblaster
+        # instructions, so we err on the side of fewer instructions:
+        high_time = np.minimum(high_time, self.long_delay)
+        # Low time is whatever is left:
+        low_time = steps - high_time
+
+        # Do we need to insert a LONG_DELAY instruction to create a delay this long?
+        n_long_delays, remaining_delay = np.divmod(np.where(clocked, low_time, steps), self.long_delay)
+        # If the remainder is too short to be output, add self.long_delay to it.
+        # self.long_delay was constructed such that adding self.min_delay to it
+        # is still not too long for a single instruction:
+        too_short = (n_long_delays != 0) & (remaining_delay < self.min_delay)
+        n_long_delays[too_short] -= 1
+        remaining_delay[too_short] += self.long_delay
+        has_long_delay = ~is_wait & (n_long_delays != 0)
+
+        # Index of the first pulseblaster instruction of each clock instruction:
+        n_inst = np.where(is_wait, 1, np.where(clocked, 2, 1) + has_long_delay)
+        j = 2 + np.cumsum(n_inst) - n_inst
+        num_pb_inst = 2 + n_inst.sum() + 1
+
+        pb_inst = np.zeros(num_pb_inst, dtype=pb_inst_dtype)
+        pb_inst[2:-1] = np.repeat(state[1:], n_inst)
+        pb_inst[-1] = state[-1]
+
+        # The start loop instruction, Clock edges are high:
+        loop = j[clocked]
+        pb_inst['flags'][loop] |= clock_masks[clocked]
+        pb_inst['inst'][loop] = self.pb_instructions['LOOP']
+        pb_inst['inst_data'][loop] = reps[clocked]
+        pb_inst['length'][loop] = high_time[clocked]*1e9
+
+        # The long delay instruction, if any. Clock edges are low:
+        long_delay = j[has_long_delay] + clocked[has_long_delay]
+        pb_inst['inst'][long_delay] = self.pb_instructions['LONG_DELAY']
+        pb_inst['inst_data'][long_delay] = n_long_delays[has_long_delay]
+        pb_inst['length'][long_delay] = self.long_delay*1e9
+
+        # Remaining low time. Clock edges are low. END_LOOP refers back to the LOOP
+        # instruction:
+        end_loop = j[clocked] + 1 + has_long_delay[clocked]
+        pb_inst['inst'][end_loop] = self.pb_instructions['END_LOOP']
+        pb_inst['inst_data'][end_loop] = j[clocked]
+        pb_inst['length'][end_loop] = remaining_delay[clocked]*1e9
+
+        # Or, if we only need to update a direct output, no need to tick the clocks:
+        cont = j[only_internal] + has_long_delay[only_internal]
+        pb_inst['inst'][cont] = self.pb_instructions['CONTINUE']
+        pb_inst['length'][cont] = remaining_delay[only_internal]*1e9
+
+        # A wait instruction repeats the last instruction but with a 100ns delay and a
+        # WAIT op code:
+        wait = j[is_wait]
+        pb_inst['inst'][wait] = self.pb_instructions['WAIT']
+        pb_inst['length'][wait] = 100
+
+        # The initial two dummy instructions:
+        pb_inst['inst'][:2] = self.pb_instructions['STOP']
+        pb_inst['length'][:2] = 10.0/self.clock_limit*1e9
 
         if self.programming_scheme == 'pb_start/BRANCH':
             # This is how we stop the pulse program. We branch from the last
@@ -560,9 +525,7 @@ class PulseBlaster(PseudoclockDevice):
             # the same values and a WAIT instruction. The PulseBlaster then
             # waits on instuction zero, which is a state ready for either
             # further static updates or buffered mode.
-            pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets':phase_resets,
-                            'flags': flagstring, 'instruction': 'BRANCH',
-                            'data': 0, 'delay': 10.0/self.clock_limit*1e9})
+            pb_inst['inst'][-1] = self.pb_instructions['BRANCH']
         elif self.programming_scheme == 'pb_stop_programming/STOP':
             # An ordinary stop instruction. This has the downside that the PulseBlaster might
             # (on some models) reset its output to zero momentarily until BLACS calls program_manual, which
@@ -570,11 +533,10 @@ class PulseBlaster(PseudoclockDevice):
             # repeated triggers coming to it, such as a 50Hz/60Hz line trigger. We can't have it sit
             # on a WAIT instruction as above, or it will trigger and run repeatedly when that's not what
             # we wanted.
-            pb_inst.append({'freqs': freqregs, 'amps': ampregs, 'phases': phaseregs, 'enables':dds_enables, 'phase_resets':phase_resets,
-                            'flags': flagstring, 'instruction': 'STOP',
-                            'data': 0, 'delay': 10.0/self.clock_limit*1e9})
+            pb_inst['inst'][-1] = self.pb_instructions['STOP']
         else:
             raise AssertionError('Invalid programming scheme %s'%str(self.programming_scheme))
+        pb_inst['length'][-1] = 10.0/self.clock_limit*1e9
             
         if len(pb_inst) > self.max_instructions:
             raise LabscriptError("The Pulseblaster memory cannot store more than {:d} instuctions, but the PulseProgram contains {:d} instructions.".format(self.max_instructions, len(pb_inst))) 
@@ -583,31 +545,9 @@ class PulseBlaster(PseudoclockDevice):
         
     def write_pb_inst_to_h5(self, pb_inst, hdf5_file):
         # OK now we squeeze the instructions into a numpy array ready for writing to hdf5:
-        pb_dtype = [('freq0', np.int32), ('phase0', np.int32), ('amp0', np.int32), 
-                    ('dds_en0', np.int32), ('phase_reset0', np.int32),
-                    ('freq1', np.int32), ('phase1', np.int32), ('amp1', np.int32),
-                    ('dds_en1', np.int32), ('phase_reset1', np.int32),
-                    ('flags', np.int32), ('inst', np.int32),
-                    ('inst_data', np.int32), ('length', np.float64)]
-        pb_inst_table = np.empty(len(pb_inst),dtype = pb_dtype)
-        for i,inst in enumerate(pb_inst):
-            flagint = int(inst['flags'][::-1],2)
-            instructionint = self.pb_instructions[inst['instruction']]
-            dataint = inst['data']
-            delaydouble = inst['delay']
-            freq0 = inst['freqs'][0]
-            freq1 = inst['freqs'][1]
-            phase0 = inst['phases'][0]
-            phase1 = inst['phases'][1]
-            amp0 = inst['amps'][0]
-            amp1 = inst['amps'][1]
-            en0 = inst['enables'][0]
-            en1 = inst['enables'][1]
-            phase_reset0 = inst['phase_resets'][0]
-            phase_reset1 = inst['phase_resets'][1]
-            
-            pb_inst_table[i] = (freq0,phase0,amp0,en0,phase_reset0,freq1,phase1,amp1,en1,phase_reset1, flagint, 
-                                instructionint, dataint, delaydouble)     
+        pb_inst_table = np.empty(len(pb_inst), dtype=self.pb_dtype)
+        for name in pb_inst_table.dtype.names:
+            pb_inst_table[name] = pb_inst[name]
                                 
         # Okay now write it to the file: 
         group = hdf5_file['/devices/'+self.name]  
@@ -1150,133 +1090,99 @@ class PulseblasterWorker(Worker):
 class PulseBlasterParser(object):
     num_dds = 2
     num_flags = 12
-    
+
+    # Optional callable, called as timing_hook(name, duration) with the time in
+    # seconds spent in each stage of get_traces(), for profiling:
+    timing_hook = None
+
     def __init__(self, path, device):
         self.path = path
         self.name = device.name
         self.device = device
-        
-        # We create a lookup table for strings to be used later as dictionary keys.
-        # This saves having to evaluate '%d'%i many many times, and makes the _add_pulse_program_row_to_traces method
-        # significantly more efficient
-        self.dds_strings = {}
-        for i in range(self.num_dds):
-            self.dds_strings[i] = {}
-            self.dds_strings[i]['ddsfreq'] = 'dds %d_freq'%i
-            self.dds_strings[i]['ddsamp'] = 'dds %d_amp'%i
-            self.dds_strings[i]['ddsphase'] = 'dds %d_phase'%i
-            self.dds_strings[i]['freq'] = 'freq%d'%i
-            self.dds_strings[i]['amp'] = 'amp%d'%i
-            self.dds_strings[i]['phase'] = 'phase%d'%i
-            self.dds_strings[i]['dds_en'] = 'dds_en%d'%i
-            
-        self.flag_strings = {}
-        self.flag_powers = {}
-        
-        for i in range(self.num_flags):
-            self.flag_strings[i] = 'flag %d'%i
-            self.flag_powers[i] = 2**i
-        
-            
-        
+
+    def _report_timing(self, name, start_time):
+        if self.timing_hook is not None:
+            self.timing_hook(name, time.perf_counter() - start_time)
+        return time.perf_counter()
+
+    def get_execution_order(self, pulse_program):
+        """Returns the indices of the rows of the pulse program in the order they are
+        executed, with each loop body repeated its number of times. The first two
+        rows, which are dummy instructions for BLACS, are not included."""
+        inst = pulse_program['inst'][2:]
+        loop_starts = np.flatnonzero((inst == 2) & (pulse_program['inst_data'][2:] > 0))
+        end_loops = np.flatnonzero(inst == 3)
+        loop_stops = end_loops[np.searchsorted(end_loops, loop_starts)] + 1
+        loop_reps = pulse_program['inst_data'][2:][loop_starts].astype(np.int64)
+
+        # Every row not inside a loop body is a block of its own, executed once. A LOOP
+        # with no repetitions is skipped, and the rows following it executed as usual:
+        depth = np.zeros(len(inst) + 1, dtype=np.int64)
+        np.add.at(depth, loop_starts, 1)
+        np.add.at(depth, loop_stops, -1)
+        single_rows = np.flatnonzero(np.cumsum(depth)[:-1] == 0)
+        block_starts = np.concatenate([single_rows, loop_starts])
+        block_lengths = np.concatenate([np.ones(len(single_rows), dtype=np.int64), loop_stops - loop_starts])
+        block_reps = np.concatenate([np.where(inst[single_rows] == 2, 0, 1), loop_reps])
+        order = np.argsort(block_starts)
+        block_starts, block_lengths, block_reps = block_starts[order], block_lengths[order], block_reps[order]
+
+        # Each block is its rows tiled block_reps times:
+        block_sizes = block_lengths * block_reps
+        block_offsets = np.cumsum(block_sizes) - block_sizes
+        position = np.arange(block_sizes.sum(), dtype=np.int64)
+        position -= np.repeat(block_offsets, block_sizes)
+        position %= np.repeat(block_lengths, block_sizes)
+        return 2 + np.repeat(block_starts, block_sizes) + position
+
     def get_traces(self, add_trace, parent=None):
-        if parent is None:
-            # we're the master pseudoclock, software triggered. So we don't have to worry about trigger delays, etc
-            pass
-            
+        start_time = time.perf_counter()
+
         # get the pulse program
         with h5py.File(self.path, 'r') as f:
             pulse_program = f['devices/%s/PULSE_PROGRAM'%self.name][:]
-            # slow_clock_flag = eval(f['devices/%s'%self.name].attrs['slow_clock'])
             dds = {}
             for i in range(self.num_dds):
                 dds[i] = {}
                 for reg in ['FREQ', 'AMP', 'PHASE']:
                     dds[i][reg] = f['devices/%s/DDS%d/%s_REGS'%(self.name, i, reg)][:]
-        
-        clock = []
-        traces = {}
+        start_time = self._report_timing('read', start_time)
+
+        rows = self.get_execution_order(pulse_program)
+        start_time = self._report_timing('expand_loops', start_time)
+
+        # The time at which each executed row starts. Each row advances the time by its
+        # length, and a WAIT then by the trigger delay if we are not the master
+        # pseudoclock. These are accumulated in order, so as to be identical to adding
+        # them one at a time:
+        clock = np.zeros(2*len(rows) + 1)
+        clock[0] = 0. if parent is None else PulseBlaster.trigger_delay # Offset by initial trigger of parent
+        clock[1::2] = pulse_program['length'][rows]*1.0e-9
+        if parent is not None:
+            clock[2::2][pulse_program['inst'][rows] == 8] = PulseBlaster.trigger_delay
+        clock = np.cumsum(clock, out=clock)[:-1:2]
+        start_time = self._report_timing('clock', start_time)
+
+        # Decode each row of the pulse program once, then index by the executed rows.
+        # Bit n of the flags is flag n:
+        flags = pulse_program['flags'].astype(np.uint64)[:, None]
+        flags = ((flags >> np.arange(self.num_flags, dtype=np.uint64)) & 1).astype(int)
+        columns = {}
         for i in range(self.num_flags):
-            traces['flag %d'%i] = []
+            columns['flag %d'%i] = flags[:, i]
         for i in range(self.num_dds):
-            for sub_chnl in ['freq', 'amp', 'phase']:
-                traces['dds %d_%s'%(i,sub_chnl)] = []   
-        
-        # now build the traces
-        t = 0. if parent is None else PulseBlaster.trigger_delay # Offset by initial trigger of parent
-        i = 0
-        while i < len(pulse_program):
-            # ignore the first 2 instructions, they are dummy instructions for BLACS
-            if i < 2:
-                i += 1
-                continue
-            
-            row = pulse_program[i]
-            
-            if row['inst'] == 2: # Loop
-                loops = int(row['inst_data'])
-                
-                buffer = {}
-                j = i
-                while loops > 0:
-                    looping = True
-                    while looping:
-                        row = pulse_program[j]
-                        # buffer the index of traces used for this instruction
-                        # Cuts the runtime down by ~60%
-                        # start_profile('loop_contents')
-                        if j not in buffer:
-                            clock.append(t)
-                            self._add_pulse_program_row_to_traces(traces, row, dds)
-                            buffer[j] = len(clock)-1
-                        else:                            
-                            clock.append(t)
-                            self._add_pulse_program_row_from_buffer(traces, buffer[j])
-                        # stop_profile('loop_contents')
-                            
-                        # start_profile('end_of_loop')
-                        t+= row['length']*1.0e-9
-                        
-                        if row['inst'] == 3: # END_LOOP
-                            looping = False
-                            # print 'end loop. j=%d, t=%.7f'%(j,t)
-                            j = int(row['inst_data']) if loops > 1 else j
-                            # print 'setting j=%d'%j
-                        else:
-                            # print 'in loop. j=%d, t=%.7f'%(j,t)
-                            j+=1
-                        # stop_profile('end_of_loop')
-                    loops -= 1
-                    
-                i = j
-                # print 'i now %d'%i
-                    
-            else: # Continue
-                if row['inst'] == 8: #WAIT
-                    print('Wait at %.9f'%t)
-                    pass
-                clock.append(t)
-                self._add_pulse_program_row_to_traces(traces,row,dds)
-                t+= row['length']*1.0e-9
-            
-                if row['inst'] == 8 and parent is not None: #WAIT
-                    #TODO: Offset next time by trigger delay is not master pseudoclock
-                    t+= PulseBlaster.trigger_delay
-                    
-            
-            i += 1            
-                
-        print('Stop time: %.9f'%t)
-        # now put together the traces
-        to_return = {}
-        clock = np.array(clock, dtype=np.float64)
-        for name, data in traces.items():
-            to_return[name] = (clock, np.array(data))
-            
-        
-        # if slow_clock_flag is not None:
-            # to_return['slow clock'] = to_return['flag %d'%slow_clock_flag[0]]
-            
+            columns['dds %d_freq'%i] = dds[i]['FREQ'][pulse_program['freq%d'%i]]
+            columns['dds %d_phase'%i] = dds[i]['PHASE'][pulse_program['phase%d'%i]]
+            columns['dds %d_amp'%i] = np.where(pulse_program['dds_en%d'%i], dds[i]['AMP'][pulse_program['amp%d'%i]], 0)
+        start_time = self._report_timing('decode', start_time)
+
+        # now put together the traces, only for the channels in use
+        traces = {}
+        def get_trace(connection):
+            if connection not in traces:
+                traces[connection] = (clock, columns[connection][rows])
+            return traces[connection]
+
         clocklines_and_triggers = {}
         for pseudoclock_name, pseudoclock in self.device.child_list.items():
             for clock_line_name, clock_line in pseudoclock.child_list.items():
@@ -1285,60 +1191,21 @@ class PulseBlasterParser(object):
                     for internal_device_name, internal_device in clock_line.child_list.items():
                         for channel_name, channel in internal_device.child_list.items():
                             if channel.device_class == 'Trigger':
-                                clocklines_and_triggers[channel_name] = to_return[channel.parent_port]
-                                add_trace(channel_name, to_return[channel.parent_port], parent_device_name, channel.parent_port)
+                                clocklines_and_triggers[channel_name] = get_trace(channel.parent_port)
+                                add_trace(channel_name, get_trace(channel.parent_port), parent_device_name, channel.parent_port)
                             else:
                                 if channel.device_class == 'DDS':
                                     for subchnl_name, subchnl in channel.child_list.items():
                                         connection = '%s_%s'%(channel.parent_port, subchnl.parent_port)
-                                        if connection in to_return:
-                                            add_trace(subchnl.name, to_return[connection], parent_device_name, connection)
+                                        if connection in columns:
+                                            add_trace(subchnl.name, get_trace(connection), parent_device_name, connection)
                                 else:
-                                    add_trace(channel_name, to_return[channel.parent_port], parent_device_name, channel.parent_port)
+                                    add_trace(channel_name, get_trace(channel.parent_port), parent_device_name, channel.parent_port)
                 else:
-                    clocklines_and_triggers[clock_line_name] = to_return[clock_line.parent_port]
-                    add_trace(clock_line_name, to_return[clock_line.parent_port], self.name, clock_line.parent_port)
+                    clocklines_and_triggers[clock_line_name] = get_trace(clock_line.parent_port)
+                    add_trace(clock_line_name, get_trace(clock_line.parent_port), self.name, clock_line.parent_port)
             
+        self._report_timing('add_traces', start_time)
         return clocklines_and_triggers
-    
-    @profile
-    def _add_pulse_program_row_from_buffer(self, traces, index):
-        for i in range(self.num_flags):
-            traces[self.flag_strings[i]].append(traces[self.flag_strings[i]][index])
-            
-        for i in range(self.num_dds):
-            current_strings = self.dds_strings[i]
-            traces[current_strings['ddsfreq']].append(traces[current_strings['ddsfreq']][index])
-            traces[current_strings['ddsphase']].append(traces[current_strings['ddsphase']][index])
-            traces[current_strings['ddsamp']].append(traces[current_strings['ddsamp']][index])
-            
-    @profile            
-    def _add_pulse_program_row_to_traces(self, traces, row, dds, flags = None):
-        # add flags
-        if flags is None:
-            flags = np.binary_repr(row['flags'],self.num_flags)[::-1]
-        for i in range(self.num_flags):
-            traces[self.flag_strings[i]].append(int(flags[i]))
-        
-        # Below block saved for history. This is much slower compared to what is below!
-        # for i in range(self.num_dds):
-            # traces['dds %d_freq'%i].append(dds[i]['FREQ'][row['freq%d'%i]])
-            # traces['dds %d_phase'%i].append(dds[i]['PHASE'][row['phase%d'%i]])
-            # amp = dds[i]['AMP'][row['amp%d'%i]] if row['dds_en%d'%i] else 0
-            # traces['dds %d_amp'%i].append(amp)
-            
-       
-        # note that we are looking up keys for the traces dictionary and row array in self.dds_strings
-        # Doing this reduces the runtime (of the below block) by 25%
-        for i in range(self.num_dds):
-            # Note: This is done to reduce runtime (about 10%)
-            current_strings = self.dds_strings[i]
-            current_dds = dds[i]
-            
-            traces[current_strings['ddsfreq']].append(current_dds['FREQ'][row[current_strings['freq']]])
-            traces[current_strings['ddsphase']].append(current_dds['PHASE'][row[current_strings['phase']]])
-            # Note: Using the inline if statement reduces the runtime (of this for loop) by 50%
-            amp = current_dds['AMP'][row[current_strings['amp']]] if row[current_strings['dds_en']] else 0
-            traces[current_strings['ddsamp']].append(amp)
             
             
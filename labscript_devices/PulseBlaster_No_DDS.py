@@ -20,28 +20,14 @@ import logging
 
 class PulseBlaster_No_DDS(PulseBlaster):
 
+    pb_dtype = [('flags',np.int32), ('inst',np.int32), ('inst_data',np.int32), ('length',np.float64)]
+
     description = 'generic DO only Pulseblaster'
     clock_limit = 8.3e6 # can probably go faster
     clock_resolution = 20e-9
     n_flags = 24
     core_clock_freq = 100 # MHz
     
-    def write_pb_inst_to_h5(self, pb_inst, hdf5_file):
-        # OK now we squeeze the instructions into a numpy array ready for writing to hdf5:
-        pb_dtype= [('flags',np.int32), ('inst',np.int32), ('inst_data',np.int32), ('length',np.float64)]
-        pb_inst_table = np.empty(len(pb_inst),dtype = pb_dtype)
-        for i,inst in enumerate(pb_inst):
-            flagint = int(inst['flags'][::-1],2)
-            instructionint = self.pb_instructions[inst['instruction']]
-            dataint = inst['data']
-            delaydouble = inst['delay']
-            pb_inst_table[i] = (flagint, instructionint, dataint, delaydouble)
-        
-        # Okay now write it to the file: 
-        group = hdf5_file['/devices/'+self.name]  
-        group.create_dataset('PULSE_PROGRAM', compression=config.compression,data = pb_inst_table)         
-        self.set_property('stop_time', self.stop_time, location='device_properties')
-        
     def generate_code(self, hdf5_file):
         # Generate the hardware instructions
         self.init_device_group(hdf5_file)
@@ -18,7 +18,12 @@
 import numpy as np
 from labscript_utils import dedent
 
-from labscript_devices.IMAQdxCamera.blacs_workers import IMAQdxCameraWorker
+from labscript_devices.IMAQdxCamera.blacs_workers import (
+    IMAQdxCameraWorker,
+    FrameDecoder,
+    copy_frame,
+    get_mono_dtype,
+)
 
 # Don't import API yet so as not to throw an error, allow worker to run as a dummy
 # device, or for subclasses to import this module to inherit classes without requiring API
@@ -44,6 +49,8 @@ class Pylon_Camera(object):
                         pylon.RegistrationMode_ReplaceAll, pylon.Cleanup_Delete)
         # Keep a nodeMap reference so we don't have to re-create a lot
         self.nodeMap = self.camera.GetNodeMap()
+        # Feature nodes of each visibility level, found once by get_attributes():
+        self._feature_nodes = {}
         self._abort_acquisition = False
         self.exception_on_failed_shot = True
 
@@ -84,7 +91,10 @@ class Pylon_Camera(object):
         
     def get_attributes(self, visibility_level, writeable_only=True):
         """Return a dict of all attributes of readable attributes, for the given
-        visibility level. Optionally return only writeable attributes.
+        visibility level. Optionally return only writeable attributes. The nodes of
+        each visibility level are found by traversing the node map only the first
+        time, since visibility does not change, but their access modes are checked
+        every time.
         """
         visibilities = {
             'simple': ['Beginner'],
@@ -95,12 +105,18 @@ class Pylon_Camera(object):
             modes = ['RW']
         else:
             modes = ['RW','RO']
-        visibility_level = visibilities[visibility_level.lower()]
-        attributes = []
-        filters = [lambda n: n.GetNode().IsFeature(),
-                   lambda n:genicam.EVisibilityClass.ToString(n.GetNode().GetVisibility()) in visibility_level,
-                   lambda n:genicam.EAccessModeClass.ToString(n.GetNode().GetAccessMode()) in modes]
-        params = filter(lambda n: all([f(n) for f in filters]), self.nodeMap.GetNodes())
+        visibility_level = visibility_level.lower()
+        if visibility_level not in self._feature_nodes:
+            visibility = visibilities[visibility_level]
+            filters = [lambda n: n.GetNode().IsFeature(),
+                       lambda n:genicam.EVisibilityClass.ToString(n.GetNode().GetVisibility()) in visibility]
+            self._feature_nodes[visibility_level] = [
+                n for n in self.nodeMap.GetNodes() if all([f(n) for f in filters])
+            ]
+        params = [
+            n for n in self._feature_nodes[visibility_level]
+            if genicam.EAccessModeClass.ToString(n.GetNode().GetAccessMode()) in modes
+        ]
         attributes = {}
         for n in params:
             try:
@@ -138,39 +154,82 @@ class Pylon_Camera(object):
         else:
             self.camera.StartGrabbing(pylon.GrabStrategy_OneByOne)
 
-    def grab(self, continuous=True):
-        """Grab single image during pre-configured acquisition."""
+    def get_image_format(self):
+        """Return the shape and dtype of images as configured, or None if they are
+        not monochrome"""
+        dtype = get_mono_dtype(self.get_attribute('PixelFormat'))
+        if dtype is None:
+            return None
+        return (self.get_attribute('Height'), self.get_attribute('Width')), dtype
+
+    def grab(self, continuous=True, out=None):
+        """Grab single image during pre-configured acquisition, copied into the array
+        `out` if given."""
             
         result = self.camera.RetrieveResult(self.timeout,
                                         pylon.TimeoutHandling_ThrowException)
-        if result.GrabSucceeded():
-            img = result.Array
+        return self._decode_result(result, out)
+
+    def _decode_result(self, result, out=None):
+        """Return the image of a grab result, copied into the array `out` if given,
+        and release the result's buffer"""
+        try:
+            if not result.GrabSucceeded():
+                msg = f"Grab Error: {result.ErrorCode} {result.ErrorDescription}"
+                raise RuntimeError(msg)
+            if out is not None:
+                with result.GetArrayZeroCopy() as array:
+                    return copy_frame(array, out)
+            return result.Array
+        finally:
             result.Release()
-            return img
-        else:
-            raise('Grab Error:',result.ErrorCode,result.ErrorDescription)
 
     def grab_multiple(self, n_images, images):
-        """Grab n_images into images array during buffered acquistion."""
+        """Grab n_images into images array during buffered acquistion. This thread
+        only retrieves grab results, they are decoded, and their buffers released, by
+        a FrameDecoder."""
         print(f"Attempting to grab {n_images} images.")
-        for i in range(n_images):
-            while True:
-                if self._abort_acquisition:
-                    print("Abort during acquisition.")
-                    self._abort_acquisition = False
-                    return
-                try:
-                    images.append(self.grab(continuous=False))
-                    print(f"Got image {i+1} of {n_images}.")
-                    break
-                except pylon.TimeoutException as e:
-                    print('.', end='')
-                    continue
+        decoder = FrameDecoder(images, self._decode_result)
+        try:
+            for i in range(n_images):
+                while True:
+                    if self._abort_acquisition:
+                        print("Abort during acquisition.")
+                        self._abort_acquisition = False
+                        decoder.finish()
+                        return
+                    try:
+                        result = self.camera.RetrieveResult(
+                            self.timeout, pylon.TimeoutHandling_ThrowException
+                        )
+                        break
+                    except pylon.TimeoutException as e:
+                        print('.', end='')
+                        continue
+                decoder.submit(result)
+        except BaseException:
+            # Release the frames already retrieved, without replacing this exception
+            # with any raised decoding them:
+            decoder.finish(raise_error=False)
+            raise
+        decoder.finish()
         print(f"Got {len(images)} of {n_images} images.")
 
     def stop_acquisition(self):
         self.camera.StopGrabbing()
 
+    def get_stream_statistics(self):
+        """Return the statistics of the stream grabber, including the number of
+        buffer underruns, for those provided by the camera's transport layer"""
+        nodemap = self.camera.GetStreamGrabberNodeMap()
+        statistics = {}
+        for name in ['Statistic_Total_Buffer_Count', 'Statistic_Failed_Buffer_Count',
+                     'Statistic_Buffer_Underrun_Count']:
+            node = nodemap.GetNode(name)
+            if node is not None and genicam.IsReadable(node):
+                statistics[name] = node.GetValue()
+        return statistics
+
     def abort_acquisition(self):
         self._abort_acquisition = True
 
@@ -36,9 +36,13 @@ class Pyncmaster(PulseBlaster_No_DDS):
                         # This might bring the max clock frequency down to 25MHz
     #clock_resolution = 50e-9 #s (20 was the default)
     n_flags = 64
+    pb_dtype= [('flags',np.uint64), ('inst',np.int32), ('inst_data',np.int32), ('length',np.float64)]
     #core_clock_freq = 20.0 #MHz
     @set_passed_properties({"connection_table_properties": ["clock_rate",'log_level']})
     def __init__(self,clock_rate=20,log_level=logging.DEBUG,*args,**kwargs):
+        """Pseudoclock programmed through pynqapi, with clock_rate the frequency of
+        its state machine in MHz and log_level the level of its BLACS worker's log.
+        Other arguments are passed to PulseBlaster_No_DDS"""
         #clock_defined = False
         #for k,v in kwargs.items():
         #    if k=='clock_rate':
@@ -76,23 +80,6 @@ class Pyncmaster(PulseBlaster_No_DDS):
 
 
 
-    def write_pb_inst_to_h5(self, pb_inst, hdf5_file):
-        # OK now we squeeze the instructions into a numpy array ready for writing to hdf5:
-        pb_dtype= [('flags',np.uint64), ('inst',np.int32), ('inst_data',np.int32), ('length',np.float64)]
-        pb_inst_table = np.empty(len(pb_inst),dtype = pb_dtype)
-        for i,inst in enumerate(pb_inst):
-            flagint = int(inst['flags'][::-1],2)
-            instructionint = self.pb_instructions[inst['instruction']]
-            dataint = inst['data']
-            delaydouble = inst['delay']
-            pb_inst_table[i] = (flagint, instructionint, dataint, delaydouble)
-        # print("pb_inst_table size={}".format(len(pb_inst_table)))
-
-        # Okay now write it to the file:
-        group = hdf5_file['/devices/'+self.name]
-        group.create_dataset('PULSE_PROGRAM', compression=config.compression,data = pb_inst_table)
-        self.set_property('stop_time', self.stop_time, location='device_properties')
-
     def generate_code(self, hdf5_file):
         # Generate the hardware instructions
         self.init_device_group(hdf5_file)
@@ -107,8 +94,19 @@ class Pyncmaster(PulseBlaster_No_DDS):
         self.write_pb_inst_to_h5(pb_inst, hdf5_file)
 
     def convert_to_pb_inst(self, dig_outputs):
+            # Rows of (flags, instruction, data, delay). The flags are an integer with
+            # bit n set if flag n is high:
             pb_inst = []
+            def add_instruction(flags, instruction, data, delay):
+                pb_inst.append((flags, self.pb_instructions[instruction], data, delay))
 
+            # Flag words of the digital outputs at each index of their raw_output, and
+            # the bit of each clock line, computed once rather than per instruction:
+            if dig_outputs:
+                dig_flags = self.get_flag_words(dig_outputs, np.arange(len(dig_outputs[0].raw_output))).tolist()
+            else:
+                dig_flags = None
+            clock_flags = {}
 
             # index to keep track of where in output.raw_output the
             # pulseblaster flags are coming from
@@ -128,16 +126,12 @@ class Pyncmaster(PulseBlaster_No_DDS):
             # We've delegated the initial two instructions off to BLACS, which
             # can ensure continuity with the state of the front panel. Thus
             # these two instructions don't actually do anything:
-            flags = [0]*self.n_flags
-
-            pb_inst.append({'flags': ''.join([str(flag) for flag in flags]), 'instruction': 'STOP',
-                            'data': 0, 'delay': 10.0/self.clock_limit*1e9})
-            pb_inst.append({'flags': ''.join([str(flag) for flag in flags]), 'instruction': 'STOP',
-                            'data': 0, 'delay': 10.0/self.clock_limit*1e9})
+            add_instruction(0, 'STOP', 0, 10.0/self.clock_limit*1e9)
+            add_instruction(0, 'STOP', 0, 10.0/self.clock_limit*1e9)
             ticks += 20.0/self.clock_limit*1e9
             j += 2
 
-            flagstring = '0'*self.n_flags # So that this variable is still defined if the for loop has no iterations
+            flags = 0 # So that this variable is still defined if the for loop has no iterations
             for k, instruction in enumerate(self.pseudoclock.clock):
 
                 if (j%self.framelength<frame_position):
@@ -149,36 +143,28 @@ class Pyncmaster(PulseBlaster_No_DDS):
 
                 if instruction == 'WAIT':
                     # This is a wait instruction. Repeat the last instruction but with a 100ns delay and a WAIT op code:
-                    wait_instruction = pb_inst[-1].copy()
-                    wait_instruction['delay'] = 100
-                    wait_instruction['instruction'] = 'WAIT'
-                    wait_instruction['data'] = 0
-                    pb_inst.append(wait_instruction)
+                    add_instruction(pb_inst[-1][0], 'WAIT', 0, 100)
                     j += 1
                     ticks += 100
                     continue
 
-                flags = [0]*self.n_flags
-
-
                 # This flag indicates whether we need a full clock tick, or are just updating an internal output
                 only_internal = True
                 # find out which clock flags are ticking during this instruction
+                clock_mask = 0
                 for clock_line in instruction['enabled_clocks']:
                     if clock_line == self._direct_output_clock_line:
                         # advance i (the index keeping track of internal clockline output)
                         i += 1
                     else:
-                        flag_index = int(clock_line.connection.split()[1])
-                        flags[flag_index] = 1
+                        if clock_line not in clock_flags:
+                            clock_flags[clock_line] = 1 << self.get_flag_number(clock_line.connection)
+                        clock_mask |= clock_flags[clock_line]
                         # We are not just using the internal clock line
                         only_internal = False
 
-                for output in dig_outputs:
-                    flagindex = int(output.connection.split()[1])
-                    flags[flagindex] = int(output.raw_output[i])
-
-                flagstring = ''.join([str(flag) for flag in flags])
+                low_flags = dig_flags[i] if dig_flags is not None else 0
+                flags = low_flags | clock_mask
 
                 if instruction['reps'] > 1048576:
                     raise LabscriptError('Pulseblaster cannot support more than 1048576 loop iterations. ' +
@@ -215,31 +201,21 @@ class Pyncmaster(PulseBlaster_No_DDS):
                             #Similar fix for long delay
                             erosion = 2 * 1e-6 / self.core_clock_freq #time in seconds
                             high_time = high_time -  erosion
-                            pb_inst.append({'flags': flagstring, 'instruction': 'CONTINUE',
-                                    'data': 0, 'delay': erosion*1e9})
+                            add_instruction(flags, 'CONTINUE', 0, erosion*1e9)
                             j+=1
                             if n_long_delays:
                                 high_time = high_time - erosion
-                                pb_inst.append({'flags': flagstring, 'instruction': 'CONTINUE',
-                                        'data': 0, 'delay': erosion*1e9})
+                                add_instruction(flags, 'CONTINUE', 0, erosion*1e9)
                                 j+=1
                         else:
                             #All other loops: we subtract 1 from number of repetitions
                             #Two CONTINUE instructions added before the loop
                             #Loop and end loop are now in the same bank
-                            #Made flags_copy to differentiate flags for two added instructions
-                            flags_copy = flags
-                            for clock_line in instruction['enabled_clocks']:
-                                if clock_line != self._direct_output_clock_line:
-                                   flag_index = int(clock_line.connection.split()[1])
-                                   flags_copy[flag_index] = 0
-
-                            flagstring_copy = ''.join([str(flag) for flag in flags_copy])
+                            #The first added instruction has the clock flags high, the
+                            #second low
                             repetitions = repetitions - 1
-                            pb_inst.append({'flags': flagstring, 'instruction': 'CONTINUE',
-                                    'data': 0, 'delay': high_time})
-                            pb_inst.append({'flags': flagstring_copy, 'instruction': 'CONTINUE',
-                                    'data': 0, 'delay': low_time})
+                            add_instruction(flags, 'CONTINUE', 0, high_time)
+                            add_instruction(low_flags, 'CONTINUE', 0, low_time)
 
                             j+=2
 
@@ -255,24 +231,16 @@ class Pyncmaster(PulseBlaster_No_DDS):
                         remaining_low_time += self.long_delay
 
                     # The start loop instruction, Clock edges are high:
-                    pb_inst.append({'flags': flagstring, 'instruction': 'LOOP',
-                                    'data': repetitions, 'delay': high_time*1e9})
-
-                    for clock_line in instruction['enabled_clocks']:
-                        if clock_line != self._direct_output_clock_line:
-                            flag_index = int(clock_line.connection.split()[1])
-                            flags[flag_index] = 0
+                    add_instruction(flags, 'LOOP', repetitions, high_time*1e9)
 
-                    flagstring = ''.join([str(flag) for flag in flags])
+                    flags = low_flags
 
                     # The long delay instruction, if any. Clock edges are low:
                     if n_long_delays:
-                        pb_inst.append({'flags': flagstring, 'instruction': 'LONG_DELAY',
-                                    'data': int(n_long_delays), 'delay': self.long_delay*1e9})
+                        add_instruction(flags, 'LONG_DELAY', int(n_long_delays), self.long_delay*1e9)
 
                     # Remaining low time. Clock edges are low:
-                    pb_inst.append({'flags': flagstring, 'instruction': 'END_LOOP',
-                                    'data': j%(2*self.framelength), 'delay': remaining_low_time*1e9})
+                    add_instruction(flags, 'END_LOOP', j%(2*self.framelength), remaining_low_time*1e9)
 
                     # Two instructions were used in the case of there being no LONG_DELAY,
                     # otherwise three. This increment is done here so that the j referred
@@ -296,11 +264,9 @@ class Pyncmaster(PulseBlaster_No_DDS):
                         remaining_delay += self.long_delay
 
                     if n_long_delays:
-                        pb_inst.append({'flags': flagstring, 'instruction': 'LONG_DELAY',
-                                    'data': int(n_long_delays), 'delay': self.long_delay*1e9})
+                        add_instruction(flags, 'LONG_DELAY', int(n_long_delays), self.long_delay*1e9)
 
-                    pb_inst.append({'flags': flagstring, 'instruction': 'CONTINUE',
-                                    'data': 0, 'delay': remaining_delay*1e9})
+                    add_instruction(flags, 'CONTINUE', 0, remaining_delay*1e9)
 
                     j += 2 if n_long_delays else 1
                     if n_long_delays:
@@ -315,8 +281,7 @@ class Pyncmaster(PulseBlaster_No_DDS):
                 # the same values and a WAIT instruction. The PulseBlaster then
                 # waits on instuction zero, which is a state ready for either
                 # further static updates or buffered mode.
-                pb_inst.append({'flags': flagstring, 'instruction': 'BRANCH',
-                                'data': 0, 'delay': 10.0/self.clock_limit*1e9})
+                add_instruction(flags, 'BRANCH', 0, 10.0/self.clock_limit*1e9)
             elif self.programming_scheme == 'pb_stop_programming/STOP':
                 # An ordinary stop instruction. This has the downside that the PulseBlaster might
                 # (on some models) reset its output to zero momentarily until BLACS calls program_manual, which
@@ -324,14 +289,13 @@ class Pyncmaster(PulseBlaster_No_DDS):
                 # repeated triggers coming to it, such as a 50Hz/60Hz line trigger. We can't have it sit
                 # on a WAIT instruction as above, or it will trigger and run repeatedly when that's not what
                 # we wanted.
-                pb_inst.append({'flags': flagstring, 'instruction': 'STOP',
-                                'data': 0, 'delay': 10.0/self.clock_limit*1e9})
+                add_instruction(flags, 'STOP', 0, 10.0/self.clock_limit*1e9)
             else:
                 raise AssertionError('Invalid programming scheme %s'%str(self.programming_scheme))
 
             if len(pb_inst) > self.max_instructions:
                 raise LabscriptError("The Pyncmaster memory cannot store more than {:d} instuctions, but the PulseProgram contains {:d} instructions.".format(self.max_instructions, len(pb_inst)))
-            return pb_inst
+            return np.array(pb_inst, dtype=[('flags', np.uint64), ('inst', np.int64), ('inst_data', np.int64), ('length', np.float64)])
 
 
 
@@ -529,7 +493,8 @@ class PyncmasterWorker(PulseblasterNoDDSWorker):
             # occurred due to smart programming:
             pb_start_programming(PULSE_PROGRAM)
 
-            # Begin of modified section
+            # Lines zero and one contain the front panel values. They are always
+            # written, since program_manual() overwrites them:
             initial_flags = ''
             for i in range(self.num_DO):
                 if initial_values['flag %d'%i]:
@@ -539,62 +504,15 @@ class PyncmasterWorker(PulseblasterNoDDSWorker):
             pb_inst_pbonly(initial_flags,CONTINUE,0,200)
             pb_inst_pbonly(initial_flags,CONTINUE,0,200)
 
+            # Now the rest of the program. pynqapi writes instructions in order from the
+            # start of the program, with no way to address a single instruction, so
+            # the whole program is written every shot:
+            self.secondary_logger.debug('Programming %d instructions' % len(pulse_program))
             for args in pulse_program:
-                try:
-                    pb_inst_pbonly(*args)
-                except Exception as ex:
-                    for arg in args:
-                        #self.logger.debug(str(arg))
-                        pass
-                    raise ex
-            # pb_stop_programming()
-
-            # End of modified section
-
-            if fresh or (self.smart_cache['initial_values'] != initial_values) or \
-                (len(self.smart_cache['pulse_program']) != len(pulse_program)) or \
-                (self.smart_cache['pulse_program'] != pulse_program).any() or \
-                not self.smart_cache['ready_to_go']:
-
-                self.smart_cache['ready_to_go'] = True
-                self.smart_cache['initial_values'] = initial_values
-
-                # create initial flags string
-                # NOTE: The spinapi can take a string or integer for flags.
-                # If it is a string:
-                #     flag: 0          12
-                #          '101100011111'
-                #
-                # If it is a binary number:
-                #     flag:12          0
-                #         0b111110001101
-                #
-                # Be warned!
-                initial_flags = ''
-                for i in range(self.num_DO):
-                    if initial_values['flag %d'%i]:
-                        initial_flags += '1'
-                    else:
-                        initial_flags += '0'
-
-                if self.programming_scheme == 'pb_start/BRANCH':
-                    # Line zero is a wait on the final state of the program in 'pb_start/BRANCH' mode
-                    #pb_inst_pbonly(flags,WAIT,0,100)
-                    pass
-                else:
-                    # Line zero otherwise just contains the initial flags
-                    #pb_inst_pbonly(initial_flags,CONTINUE,0,100)
-                    pass
-
-                # Line one is a continue with the current front panel values:
-                # pb_inst_pbonly(initial_flags, CONTINUE, 0, 100)
-
-                # Now the rest of the program:
-                if fresh or len(self.smart_cache['pulse_program']) != len(pulse_program) or \
-                (self.smart_cache['pulse_program'] != pulse_program).any():
-                    self.smart_cache['pulse_program'] = pulse_program
-                    #for args in pulse_program:
-                    #    pb_inst_pbonly(*args)
+                pb_inst_pbonly(*args)
+            self.smart_cache['pulse_program'] = pulse_program
+            self.smart_cache['ready_to_go'] = True
+            self.smart_cache['initial_values'] = initial_values
 
             if self.programming_scheme == 'pb_start/BRANCH':
                 # We will be triggered by pb_start() if we are are the master pseudoclock or a single hardware trigger
@@ -20,7 +20,12 @@ from labscript_utils import dedent
 from enum import IntEnum
 from time import sleep, perf_counter
 
-from labscript_devices.IMAQdxCamera.blacs_workers import IMAQdxCameraWorker
+from labscript_devices.IMAQdxCamera.blacs_workers import (
+    IMAQdxCameraWorker,
+    FrameDecoder,
+    copy_frame,
+    get_mono_dtype,
+)
 
 class Spinnaker_Camera(object):
     def __init__(self, serial_number):
@@ -57,6 +62,9 @@ class Spinnaker_Camera(object):
         self._abort_acquisition = False
         self.exception_on_failed_shot = True
 
+        # Nodes of attributes already looked up in the node maps:
+        self._nodes = {}
+
     def get_attribute_names(self, visibility):
         names = []
         def get_node_names_in_category(node_category, prefix=''):
@@ -81,16 +89,22 @@ class Spinnaker_Camera(object):
 
         return names
 
+    def _get_node(self, name, stream_map=False):
+        """Return the node of the attribute of the given name, looking it up in the
+        node map only the first time"""
+        if (name, stream_map) not in self._nodes:
+            if stream_map:
+                nodemap = self.camera.GetTLStreamNodeMap()
+            else:
+                nodemap = self.camera.GetNodeMap()
+            self._nodes[(name, stream_map)] = nodemap.GetNode(name)
+        return self._nodes[(name, stream_map)]
+
     def get_attribute(self, name, stream_map=False):
         """Return current values dictionary of attribute of the given name"""
         #print('Getting attribute %s.' % name)
         name = name.split('::')
-
-        if stream_map:
-            nodemap = self.camera.GetTLStreamNodeMap()
-        else:
-            nodemap = self.camera.GetNodeMap()
-        node = nodemap.GetNode(name[-1])
+        node = self._get_node(name[-1], stream_map)
 
         if PySpin.IsAvailable(node) and PySpin.IsReadable(node):
             if node.GetPrincipalInterfaceType() == PySpin.intfIInteger:
@@ -112,12 +126,7 @@ class Spinnaker_Camera(object):
     def set_attribute(self, name, value, stream_map=False):
         #print('Setting attribute %s.' % name)
         name = name.split('::')
-
-        if stream_map:
-            nodemap = self.camera.GetTLStreamNodeMap()
-        else:
-            nodemap = self.camera.GetNodeMap()
-        node = nodemap.GetNode(name[-1])
+        node = self._get_node(name[-1], stream_map)
 
         if PySpin.IsAvailable(node) and PySpin.IsWritable(node):
             if node.GetPrincipalInterfaceType() == PySpin.intfIInteger:
@@ -151,25 +160,33 @@ class Spinnaker_Camera(object):
         self.camera.EndAcquisition()
         return image
 
-    def grab(self):
-        """Grab and return single image during pre-configured acquisition."""
+    def grab(self, out=None):
+        """Grab and return single image during pre-configured acquisition, decoded
+        into the array `out` if given."""
         #print('Grabbing...')
         image_result = self.camera.GetNextImage(self.timeout)
-        img = self._decode_image_data(image_result.GetData())
-        image_result.Release()
-        return img
+        return self._decode_image_result(image_result, out)
 
     def grab_multiple(self, n_images, images):
-        """Grab n_images into images array during buffered acquistion."""
+        """Grab n_images into images array during buffered acquistion. This thread
+        only retrieves images from the driver, they are decoded, and their buffers
+        released, by a FrameDecoder."""
         print(f"Attempting to grab {n_images} images.")
-        for i in range(n_images):
-            if self._abort_acquisition:
-                print("Abort during acquisition.")
-                self._abort_acquisition = False
-                return
-
-            images.append(self.grab())
-            print(f"Got image {i+1} of {n_images}.")
+        decoder = FrameDecoder(images, self._decode_image_result)
+        try:
+            for i in range(n_images):
+                if self._abort_acquisition:
+                    print("Abort during acquisition.")
+                    self._abort_acquisition = False
+                    decoder.finish()
+                    return
+                decoder.submit(self.camera.GetNextImage(self.timeout))
+        except BaseException:
+            # Release the frames already retrieved, without replacing this exception
+            # with any raised decoding them:
+            decoder.finish(raise_error=False)
+            raise
+        decoder.finish()
         print(f"Got {len(images)} of {n_images} images.")
 
 
@@ -209,7 +226,22 @@ class Spinnaker_Camera(object):
 
         self.camera.BeginAcquisition()
 
-    def _decode_image_data(self, img):
+    def get_image_format(self):
+        """Return the shape and dtype of images as configured by
+        configure_acquisition(), or None if they are not monochrome"""
+        dtype = get_mono_dtype(self.pix_fmt)
+        if dtype is None:
+            return None
+        return (self.height, self.width), dtype
+
+    def _decode_image_result(self, image_result, out=None):
+        """Decode an image retrieved from the driver, and release its buffer"""
+        try:
+            return self._decode_image_data(image_result.GetData(), out)
+        finally:
+            image_result.Release()
+
+    def _decode_image_data(self, img, out=None):
         """Spinnaker image buffers require significant formatting.
         This returns what one would expect from a camera.
         configure_acquisition must be called first to set image format parameters."""
@@ -224,7 +256,7 @@ class Spinnaker_Camera(object):
             To add other image types, add conversion logic from returned
             uint8 data to desired format in _decode_image_data() method."""
             raise ValueError(dedent(msg))
-        return image.copy()
+        return copy_frame(image, out)
 
     def stop_acquisition(self):
         print('Stopping acquisition...')
@@ -232,11 +264,22 @@ class Spinnaker_Camera(object):
 
         # This is supposed to provide debugging info, but as with most things
         # in PySpin, it appears to be completely useless:.
-        num_frames=self.get_attribute('StreamTotalBufferCount', stream_map=True)
-        failed_frames=self.get_attribute('StreamFailedBufferCount', stream_map=True)
-        underrun_frames=self.get_attribute('StreamBufferUnderrunCount', stream_map=True)
+        statistics = self.get_stream_statistics()
         print('Stream info: %s frames acquired, %s failed, %s underrun' %
-              (str(num_frames), str(failed_frames), str(underrun_frames)))
+              (str(statistics.get('StreamTotalBufferCount')),
+               str(statistics.get('StreamFailedBufferCount')),
+               str(statistics.get('StreamBufferUnderrunCount'))))
+
+    def get_stream_statistics(self):
+        """Return the buffer counts of the stream, including the number of buffer
+        underruns, for those that are readable"""
+        statistics = {}
+        for name in ['StreamTotalBufferCount', 'StreamFailedBufferCount',
+                     'StreamBufferUnderrunCount']:
+            value = self.get_attribute(name, stream_map=True)
+            if value is not None:
+                statistics[name] = value
+        return statistics
 
     def abort_acquisition(self):
         print('Stopping acquisition...')
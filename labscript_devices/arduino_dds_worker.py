@@ -0,0 +1,148 @@
+#####################################################################
+#                                                                   #
+# /arduino_dds_worker.py                                            #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""BLACS worker base class shared by the Arduino-based DDS devices (Arduino_DDS,
+Arduino_DDS_n_ch, Arduino_Single_DDS, Arduino_Repump_DDS and lsduino), which are
+programmed over a serial connection with a table of text commands per channel."""
+
+import time
+
+from blacs.tab_base_classes import Worker
+from labscript_utils import dedent
+
+# Commands setting the baud rate, also used by the device classes to check baud_rate:
+bauds = {9600: b'Kb 78',
+         19200: b'Kb 3c',
+         38400: b'Kb 1e',
+         57600: b'Kb 14',
+         115200: b'Kb 0a'}
+
+
+class ArduinoDDSWorker(Worker):
+    """Opens the serial connection once, and on each shot writes the tables of all
+    channels in TABLE_DATA as one buffered write. Subclasses implement
+    program_manual() and transition_to_manual(), and may override
+    get_table_commands() and get_final_values() for tables of a different format."""
+
+    # Number of channels with a table in TABLE_DATA:
+    num_channels = 2
+
+    def init(self):
+        global serial; import serial
+        global h5py; import labscript_utils.h5_lock, h5py
+        self.smart_cache = {'STATIC_DATA': None, 'TABLE_DATA': None}
+
+        if self.default_baud_rate is not None:
+            initial_baud_rate = self.default_baud_rate
+        else:
+            initial_baud_rate = self.baud_rate
+        self.initial_baud_rate = initial_baud_rate
+
+        self.connection = serial.Serial(
+            self.com_port, baudrate=initial_baud_rate, timeout=0.1
+        )
+
+    def get_table_commands(self, data, channel):
+        """Returns the commands programming each line of the given channel's table,
+        a ramp if it is on, otherwise a frequency"""
+        freqs = data['freq%d' % channel].tolist()
+        ramplows = data['ramplow%d' % channel].tolist()
+        ramphighs = data['ramphigh%d' % channel].tolist()
+        rampdurs = data['rampdur%d' % channel].tolist()
+        rampons = data['rampon%d' % channel].tolist()
+        return [
+            b'r %f %f %f\r\n' % (ramplow, ramphigh, rampdur) if rampon == 1 else b'f %f\r\n' % freq
+            for freq, ramplow, ramphigh, rampdur, rampon in zip(freqs, ramplows, ramphighs, rampdurs, rampons)
+        ]
+
+    def get_final_values(self, data):
+        """Returns the front panel values at the end of the table"""
+        final_values = {}
+        for channel in range(self.num_channels):
+            final_values['channel %d' % channel] = {'freq': data[-1]['freq%d' % channel]}
+        return final_values
+
+    def transition_to_buffered(self, device_name, h5file, initial_values, fresh):
+        # Store the final values to for use during transition_to_static:
+        self.final_values = {}
+        table_data = None
+        with h5py.File(h5file, 'r') as hdf5_file:
+            group = hdf5_file['/devices/' + device_name]
+            if 'TABLE_DATA' in group:
+                table_data = group['TABLE_DATA'][:]
+
+        # Now program the buffered outputs:
+        if table_data is not None:
+            data = table_data
+            start_time = time.time()
+            commands = []
+            # The tabs do not support smart programming, and each channel's table is
+            # written from its first line after selecting the channel, so all
+            # channels are written in full every shot:
+            for channel in range(self.num_channels):
+                commands.append(b'@ %d\r\n' % channel)
+                commands.extend(self.get_table_commands(data, channel))
+            stream = b''.join(commands)
+
+            # Invalidate the cache until programming is complete, in case it fails
+            # part way through:
+            self.smart_cache['TABLE_DATA'] = None
+            # Discard any responses to earlier commands that were not read:
+            self.connection.reset_input_buffer()
+            self.connection.write(stream)
+            # Wait for the line the firmware sends once it has processed the whole
+            # stream, for at least as long as it takes to transmit (ten bits per
+            # byte):
+            self.connection.timeout = 1 + 10 * len(stream) / self.connection.baudrate
+            try:
+                response = self.connection.readline()
+            finally:
+                self.connection.timeout = 0.1
+            if not response.endswith(b'\n'):
+                # Nothing, or only part of a line, was received before the timeout:
+                msg = f"""No acknowledgment received after programming {len(commands)}
+                    commands, got {response!r}"""
+                raise RuntimeError(dedent(msg))
+            self.smart_cache['TABLE_DATA'] = data
+            self.logger.info('Programmed %d commands (%d bytes) in %.3f s' % (len(commands), len(stream), time.time() - start_time))
+
+            # Get the final values of table mode so that the GUI can
+            # reflect them after the run:
+            self.final_values = self.get_final_values(data)
+
+            if self.update_mode == 'synchronous':
+                # Transition to hardware synchronous updates:
+                self.connection.write(b'$\r\n')
+                self.connection.readline()
+                # We are now waiting for a rising edge to trigger the output
+                # of the second table pair (first of the experiment)
+            elif self.update_mode == 'asynchronous':
+                # Output will now be updated on falling edges.
+                pass
+            else:
+                raise ValueError('invalid update mode %s' % str(self.update_mode))
+
+        return self.final_values
+
+    def abort_transition_to_buffered(self):
+        return self.transition_to_manual(True)
+
+    def abort_buffered(self):
+        # TODO: untested
+        return self.transition_to_manual(True)
+
+    def shutdown(self):
+        # return to the default baud rate
+        if self.default_baud_rate is not None:
+            self.connection.write(b'%s\r\n' % bauds[self.default_baud_rate])
+            time.sleep(0.1)
+            self.connection.readlines()
+
+        self.connection.close()
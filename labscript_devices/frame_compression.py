@@ -0,0 +1,197 @@
+#####################################################################
+#                                                                   #
+# /frame_compression.py                                             #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""Functions shared by the camera workers for saving frames to HDF5 datasets with one
+frame per chunk. Rather than HDF5 compressing the chunks one at a time as they are
+written, the chunks are compressed in parallel in a thread pool and written with
+direct chunk writes. This is supported for the gzip and blosc filters, and gives the
+same bytes in the file as HDF5 itself would. Datasets with other filters are written
+normally."""
+
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import h5py
+
+from labscript_utils import dedent
+
+# Filter id of the HDF5 blosc filter, and its compressors in order of their codes:
+BLOSC_FILTER = 32001
+BLOSC_COMPRESSORS = ['blosclz', 'lz4', 'lz4hc', 'snappy', 'zlib', 'zstd']
+
+_executor = None
+
+
+def get_executor():
+    """Return the thread pool in which frames are compressed, creating it if it does
+    not exist yet. zlib and blosc release the GIL whilst compressing, so frames are
+    compressed in parallel on all cores."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count(), thread_name_prefix='frame_compression'
+        )
+    return _executor
+
+
+def get_compression_kwargs(compression, compression_opts=None):
+    """Return the keyword arguments to h5py's create_dataset() for a camera's
+    image_compression and image_compression_opts. The 'lz4' and 'blosc' filters
+    require the hdf5plugin package"""
+    if compression is None:
+        return {}
+    if compression in ('gzip', 'lzf'):
+        return {'compression': compression, 'compression_opts': compression_opts}
+    try:
+        import hdf5plugin
+    except ImportError:
+        msg = f"""image_compression '{compression}' requires the hdf5plugin package,
+            which could not be imported"""
+        raise ImportError(dedent(msg))
+    if compression_opts is None:
+        compression_opts = {}
+    if compression == 'lz4':
+        return dict(hdf5plugin.LZ4(**compression_opts))
+    if compression == 'blosc':
+        return dict(hdf5plugin.Blosc(**compression_opts))
+    raise ValueError(f"Unknown image_compression '{compression}'")
+
+
+def create_frames_dataset(
+    group, name, frame_shape, count=None, dtype='uint16', compression_kwargs=None
+):
+    """Create a dataset for `count` frames of the given shape, chunked with one frame
+    per chunk, or for a single frame if `count` is None. The first axis of a dataset of
+    several frames is resizable, so that it may be truncated if fewer frames are
+    acquired than expected."""
+    if compression_kwargs is None:
+        compression_kwargs = {}
+    frame_shape = tuple(frame_shape)
+    if count is None:
+        return group.create_dataset(
+            name,
+            shape=frame_shape,
+            dtype=dtype,
+            chunks=frame_shape if compression_kwargs else None,
+            **compression_kwargs,
+        )
+    return group.create_dataset(
+        name,
+        shape=(count,) + frame_shape,
+        maxshape=(None,) + frame_shape,
+        dtype=dtype,
+        chunks=(1,) + frame_shape,
+        **compression_kwargs,
+    )
+
+
+def get_chunk_compressor(dset):
+    """Return a function compressing a frame into a chunk of the dataset, in the same
+    way as the dataset's filter, or None if the dataset is not chunked with one frame
+    per chunk or its filter is not supported. The function returns None for frames
+    not of the dataset's frame shape, which must then be written normally."""
+    if dset.chunks is None:
+        return None
+    if dset.ndim > 1 and dset.chunks[0] == 1 and dset.chunks[1:] == dset.shape[1:]:
+        frame_shape = dset.shape[1:]
+    elif dset.chunks == dset.shape:
+        frame_shape = dset.shape
+    else:
+        return None
+    dcpl = dset.id.get_create_plist()
+    if dcpl.get_nfilters() != 1:
+        return None
+    filter_code, _, values, _ = dcpl.get_filter(0)
+    if filter_code == h5py.h5z.FILTER_DEFLATE:
+        level = values[0] if values else 6
+
+        def compress(data):
+            return zlib.compress(data, level)
+
+    elif filter_code == BLOSC_FILTER:
+        try:
+            import blosc
+        except ImportError:
+            return None
+        # Default parameters of the filter, for any not given:
+        values = tuple(values) + (0, 0, 0, 0, 5, 1, 0)[len(values) :]
+        clevel, shuffle, compressor = values[4:7]
+        kwargs = dict(
+            typesize=dset.dtype.itemsize,
+            clevel=clevel,
+            shuffle=shuffle,
+            cname=BLOSC_COMPRESSORS[compressor],
+        )
+        # Compress in parallel threads:
+        blosc.set_releasegil(True)
+
+        def compress(data):
+            return blosc.compress(data, **kwargs)
+
+    else:
+        return None
+    dtype = dset.dtype
+
+    def compress_frame(frame):
+        if np.shape(frame) != frame_shape:
+            return None
+        return compress(np.ascontiguousarray(frame, dtype=dtype).tobytes())
+
+    return compress_frame
+
+
+def submit_frame(dset, frame, compressor=None):
+    """Start compressing a frame into a chunk of the dataset in the thread pool.
+    Returns a future of the compressed chunk, or None if the frame cannot be written as
+    a chunk directly. The compressor of the dataset from get_chunk_compressor() may be
+    passed in to save looking it up for each frame."""
+    if compressor is None:
+        compressor = get_chunk_compressor(dset)
+    if compressor is None:
+        return None
+    return get_executor().submit(compressor, frame)
+
+
+def write_frame(dset, frame, future=None, index=None):
+    """Write a frame to the given index of the first axis of the dataset, or if
+    `index` is None, write it as the whole dataset. If `future` is a future from
+    submit_frame(), wait for the compressed chunk and write it directly, otherwise
+    write the frame normally"""
+    chunk = future.result() if future is not None else None
+    if chunk is not None:
+        if index is None:
+            offset = (0,) * dset.ndim
+        else:
+            offset = (index,) + (0,) * (dset.ndim - 1)
+        dset.id.write_direct_chunk(offset, chunk)
+    elif index is None:
+        dset[...] = frame
+    else:
+        dset[index] = frame
+
+
+def write_frames(frames):
+    """Write frames to datasets, compressing them all in parallel.
+
+    Args:
+        frames (list): Tuples of (dset, frame, index) of the dataset, the frame, and
+            the index of the first axis of the dataset to write it to, or None to write
+            it as the whole dataset.
+    """
+    compressors = {}
+    futures = []
+    for dset, frame, _ in frames:
+        if dset.id not in compressors:
+            compressors[dset.id] = get_chunk_compressor(dset)
+        futures.append(submit_frame(dset, frame, compressors[dset.id]))
+    for (dset, frame, index), future in zip(frames, futures):
+        write_frame(dset, frame, future, index)
@@ -21,6 +21,8 @@ import labscript_utils.shared_drive
 import labscript_utils.h5_lock
 import h5py
 import threading
+from labscript_devices.frame_compression import (
+    get_compression_kwargs, create_frames_dataset, write_frames)
 
 __author__ = ['dt', 'rpanderson', 'cbillington']
 
@@ -384,17 +386,23 @@ class IMAQdxCameraServer(CameraServer):
                     image_group.attrs.create(
                         'BinningVertical', self.binning_vertical, dtype='int8')
                 if self.named_exposures:
+                    frames = []
                     for i, exposure in enumerate(self.exposures):
                         group = image_group.require_group(exposure['name'])
-                        dset = group.create_dataset(exposure['frametype'], data=self.imgs[i],
-                                                    dtype='uint16', compression='gzip')
+                        dset = create_frames_dataset(
+                            group, exposure['frametype'], self.imgs[i].shape,
+                            compression_kwargs=get_compression_kwargs('gzip'))
                         if self.imageify:
                             # Specify this dataset should be viewed as an image
-                            dset.attrs['CLASS'] = np.string_('IMAGE')
-                            dset.attrs['IMAGE_VERSION'] = np.string_('1.2')
-                            dset.attrs['IMAGE_SUBCLASS'] = np.string_(
+                            dset.attrs['CLASS'] = np.bytes_('IMAGE')
+                            dset.attrs['IMAGE_VERSION'] = np.bytes_('1.2')
+                            dset.attrs['IMAGE_SUBCLASS'] = np.bytes_(
                                 'IMAGE_GRAYSCALE')
                             dset.attrs['IMAGE_WHITE_IS_ZERO'] = np.uint8(0)
+                        frames.append((dset, self.imgs[i], None))
+                    # Compress all frames in parallel:
+                    write_frames(frames)
+                    for exposure in self.exposures:
                         print('Saved frame {:}'.format(exposure['frametype']))
                 else:
                     image_group.create_dataset('Raw', data=np.array(self.imgs))
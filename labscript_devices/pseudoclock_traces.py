@@ -0,0 +1,139 @@
+#####################################################################
+#                                                                   #
+# /pseudoclock_traces.py                                            #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""Functions shared by the runviewer parsers of pseudoclock devices, for expanding
+their pulse programs into clock traces with NumPy, rather than one tick at a time in
+Python."""
+
+import numpy as np
+
+
+def get_clock_ticks(clock):
+    """Returns the times of the rising edges of a clock or trigger trace.
+
+    Args:
+        clock (tuple): Arrays of the times and values of the trace.
+
+    Returns:
+        numpy.ndarray: Times of the rising edges.
+    """
+    times, clock_value = clock[0], clock[1]
+    clock_indices = np.where((clock_value[1:] - clock_value[:-1]) == 1)[0] + 1
+    # If initial clock value is 1, then this counts as a rising edge (clock should
+    # be 0 before experiment) but this is not picked up by the above code. So we
+    # insert it!
+    if clock_value[0] == 1:
+        clock_indices = np.insert(clock_indices, 0, 0)
+    return times[clock_indices]
+
+
+def expand_pulse_program(
+    high_durations,
+    low_durations,
+    reps,
+    waits=(),
+    start_time=0,
+    resume_times=None,
+    wait_delay=0,
+):
+    """Expands a pulse program into the times and states of every clock edge.
+
+    Each instruction produces `reps` ticks, each high for its high duration then low
+    for its low duration. The program is split into segments by the wait
+    instructions, which produce no ticks. The first segment begins at
+    `start_time`, and each subsequent segment at the corresponding element of
+    `resume_times`, or if that is `None`, `wait_delay` after the end of the previous
+    segment. Within each segment the edge times are accumulated in order, so that
+    they are exactly equal to those from adding the durations one at a time.
+
+    Args:
+        high_durations (numpy.ndarray): Time for which each instruction's ticks are
+            high.
+        low_durations (numpy.ndarray): Time for which each instruction's ticks are
+            low.
+        reps (numpy.ndarray): Number of ticks of each instruction. This should be
+            zero for waits and any other instructions that do not produce ticks.
+        waits (list, optional): Indices of the wait instructions, in order.
+        start_time (float, optional): Time at which the program begins.
+        resume_times (numpy.ndarray, optional): Times at which the program resumes
+            after each wait, for example from the trigger of the parent clock.
+        wait_delay (float, optional): Time from the end of a segment to the start of
+            the next, if `resume_times` is `None`.
+
+    Returns:
+        tuple: The clock trace as a tuple of arrays of times and states, and an
+        array of the index of the first tick of each segment.
+    """
+    reps = np.asarray(reps, dtype=np.int64)
+    durations = np.empty((len(reps), 2), dtype=float)
+    durations[:, 0] = high_durations
+    durations[:, 1] = low_durations
+
+    segment_bounds = [0] + [j + 1 for j in waits] + [len(reps)]
+    edge_bounds = 2 * np.append(0, np.cumsum(reps))
+    times = np.empty(edge_bounds[-1], dtype=float)
+    states = np.zeros(edge_bounds[-1], dtype=int)
+    states[::2] = 1
+    segment_starts = np.empty(len(segment_bounds) - 1, dtype=int)
+
+    t = start_time
+    for k, (first, last) in enumerate(zip(segment_bounds[:-1], segment_bounds[1:])):
+        if k > 0:
+            if resume_times is not None:
+                t = resume_times[k - 1]
+            else:
+                t += wait_delay
+        start, stop = edge_bounds[first], edge_bounds[last]
+        segment_starts[k] = start // 2
+        if start == stop:
+            continue
+        segment_durations = np.repeat(
+            durations[first:last], reps[first:last], axis=0
+        ).ravel()
+        times[start] = t
+        times[start + 1 : stop] = segment_durations[:-1]
+        np.cumsum(times[start:stop], out=times[start:stop])
+        t = times[stop - 1] + segment_durations[-1]
+
+    return (times, states), segment_starts
+
+
+def make_envelope(clock, segment_starts, max_pulses):
+    """Decimates a clock trace for display, if it has more than `max_pulses` ticks,
+    by replacing each group of consecutive ticks with a single pulse from the rising
+    edge of the first to the falling edge of the last. Groups do not span segments,
+    so that waits remain visible.
+
+    Args:
+        clock (tuple): Arrays of the times and states of the clock trace, as returned
+            by :func:`expand_pulse_program`.
+        segment_starts (numpy.ndarray): Index of the first tick of each segment, as
+            returned by :func:`expand_pulse_program`.
+        max_pulses (int): Number of ticks above which the trace is decimated.
+
+    Returns:
+        tuple: Arrays of the times and states of the decimated trace.
+    """
+    times, states = clock
+    num_ticks = len(times) // 2
+    if num_ticks <= max_pulses:
+        return clock
+    stride = -(-num_ticks // max_pulses)
+    segment_stops = np.append(segment_starts[1:], num_ticks)
+    group_starts = np.concatenate(
+        [np.arange(a, b, stride) for a, b in zip(segment_starts, segment_stops)]
+    )
+    group_stops = np.append(group_starts[1:], num_ticks)
+    envelope_times = np.empty(2 * len(group_starts), dtype=float)
+    envelope_times[::2] = times[2 * group_starts]
+    envelope_times[1::2] = times[2 * group_stops - 1]
+    envelope_states = np.zeros(len(envelope_times), dtype=int)
+    envelope_states[::2] = 1
+    return envelope_times, envelope_states
@@ -0,0 +1,187 @@
+#####################################################################
+#                                                                   #
+# /testing/benchmark_pseudoclock_traces.py                          #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""Benchmark comparing the expansion of pseudoclock pulse programs into clock traces
+by pseudoclock_traces.expand_pulse_program() with the per-tick Python loops previously
+in the runviewer parsers of the DummyPseudoclock and PineBlaster (which were
+identical) and the CiceroOpalKellyXEM3001. The traces are checked to be identical.
+Run as a script:
+
+    python benchmark_pseudoclock_traces.py --ticks 10000000
+"""
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from labscript_devices.pseudoclock_traces import expand_pulse_program
+
+CLOCK_RESOLUTION = 25e-9
+CLOCK_FREQUENCY = 100e6
+TRIGGER_DELAY = 1e-6
+WAIT_DELAY = 2.5e-6
+NUM_INSTRUCTIONS = 1000
+NUM_WAITS = 5
+
+
+def legacy_period_reps(pulse_program, clock_ticks):
+    """The loop previously in DummyPseudoclockParser and the PineBlaster
+    RunviewerClass"""
+    clock = clock_ticks
+    time = []
+    states = []
+    trigger_index = 0
+    t = 0 if clock is None else clock_ticks[trigger_index] + TRIGGER_DELAY
+    trigger_index += 1
+
+    clock_factor = CLOCK_RESOLUTION / 2.0
+
+    for row in pulse_program:
+        if row['period'] == 0:
+            # special case
+            if row['reps'] == 1:  # WAIT
+                if clock is not None:
+                    t = clock_ticks[trigger_index] + TRIGGER_DELAY
+                    trigger_index += 1
+                else:
+                    t += WAIT_DELAY
+        else:
+            for i in range(row['reps']):
+                for j in range(1, -1, -1):
+                    time.append(t)
+                    states.append(j)
+                    t += row['period'] * clock_factor
+    return np.array(time), np.array(states)
+
+
+def new_period_reps(pulse_program, clock_ticks):
+    """As now in DummyPseudoclockParser and the PineBlaster RunviewerClass"""
+    periods = pulse_program['period'] * (CLOCK_RESOLUTION / 2.0)
+    special = pulse_program['period'] == 0
+    waits = np.flatnonzero(special & (pulse_program['reps'] == 1))
+    reps = np.where(special, 0, pulse_program['reps'])
+    start_time, resume_times = 0, None
+    if clock_ticks is not None:
+        start_time = clock_ticks[0] + TRIGGER_DELAY
+        resume_times = clock_ticks[1:] + TRIGGER_DELAY
+    clock, _ = expand_pulse_program(
+        periods, periods, reps, waits, start_time, resume_times, WAIT_DELAY
+    )
+    return clock
+
+
+def legacy_cicero(pulse_program, clock_ticks):
+    """The loop previously in the CiceroOpalKellyXEM3001 RunviewerClass"""
+    clock = clock_ticks
+    time = []
+    states = []
+    trigger_index = 0
+    t = 0
+
+    for row in pulse_program:
+        if row['reps'] == 0:  # WAIT
+            if clock is not None:
+                t = clock_ticks[trigger_index] + TRIGGER_DELAY
+                trigger_index += 1
+            else:
+                t += WAIT_DELAY
+        else:
+            for i in range(row['reps']):
+                time.append(t)
+                states.append(1)
+                t += row['on_period'] / CLOCK_FREQUENCY
+                time.append(t)
+                states.append(0)
+                t += row['off_period'] / CLOCK_FREQUENCY
+    return np.array(time), np.array(states)
+
+
+def new_cicero(pulse_program, clock_ticks):
+    """As now in the CiceroOpalKellyXEM3001 RunviewerClass"""
+    resume_times = None
+    if clock_ticks is not None:
+        resume_times = clock_ticks + TRIGGER_DELAY
+    clock, _ = expand_pulse_program(
+        pulse_program['on_period'] / CLOCK_FREQUENCY,
+        pulse_program['off_period'] / CLOCK_FREQUENCY,
+        pulse_program['reps'],
+        np.flatnonzero(pulse_program['reps'] == 0),
+        0,
+        resume_times,
+        WAIT_DELAY,
+    )
+    return clock
+
+
+def make_programs(rng, num_ticks):
+    """Random pulse programs in the format of each device, with the given total
+    number of ticks and some waits"""
+    reps = rng.multinomial(num_ticks, np.ones(NUM_INSTRUCTIONS) / NUM_INSTRUCTIONS)
+    periods = rng.integers(4, 100, NUM_INSTRUCTIONS)
+    wait_indices = np.sort(rng.choice(NUM_INSTRUCTIONS, NUM_WAITS, replace=False))
+
+    period_reps = np.zeros(NUM_INSTRUCTIONS, dtype=[('period', int), ('reps', int)])
+    period_reps['period'] = periods
+    period_reps['reps'] = reps
+    # A wait is zero period and one rep, the final stop is zero period and zero reps:
+    waits = np.zeros(NUM_WAITS, dtype=period_reps.dtype)
+    waits['reps'] = 1
+    period_reps = np.insert(period_reps, wait_indices, waits)
+    period_reps = np.append(period_reps, np.zeros(1, dtype=period_reps.dtype))
+
+    cicero = np.zeros(
+        NUM_INSTRUCTIONS, dtype=[('on_period', int), ('off_period', int), ('reps', int)]
+    )
+    cicero['on_period'] = periods
+    cicero['off_period'] = rng.integers(4, 100, NUM_INSTRUCTIONS)
+    cicero['reps'] = reps
+    # A wait is zero reps:
+    cicero = np.insert(cicero, wait_indices, np.zeros(NUM_WAITS, dtype=cicero.dtype))
+    return period_reps, cicero
+
+
+def best_time(repeats, func, *args):
+    times = []
+    for _ in range(repeats):
+        start_time = perf_counter()
+        result = func(*args)
+        times.append(perf_counter() - start_time)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ticks', type=int, default=10_000_000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    period_reps, cicero = make_programs(rng, args.ticks)
+    clock_ticks = np.sort(rng.random(NUM_WAITS + 1)) * 10
+
+    print(f"{'parser':>20} {'clock':>9} {'legacy (s)':>11} {'new (s)':>9} {'speedup':>8}")
+    for name, program, legacy, new in [
+        ('DummyPseudoclock', period_reps, legacy_period_reps, new_period_reps),
+        ('Cicero', cicero, legacy_cicero, new_cicero),
+    ]:
+        for parent_clock in [None, clock_ticks]:
+            t_legacy, expected = best_time(1, legacy, program, parent_clock)
+            t_new, result = best_time(args.repeats, new, program, parent_clock)
+            assert np.array_equal(result[0], expected[0])
+            assert np.array_equal(result[1], expected[1])
+            clock_name = 'primary' if parent_clock is None else 'parent'
+            print(
+                f"{name:>20} {clock_name:>9} {t_legacy:11.3f} {t_new:9.3f} "
+                + f"{t_legacy / t_new:8.0f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#####################################################################
+#                                                                   #
+# /testing/test_frame_compression.py                                #
+#                                                                   #
+# This file is part of the module labscript_devices, in the         #
+# labscript suite (see http://labscriptsuite.org), and is           #
+# licensed under the Simplified BSD License. See the license.txt    #
+# file in the root of the project for the full license.             #
+#                                                                   #
+#####################################################################
+"""Test that frames compressed in parallel and written as chunks directly by
+frame_compression.write_frames() are stored as the same bytes as when HDF5 compresses
+them, for each supported filter, and read back correctly for the others."""
+import labscript_utils.h5_lock
+import h5py
+import numpy as np
+import pytest
+
+from labscript_devices.frame_compression import (
+    create_frames_dataset,
+    get_chunk_compressor,
+    get_compression_kwargs,
+    write_frames,
+)
+
+FRAME_SHAPE = (64, 48)
+
+
+def compression_kwargs(compression, compression_opts):
+    if compression in ('lz4', 'blosc'):
+        pytest.importorskip('hdf5plugin')
+    if compression == 'blosc':
+        pytest.importorskip('blosc')
+    return get_compression_kwargs(compression, compression_opts)
+
+
+@pytest.mark.parametrize(
+    "compression, compression_opts, direct",
+    [
+        ('gzip', None, True),
+        ('gzip', 9, True),
+        ('blosc', None, True),
+        ('blosc', {'cname': 'zstd', 'clevel': 3, 'shuffle': 2}, True),
+        ('lzf', None, False),
+        ('lz4', None, False),
+        (None, None, False),
+    ],
+)
+@pytest.mark.parametrize("count", [None, 1, 5])
+def test_write_frames(tmp_path, compression, compression_opts, direct, count):
+    kwargs = compression_kwargs(compression, compression_opts)
+    rng = np.random.default_rng(0)
+    frames = rng.poisson(500, (count or 1,) + FRAME_SHAPE)
+    with h5py.File(tmp_path / 'frames.h5', 'w') as f:
+        dset = create_frames_dataset(f, 'direct', FRAME_SHAPE, count, 'uint16', kwargs)
+        reference = create_frames_dataset(
+            f, 'reference', FRAME_SHAPE, count, 'uint16', kwargs
+        )
+        assert (get_chunk_compressor(dset) is not None) == direct
+        if count is None:
+            write_frames([(dset, frames[0], None)])
+            reference[...] = frames[0]
+        else:
+            write_frames([(dset, frame, i) for i, frame in enumerate(frames)])
+            reference[...] = frames
+        assert np.array_equal(dset[()], reference[()])
+        assert np.array_equal(dset[()].reshape(frames.shape), frames)
+        if direct:
+            for i in range(count or 1):
+                offset = (0, 0) if count is None else (i, 0, 0)
+                assert (
+                    dset.id.read_direct_chunk(offset)
+                    == reference.id.read_direct_chunk(offset)
+                )